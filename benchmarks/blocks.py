@@ -0,0 +1,122 @@
+"""
+Render time and allocations of the /sre alert and /qchain killswitch modals and of the
+service options response, building Block Kit dicts per request and serializing them
+(what requests' json= did) versus the templates of qbot.blocks, with hundreds of options.
+
+Usage: python benchmarks/blocks.py [iterations]
+"""
+import json
+import sys
+import tracemalloc
+
+from support import function_env, load_lambda, measure, quiet, report
+
+from qbot.slack import VIEWS_OPEN
+
+METADATA = json.dumps({"command": "/sre", "text": "alert", "channel_id": "C0000000"})
+
+
+def literal_builder(document):
+    """
+    Returns a function building document from dict and list literals on every call,
+    like the handlers did before the templates
+    """
+    return eval("lambda: " + repr(document))
+
+
+def allocations(func):
+    """
+    Peak bytes allocated by one call of func
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def compare(name, per_request, template, iterations):
+    print(name)
+    for label, func in (("dicts + json.dumps", per_request), ("template", template)):
+        with quiet():
+            samples = measure(func, iterations)
+            peak = allocations(func)
+        report(f"  {label}", samples)
+        print(f"  {label:38} peak allocations={peak / 1024:8.1f}KiB")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    opsgenie = load_lambda("lambda/opsgenie", function_env("opsgenie", {"OPSGENIE_SERVICES_CACHE_PATH": ""}))
+    qchain = load_lambda("lambda/qchain", function_env("qchain"))
+
+    for count in (100, 500):
+        services = {"data": [{"id": f"svc-{i:04d}", "name": f"Payments Service {i:04d}"} for i in range(count)]}
+        # The modal shell is rebuilt from literals, the options in a loop, as _generate_alert_modal did
+        shell = literal_builder(json.loads(opsgenie.ALERT_MODAL.render(metadata=METADATA, service_select={})))
+
+        def per_request_modal():
+            modal = shell()
+            modal["private_metadata"] = METADATA
+            options = []
+            for service in services["data"][:opsgenie.MAX_SELECT_OPTIONS]:
+                options.append({"text": {"type": "plain_text", "text": service["name"], "emoji": True}, "value": service["id"]})
+            modal["blocks"][2]["accessory"] = {
+                "type": "static_select",
+                "action_id": "service_select",
+                "placeholder": {"type": "plain_text", "text": "Choose a service", "emoji": True},
+                "initial_option": options[0],
+                "options": options,
+            }
+            return json.dumps({"trigger_id": "1.2.3", "view": modal})
+
+        def template_modal():
+            return VIEWS_OPEN.render(trigger_id="1.2.3", view=opsgenie._generate_alert_modal(METADATA, services))
+
+        compare(f"/sre alert modal, static select of {count} services", per_request_modal, template_modal, iterations)
+
+        opsgenie.services_cache.fetch = lambda: services
+        opsgenie.services_cache._fetched_at = None
+        detail = {"action_id": "service_select", "query": "payments"}
+
+        def per_request_options():
+            matches = opsgenie._get_service_index()[0].search("payments", opsgenie.MAX_SELECT_OPTIONS)
+            options = [{"text": {"type": "plain_text", "text": s["name"], "emoji": True}, "value": s["id"]} for s in matches]
+            return json.dumps({"options": options})
+
+        with quiet():
+            opsgenie._load_service_options(detail)
+        compare(
+            f"options load, 100 of {count} services",
+            per_request_options,
+            lambda: opsgenie._load_service_options(detail),
+            iterations,
+        )
+
+    for count in (50, 300):
+        qchain.DEPLOYMENTS = [f"deployment-{i:03d}" for i in range(count)]
+        status = {service: "Running" if i % 3 else "Stopped" for i, service in enumerate(qchain.DEPLOYMENTS)}
+        qchain._get_killswitch_services_status = lambda: status
+        qchain_shell = literal_builder(json.loads(qchain.KILLSWITCH_MODAL.render(metadata=METADATA, sections=[])))
+        section = literal_builder(json.loads(qchain.SERVICE_SECTION.render(label="", status="", service="")))
+
+        def per_request_killswitch():
+            modal = qchain_shell()
+            modal["private_metadata"] = METADATA
+            for service in qchain.DEPLOYMENTS:
+                block = section()
+                block["text"]["text"] = f"*{service}*"
+                block["accessory"]["placeholder"]["text"] = status[service]
+                block["accessory"]["action_id"] = service
+                modal["blocks"].append(block)
+            return json.dumps({"trigger_id": "1.2.3", "view": modal})
+
+        def template_killswitch():
+            return VIEWS_OPEN.render(trigger_id="1.2.3", view=qchain._generate_killswitch_modal(METADATA))
+
+        compare(f"/qchain killswitch modal, {count} deployments", per_request_killswitch, template_killswitch, iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Channel name lookups against a local fake Slack: conversations.info on every lookup
+versus the qbot.channels directory, cold, after a bulk warm from conversations.list,
+and for unknown channel ids.
+
+Usage: python benchmarks/channels.py [iterations] [channels] [slack_latency_ms]
+"""
+import itertools
+import random
+import sys
+import time
+import urllib.parse
+
+from support import FakeJSONServer, measure, quiet, report
+
+from qbot.channels import CHANNEL_LIST_PAGE_SIZE, ChannelDirectory
+from qbot.slack import SlackClient
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 40.0 / 1000
+    names = {f"C{i:08d}": f"channel-{i}" for i in range(count)}
+    ids = list(names)
+
+    def query(path):
+        return dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(path).query))
+
+    def conversations_info(method, path, body):
+        channel_id = query(path).get("channel")
+        if channel_id not in names:
+            return 200, {"ok": False, "error": "channel_not_found"}
+        return 200, {"ok": True, "channel": {"id": channel_id, "name": names[channel_id]}}
+
+    def conversations_list(method, path, body):
+        params = query(path)
+        start = int(params.get("cursor") or 0)
+        end = start + int(params.get("limit", CHANNEL_LIST_PAGE_SIZE))
+        page = [{"id": channel_id, "name": names[channel_id]} for channel_id in ids[start:end]]
+        return 200, {"ok": True, "channels": page, "response_metadata": {"next_cursor": str(end) if end < count else ""}}
+
+    server = FakeJSONServer(
+        {"/conversations.info": conversations_info, "/conversations.list": conversations_list}, latency=latency
+    )
+    slack = SlackClient("xoxb-benchmark", base_url=server.url)
+    rng = random.Random(1)
+    lookups = [rng.choice(ids) for _ in range(iterations)]
+
+    def run(lookup):
+        sequence = iter(lookups)
+        before = server.requests
+        with quiet():
+            samples = measure(lambda: lookup(next(sequence)), iterations)
+        return samples, server.requests - before
+
+    def conversations_info_lookup(channel_id):
+        data = slack.call("conversations.info", params={"channel": channel_id})
+        return data["channel"]["name"] if data.get("ok") else None
+
+    samples, calls = run(conversations_info_lookup)
+    report("conversations.info per lookup", samples)
+    print(f"  Slack calls: {calls}")
+
+    directory = ChannelDirectory(slack)
+    samples, calls = run(directory.name)
+    report("directory, cold", samples)
+    print(f"  Slack calls: {calls}")
+
+    directory = ChannelDirectory(slack)
+    started = time.perf_counter()
+    before = server.requests
+    with quiet():
+        directory.warm()
+    print(f"warm: {len(directory)} channels from {server.requests - before} pages in {(time.perf_counter() - started) * 1000:.0f} ms")
+    samples, calls = run(directory.name)
+    report("directory, warmed", samples)
+    print(f"  Slack calls: {calls}")
+
+    unknown = itertools.cycle([f"CUNKNOWN{i}" for i in range(5)])
+    before = server.requests
+    with quiet():
+        samples = measure(lambda: directory.name(next(unknown)), iterations)
+    report("directory, 5 unknown ids", samples)
+    print(f"  Slack calls: {server.requests - before}")
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Cold start profile of every lambda: init duration, per-module import time and
+resident memory, checked against an init budget per lambda.
+
+Each sample imports lambda_function in a fresh interpreter with `-X importtime`,
+the way the Lambda runtime does during init. When scripts/package-lambda.sh has
+built lambda/<name>/package/<name>.zip the zip is extracted and profiled, so the
+numbers cover exactly the deployed dependencies. Otherwise the lambda folder,
+lib/ and the site-packages of the current interpreter are used.
+
+Usage:
+    python benchmarks/cold_start.py [lambda ...] [--samples N] [--top N] [--budget NAME=MS]
+
+The script exits with 1 when a lambda's median init exceeds its budget or its
+resident memory exceeds the function memory size.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+from support import REPO_ROOT, function_env
+from local.loader import FAKE_AWS_ENV
+
+# Slack expects the gatekeeper's response and backends' views.open (trigger_id) within 3 seconds
+# of the user action, a cold gatekeeper and a cold backend can both be on that path.
+INIT_BUDGET_MS = {
+    "backend": 400,
+    "gatekeeper": 600,
+    "opsgenie": 400,
+    "pushover": 400,
+    "qchain": 800,
+}
+DEFAULT_INIT_BUDGET_MS = 500
+# lambda.tf does not set memory_size, the Lambda default applies
+FUNCTION_MEMORY_MB = 128
+
+# Runs in the fresh interpreter, kept free of imports beyond the ones it needs
+CHILD = """
+import json, os, sys, time
+
+def rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+sys.path[:0] = json.loads(os.environ["COLD_START_PATH"])
+before = rss()
+error = None
+start = time.perf_counter()
+try:
+    import lambda_function
+except Exception as e:
+    error = repr(e)
+init = time.perf_counter() - start
+sys.stdout = sys.__stdout__
+print("COLD_START " + json.dumps({"init_ms": init * 1000, "rss_before": before, "rss_after": rss(), "error": error}))
+"""
+
+
+def lambda_path(name, workdir):
+    """
+    Returns (sys.path entries, source description) for a lambda, extracting its package zip if built
+
+    Args:
+    - name (str): The folder of the lambda under lambda/
+    - workdir (str): Directory to extract packages into
+    """
+    package = os.path.join(REPO_ROOT, "lambda", name, "package", f"{name}.zip")
+    if os.path.exists(package):
+        target = os.path.join(workdir, name)
+        with zipfile.ZipFile(package) as archive:
+            archive.extractall(target)
+        return [target], os.path.relpath(package, REPO_ROOT)
+    return [os.path.join(REPO_ROOT, "lambda", name), os.path.join(REPO_ROOT, "lib")], "source"
+
+
+def parse_importtime(stderr):
+    """
+    Parses `-X importtime` output into [(depth, module, self_us, cumulative_us)]
+
+    Args:
+    - stderr (str): The stderr of the profiled interpreter
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        stripped = name.lstrip(" ")
+        depth = (len(name) - len(stripped) - 1) // 2
+        imports.append((depth, stripped.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def profile(name, path, samples):
+    """
+    Profiles samples cold imports of a lambda, returns the results and import breakdown of the median sample
+
+    Args:
+    - name (str): The folder of the lambda under lambda/
+    - path (list): sys.path entries holding the lambda and its dependencies
+    - samples (int): Number of fresh interpreters
+    """
+    env = {**os.environ, **FAKE_AWS_ENV, **function_env(name), "COLD_START_PATH": json.dumps(path)}
+    # Only the lambda folder or package and the interpreter site-packages, like the runtime
+    env.pop("PYTHONPATH", None)
+    runs = []
+    for _ in range(samples):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", CHILD],
+            env=env,
+            cwd=tempfile.gettempdir(),
+            capture_output=True,
+            text=True,
+        )
+        line = next((l for l in process.stdout.splitlines() if l.startswith("COLD_START ")), None)
+        if line is None:
+            raise RuntimeError(f"{name} profiler failed:\n{process.stderr[-2000:]}")
+        runs.append((json.loads(line[len("COLD_START "):]), parse_importtime(process.stderr)))
+    runs.sort(key=lambda run: run[0]["init_ms"])
+    return runs[len(runs) // 2], [run[0]["init_ms"] for run in runs]
+
+
+def print_breakdown(imports, top):
+    """
+    Prints the slowest direct imports of lambda_function and the packages with the most self time
+    """
+    direct = sorted((i for i in imports if i[0] == 1), key=lambda i: -i[3])[:top]
+    print("  slowest imports of lambda_function (cumulative):")
+    for _, module, _, cumulative in direct:
+        print(f"    {module:<40} {cumulative / 1000:8.1f}ms")
+
+    packages = {}
+    for _, module, self_us, _ in imports:
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    print("  packages by self time:")
+    for package, self_us in sorted(packages.items(), key=lambda p: -p[1])[:top]:
+        print(f"    {package:<40} {self_us / 1000:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("lambdas", nargs="*", help="Lambda folders to profile, default all")
+    parser.add_argument("--samples", type=int, default=5, help="Fresh interpreters per lambda")
+    parser.add_argument("--top", type=int, default=8, help="Modules listed per lambda")
+    parser.add_argument("--budget", action="append", default=[], metavar="NAME=MS", help="Override an init budget")
+    args = parser.parse_args()
+
+    budgets = dict(INIT_BUDGET_MS)
+    for override in args.budget:
+        name, ms = override.split("=")
+        budgets[name] = float(ms)
+    names = args.lambdas or sorted(os.listdir(os.path.join(REPO_ROOT, "lambda")))
+
+    over_budget = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in names:
+            path, source = lambda_path(name, workdir)
+            (result, imports), inits = profile(name, path, args.samples)
+            budget = budgets.get(name, DEFAULT_INIT_BUDGET_MS)
+            init = statistics.median(inits)
+            rss_mb = result["rss_after"] / 2**20
+            within = not result["error"] and init <= budget and rss_mb <= FUNCTION_MEMORY_MB
+            status = "OK" if within else "OVER BUDGET"
+            print(
+                f"{name} ({source}): init p50={init:.1f}ms min={min(inits):.1f}ms max={max(inits):.1f}ms "
+                f"budget={budget:.0f}ms rss={rss_mb:.1f}MB (+{(result['rss_after'] - result['rss_before']) / 2**20:.1f}MB) "
+                f"of {FUNCTION_MEMORY_MB}MB {status}"
+            )
+            if result["error"]:
+                print(f"  init failed: {result['error']}")
+            print_breakdown(imports, args.top)
+            if status != "OK":
+                over_budget.append(name)
+
+    if over_budget:
+        print(f"Over budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
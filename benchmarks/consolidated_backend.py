@@ -0,0 +1,169 @@
+"""
+One function per command versus the consolidated backend (lambda/backend).
+
+Cold start latency: init of each backend in a fresh interpreter, per-command functions
+importing their lambda_function, the consolidated one importing its dispatcher and then
+the backend of the first request.
+
+Cold start frequency: a simulation of Lambda execution environments for low-traffic
+commands over several days. Requests arrive at random with incident bursts where /sre
+and /ops-bot are used together. A request is served by an idle environment of its
+function if one was used within the idle lifetime, otherwise a new one is started
+(cold). Keep-warm pings every 5 minutes invoke one environment per function. The idle
+lifetime Lambda grants is not documented, it is a parameter.
+
+Usage: python benchmarks/consolidated_backend.py [days] [idle_lifetime_minutes] [samples]
+"""
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from support import REPO_ROOT, function_env
+from local.loader import FAKE_AWS_ENV
+
+KEEP_WARM_INTERVAL = 300
+# (command, backend, requests per day, seconds per request, share of requests during incidents)
+COMMANDS = (
+    ("/sre", "opsgenie", 12, 1.5, 0.6),
+    ("/ops-bot", "opsgenie", 8, 6.0, 0.8),
+    ("/qchain", "qchain", 0.5, 4.0, 0.0),
+    ("/new-a", "new-a", 3, 1.0, 0.0),
+    ("/new-b", "new-b", 2, 1.0, 0.0),
+)
+INCIDENTS_PER_DAY = 2
+INCIDENT_SECONDS = 900
+
+CHILD = """
+import json, os, sys, time
+sys.path[:0] = json.loads(os.environ["COLD_START_PATH"])
+start = time.perf_counter()
+import lambda_function
+backend = os.environ.get("COLD_START_BACKEND")
+if backend:
+    lambda_function._backend(backend)
+sys.stdout = sys.__stdout__
+print("COLD_START " + json.dumps({"init_ms": (time.perf_counter() - start) * 1000}))
+"""
+
+
+def init_ms(function, samples, backend=None):
+    """
+    Returns the median init of a lambda in fresh interpreters, with the import of one backend for lambda/backend
+
+    Args:
+    - function (str): The folder of the lambda under lambda/
+    - samples (int): Number of fresh interpreters
+    - backend (str): The backend the first request of the consolidated lambda loads
+    """
+    path = [os.path.join(REPO_ROOT, "lambda", function), os.path.join(REPO_ROOT, "lib")]
+    env = {**os.environ, **FAKE_AWS_ENV, **function_env(function), "COLD_START_PATH": json.dumps(path)}
+    env.pop("PYTHONPATH", None)
+    if backend:
+        env["COLD_START_BACKEND"] = backend
+    inits = []
+    for _ in range(samples):
+        process = subprocess.run(
+            [sys.executable, "-c", CHILD], env=env, cwd=tempfile.gettempdir(), capture_output=True, text=True
+        )
+        line = next((l for l in process.stdout.splitlines() if l.startswith("COLD_START ")), None)
+        if line is None:
+            raise RuntimeError(f"{function} failed:\n{process.stderr[-2000:]}")
+        inits.append(json.loads(line[len("COLD_START "):])["init_ms"])
+    return statistics.median(inits)
+
+
+def traffic(days, rng):
+    """
+    Returns [(time, command, duration)] of the simulated requests, sorted by time
+    """
+    horizon = days * 86400
+    incidents = [rng.uniform(0, horizon) for _ in range(int(INCIDENTS_PER_DAY * days))]
+    requests = []
+    for command, _, per_day, duration, incident_share in COMMANDS:
+        # Poisson arrivals
+        at = rng.expovariate(per_day / 86400)
+        while at < horizon:
+            when = at
+            if incidents and rng.random() < incident_share:
+                when = rng.choice(incidents) + rng.uniform(0, INCIDENT_SECONDS)
+            requests.append((when, command, duration * rng.uniform(0.5, 1.5)))
+            at += rng.expovariate(per_day / 86400)
+    return sorted(requests)
+
+
+def simulate(requests, function_of, days, idle_lifetime, keep_warm):
+    """
+    Returns (cold starts by command, keep-warm invocations) of a layout
+
+    Args:
+    - requests (list): [(time, command, duration)]
+    - function_of (dict): The function serving each command
+    - days (float): Simulated days
+    - idle_lifetime (float): Seconds an idle execution environment is kept
+    - keep_warm (bool): Whether every function gets keep-warm pings
+    """
+    functions = sorted(set(function_of.values()))
+    events = [(at, command, duration, function_of[command]) for at, command, duration in requests]
+    if keep_warm:
+        for tick in range(0, int(days * 86400), KEEP_WARM_INTERVAL):
+            events.extend((tick, None, 0.05, function) for function in functions)
+    events.sort(key=lambda event: event[0])
+
+    # Per function, [busy_until, last_used] of every live environment
+    pools = {function: [] for function in functions}
+    cold = {command: 0 for command in function_of}
+    pings = 0
+    for at, command, duration, function in events:
+        pool = pools[function]
+        pool[:] = [env for env in pool if env[0] > at or at - env[1] < idle_lifetime]
+        idle = [env for env in pool if env[0] <= at]
+        if idle:
+            env = max(idle, key=lambda env: env[1])
+        else:
+            env = [0.0, 0.0]
+            pool.append(env)
+            if command is not None:
+                cold[command] += 1
+        if command is None:
+            pings += 1
+        env[0] = env[1] = at + duration
+    return cold, pings
+
+
+def main():
+    days = float(sys.argv[1]) if len(sys.argv) > 1 else 7
+    idle_lifetime = float(sys.argv[2]) * 60 if len(sys.argv) > 2 else 10 * 60
+    samples = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    print(f"init in a fresh interpreter, median of {samples}")
+    inits = {}
+    for backend in ("opsgenie", "qchain"):
+        inits[backend] = init_ms(backend, samples)
+        consolidated = init_ms("backend", samples, backend)
+        print(f"  {backend:<10} own function {inits[backend]:7.1f}ms  consolidated, first request {consolidated:7.1f}ms")
+
+    rng = random.Random(7)
+    requests = traffic(days, rng)
+    layouts = (
+        ("one function per command", {command: backend for command, backend, *_ in COMMANDS}),
+        ("consolidated backend", {command: "backend" for command, *_ in COMMANDS}),
+    )
+    print(f"\n{len(requests)} requests over {days:g} days, idle environments kept {idle_lifetime / 60:g} minutes")
+    for keep_warm in (False, True):
+        print(f"keep-warm pings every {KEEP_WARM_INTERVAL // 60} minutes" if keep_warm else "no keep-warm pings")
+        for label, function_of in layouts:
+            cold, pings = simulate(requests, function_of, days, idle_lifetime, keep_warm)
+            total = sum(cold.values())
+            by_command = " ".join(f"{command}={count}" for command, count in cold.items())
+            print(
+                f"  {label:<26} cold starts {total:4d} ({total / len(requests):6.1%})  "
+                f"keep-warm invocations/day {pings / days:5.0f}  [{by_command}]"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Size of the EventBridge Detail and the cost to build and parse it, raw parse_qs
+detail versus the compact envelope, for a slash command and view submissions of
+the /sre alert modal with a growing number of services.
+
+Usage: python benchmarks/envelope.py [iterations]
+"""
+import json
+import sys
+import urllib.parse
+
+from support import function_env, load_lambda, measure, quiet, report
+
+from qbot import envelope
+
+# EventBridge rejects entries above 256 KB
+MAX_ENTRY_BYTES = 256 * 1024
+ROUTE = "/sre"
+
+
+def slash_command_body():
+    return urllib.parse.urlencode(
+        {
+            "token": "gIkuvaNzQIHg97ATvDxqgjtO",
+            "team_id": "T0000000",
+            "team_domain": "example",
+            "enterprise_id": "E0000000",
+            "enterprise_name": "Example",
+            "channel_id": "C0000000",
+            "channel_name": "sre",
+            "user_id": "U0000000",
+            "user_name": "benchmark",
+            "command": ROUTE,
+            "text": "alert",
+            "api_app_id": "A0000000",
+            "is_enterprise_install": "false",
+            "response_url": "https://hooks.slack.com/commands/T0000000/1/x",
+            "trigger_id": "1000.2000.abc",
+        }
+    )
+
+
+def view_submission_body(opsgenie, services):
+    """
+    A view_submission of the alert modal as Slack sends it, including the view's blocks
+    """
+    metadata = json.dumps({"command": ROUTE, "text": "alert", "channel_id": "C0000000"})
+    with quiet():
+        view = json.loads(opsgenie._generate_alert_modal(
+            metadata, {"data": [{"id": f"svc-{i:04d}", "name": f"service-{i:04d}"} for i in range(services)]}
+        ))
+    view.update(
+        {
+            "id": "V0000000",
+            "team_id": "T0000000",
+            "hash": "1700000000.abcdef",
+            "state": {
+                "values": {
+                    "service_select_block": {
+                        "service_select": {
+                            "type": "static_select",
+                            "selected_option": {"text": {"type": "plain_text", "text": "service-0001"}, "value": "svc-0001"},
+                        }
+                    },
+                    "priority_select_block": {
+                        "priority_select": {
+                            "type": "static_select",
+                            "selected_option": {"text": {"type": "plain_text", "text": "P2"}, "value": "P2"},
+                        }
+                    },
+                    "issue_description_block": {
+                        "issue_description": {"type": "plain_text_input", "value": "Checkout latency above SLO"}
+                    },
+                    "issue_url_block": {"issue_url": {"type": "url_text_input", "value": None}},
+                }
+            },
+        }
+    )
+    payload = {
+        "type": "view_submission",
+        "team": {"id": "T0000000", "domain": "example"},
+        "user": {"id": "U0000000", "username": "benchmark", "name": "benchmark", "team_id": "T0000000"},
+        "api_app_id": "A0000000",
+        "token": "gIkuvaNzQIHg97ATvDxqgjtO",
+        "trigger_id": "1000.2001.abc",
+        "view": view,
+        "response_urls": [],
+    }
+    return urllib.parse.urlencode({"payload": json.dumps(payload)})
+
+
+def legacy_detail(body):
+    """
+    The Detail the gatekeeper sent before the envelope: the parse_qs dict plus the route
+    """
+    decoded_body = urllib.parse.parse_qs(body)
+    decoded_body["route"] = ROUTE
+    return json.dumps(decoded_body)
+
+
+def envelope_detail(body):
+    """
+    The Detail the gatekeeper sends now, built from the already parsed request
+    """
+    decoded_body = urllib.parse.parse_qs(body)
+    if "payload" in decoded_body:
+        return envelope.encode(envelope.from_interaction(ROUTE, json.loads(decoded_body["payload"][0])))
+    return envelope.encode(envelope.from_command(ROUTE, decoded_body))
+
+
+def legacy_backend_parse(detail):
+    """
+    What the backends did with the raw detail: parse it, the payload and the private_metadata again
+    """
+    detail = json.loads(detail)
+    if "payload" in detail:
+        payload = json.loads(detail["payload"][0])
+        json.loads(payload["view"]["private_metadata"])
+        values = payload.get("view", {}).get("state", {}).get("values", {})
+        return values.get("service_select_block", {}).get("service_select", {}).get("selected_option", {})
+    return detail["trigger_id"][0], detail["channel_id"][0], detail["text"][0]
+
+
+def envelope_backend_parse(detail):
+    """
+    What the backends do now
+    """
+    detail = envelope.decode(json.loads(detail))
+    if detail["type"] == "view_submission":
+        return detail["values"].get("service_select")
+    return detail["trigger_id"], detail["channel_id"], detail["text"]
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    opsgenie = load_lambda("lambda/opsgenie", function_env("opsgenie"))
+    cases = [("slash command", slash_command_body())] + [
+        (f"view submission {services} services", view_submission_body(opsgenie, services))
+        for services in (10, 100, 1000)
+    ]
+
+    for label, body in cases:
+        legacy, compact = legacy_detail(body), envelope_detail(body)
+        print(
+            f"{label}: detail {len(legacy)} -> {len(compact)} bytes "
+            f"({len(legacy) / MAX_ENTRY_BYTES:.1%} -> {len(compact) / MAX_ENTRY_BYTES:.1%} of the PutEvents entry limit)"
+        )
+        report("  gatekeeper build, raw", measure(lambda: legacy_detail(body), iterations))
+        report("  gatekeeper build, envelope", measure(lambda: envelope_detail(body), iterations))
+        report("  backend parse, raw", measure(lambda: legacy_backend_parse(legacy), iterations))
+        report("  backend parse, envelope", measure(lambda: envelope_backend_parse(compact), iterations))
+
+
+if __name__ == "__main__":
+    main()
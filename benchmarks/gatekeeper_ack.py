@@ -0,0 +1,58 @@
+"""
+Time-to-ack of the gatekeeper handler with a slow EventBridge endpoint, waiting
+for put_events versus ack-first mode with a background flush.
+
+Usage: python benchmarks/gatekeeper_ack.py [iterations] [endpoint_latency_ms]
+"""
+import itertools
+import sys
+import time
+import urllib.parse
+
+from boto3 import client
+
+from support import FakeAWSServer, load_lambda, measure, quiet, report, slack_event
+
+SECRET = "benchmark"
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 150.0
+    server = FakeAWSServer(latency=latency_ms / 1000)
+    # Every request comes from the same user, the rate limiter would throttle the run
+    gatekeeper = load_lambda(
+        "lambda/gatekeeper",
+        {"SLACK_SIGNING_SECRET": SECRET, "RATE_LIMIT_PER_USER": "0", "RATE_LIMIT_PER_CHANNEL": "0", "RATE_LIMIT_PER_COMMAND": "0"},
+    )
+    gatekeeper.eventbridge = client("events", endpoint_url=server.url, config=gatekeeper.eventbridge.meta.config)
+    trigger_ids = itertools.count()
+
+    def request():
+        # Unique trigger_id per request, otherwise the replay and idempotency guards short-circuit
+        body = urllib.parse.urlencode(
+            {
+                "command": "/sre",
+                "text": "alert",
+                "channel_id": "C0000000",
+                "user_id": "U0000000",
+                "user_name": "benchmark",
+                "trigger_id": f"1.2.{next(trigger_ids)}",
+            }
+        )
+        return gatekeeper.lambda_handler(slack_event(body, SECRET), None)
+
+    gatekeeper.ACK_FIRST = False
+    report("wait for put_events", measure(request, iterations))
+
+    gatekeeper.ACK_FIRST = True
+    report("ack-first", measure(request, iterations))
+    started = time.perf_counter()
+    with quiet():
+        gatekeeper.flusher.wait()
+    print(f"background flush drained {(time.perf_counter() - started) * 1000:.1f} ms after the last ack")
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+EventBridge API calls and dispatch latency for a burst of concurrent interactivity
+events, one put_events per event versus micro-batched put_events.
+
+Batches only form when several requests share one process (threaded server,
+local runner). A Lambda execution environment serves one request at a time, there
+every batch holds one entry and the window only delays the dispatch, which is why
+the gatekeeper only batches with GATEKEEPER_ACK_FIRST.
+
+Usage: python benchmarks/gatekeeper_batching.py [burst_size] [endpoint_latency_ms] [batch_window_ms]
+"""
+import sys
+import threading
+import time
+
+from boto3 import client
+
+from support import FakeAWSServer, load_lambda, quiet, report
+
+
+def burst(gatekeeper, size):
+    """
+    Dispatches `size` events from concurrent threads and returns the per-event latencies
+
+    Args:
+    - gatekeeper (module): The loaded gatekeeper lambda
+    - size (int): Number of concurrent events
+    """
+    samples = [0.0] * size
+    barrier = threading.Barrier(size)
+
+    def dispatch(i):
+        barrier.wait()
+        start = time.perf_counter()
+        gatekeeper._dispatch_event("/sre", {"payload": ['{"type": "view_submission"}']}).result()
+        samples[i] = (time.perf_counter() - start) * 1000
+
+    threads = [threading.Thread(target=dispatch, args=(i,)) for i in range(size)]
+    with quiet():
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return samples
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 30.0
+    window_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 20.0
+    server = FakeAWSServer(latency=latency_ms / 1000)
+    gatekeeper = load_lambda("lambda/gatekeeper", {"SLACK_SIGNING_SECRET": "benchmark"})
+    gatekeeper.eventbridge = client("events", endpoint_url=server.url, config=gatekeeper.eventbridge.meta.config)
+
+    report("one put_events per event", burst(gatekeeper, size))
+    print(f"{'':<40} put_events calls={server.requests}")
+
+    server.requests = 0
+    gatekeeper.batcher = gatekeeper.EventBatcher(
+        lambda entries: gatekeeper.eventbridge.put_events(Entries=entries), gatekeeper.executor, window_ms / 1000
+    )
+    report(f"batched, {window_ms:g} ms window", burst(gatekeeper, size))
+    print(f"{'':<40} put_events calls={server.requests}")
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
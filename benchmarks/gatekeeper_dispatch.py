@@ -0,0 +1,51 @@
+"""
+Per-request EventBridge dispatch latency of the gatekeeper, before and after
+reusing the client, connection pool and executor across warm invocations.
+
+Usage: python benchmarks/gatekeeper_dispatch.py [iterations] [endpoint_latency_ms]
+"""
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3 import client
+
+from support import FakeAWSServer, load_lambda, measure, report
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    server = FakeAWSServer(latency=latency_ms / 1000)
+    gatekeeper = load_lambda("lambda/gatekeeper", {"SLACK_SIGNING_SECRET": "benchmark"})
+    gatekeeper.eventbridge = client("events", endpoint_url=server.url, config=gatekeeper.eventbridge.meta.config)
+    payload = {"command": ["/sre"], "text": ["alert"], "channel_id": ["C0000000"]}
+
+    # Previous implementation: new client, new executor and new event loop per request
+    def put_event_per_request(command, detail):
+        eventbridge = client("events", endpoint_url=server.url)
+        detail["route"] = command
+        eventbridge.put_events(
+            Entries=[
+                {
+                    "EventBusName": gatekeeper.EVENT_BUS_NAME,
+                    "Source": gatekeeper.EVENT_SOURCE,
+                    "DetailType": gatekeeper.EVENT_DETAIL_TYPE,
+                    "Detail": json.dumps(detail),
+                }
+            ]
+        )
+
+    async def put_event_async(command, detail):
+        loop = asyncio.get_event_loop()
+        with ThreadPoolExecutor() as executor:
+            await loop.run_in_executor(executor, put_event_per_request, command, detail)
+
+    report("per-request client/executor/loop", measure(lambda: asyncio.run(put_event_async("/sre", dict(payload))), iterations))
+    report("module-scope client/executor", measure(lambda: gatekeeper._dispatch_event("/sre", dict(payload)), iterations))
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Authorization decision time of the gatekeeper with thousands of channels and users,
+list scans over the previous hard-coded dicts versus the compiled policy.
+
+Usage: python benchmarks/gatekeeper_policy.py [channels] [users] [decisions]
+"""
+import sys
+import time
+
+from support import load_lambda
+
+
+def legacy_decision(allowed_channels, allowed_commands, restricted_commands, command, action, channel_id, user_name):
+    """
+    The previous _is_authorized_user, _is_valid_channel and _is_valid_action checks
+    """
+    if command in restricted_commands and action in restricted_commands[command]:
+        if user_name not in restricted_commands[command][action]:
+            return False
+    if allowed_channels[command][0] != "*" and channel_id not in allowed_channels[command]:
+        return False
+    return command in allowed_commands and action in allowed_commands[command]
+
+
+def main():
+    channels = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    decisions = int(sys.argv[3]) if len(sys.argv) > 3 else 100000
+    gatekeeper = load_lambda("lambda/gatekeeper", {"SLACK_SIGNING_SECRET": "benchmark"})
+
+    channel_ids = [f"C{i:08d}" for i in range(channels)]
+    user_names = [f"user.{i}" for i in range(users)]
+    actions = ["alert", "ack", "close", "mute", "maintenance", "help"]
+    document = {
+        "version": 1,
+        "commands": {
+            "/ops-bot": {"channels": channel_ids, "actions": actions, "restricted": {"maintenance": user_names}},
+        },
+    }
+
+    compiled_policy = sys.modules[gatekeeper.PolicyLoader.__module__].CompiledPolicy
+    started = time.perf_counter()
+    policy = compiled_policy(document)
+    print(f"compiled {channels} channels and {users} users in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    # Worst case for the list scans: the last channel and user
+    request = ("/ops-bot", "maintenance", channel_ids[-1], user_names[-1])
+    allowed_channels = {"/ops-bot": channel_ids}
+    allowed_commands = {"/ops-bot": actions}
+    restricted_commands = {"/ops-bot": {"maintenance": user_names}}
+
+    started = time.perf_counter()
+    for _ in range(decisions):
+        legacy_decision(allowed_channels, allowed_commands, restricted_commands, *request)
+    legacy_ns = (time.perf_counter() - started) * 1e9 / decisions
+
+    def compiled_decision(command, action, channel_id, user_name):
+        return (
+            policy.is_authorized_user(command, action, user_name)
+            and policy.is_valid_channel(command, channel_id)
+            and policy.is_valid_action(command, action)
+        )
+
+    started = time.perf_counter()
+    for _ in range(decisions):
+        compiled_decision(*request)
+    compiled_ns = (time.perf_counter() - started) * 1e9 / decisions
+
+    print(f"{'list scans':<40} {legacy_ns:10.1f} ns/decision")
+    print(f"{'compiled policy':<40} {compiled_ns:10.1f} ns/decision")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+A burst of /sre alert commands against the gatekeeper with rate limits of 5/60 per user,
+20/60 per channel and 60/60 per command:
+how many reach EventBridge, the handler latency of allowed and throttled requests
+and the cost of the limiter check itself.
+
+Usage: python benchmarks/gatekeeper_rate_limit.py [requests] [endpoint_latency_ms]
+"""
+import itertools
+import sys
+import time
+import urllib.parse
+
+from boto3 import client
+
+from support import FakeAWSServer, load_lambda, measure, quiet, report, slack_event
+
+SECRET = "benchmark"
+# The limits are disabled by default
+LIMITS = {"RATE_LIMIT_PER_USER": "5/60", "RATE_LIMIT_PER_CHANNEL": "20/60", "RATE_LIMIT_PER_COMMAND": "60/60"}
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+    server = FakeAWSServer(latency=latency_ms / 1000)
+    gatekeeper = load_lambda("lambda/gatekeeper", {"SLACK_SIGNING_SECRET": SECRET, **LIMITS})
+    gatekeeper.eventbridge = client("events", endpoint_url=server.url, config=gatekeeper.dispatch_config)
+    trigger_ids = itertools.count()
+
+    def request(user_id, channel_id):
+        body = urllib.parse.urlencode(
+            {
+                "command": "/sre",
+                "text": "alert",
+                "channel_id": channel_id,
+                "user_id": user_id,
+                "user_name": user_id,
+                "trigger_id": f"1.2.{next(trigger_ids)}",
+            }
+        )
+        event = slack_event(body, SECRET)
+        start = time.perf_counter()
+        response = gatekeeper.lambda_handler(event, None)
+        return response["body"] != "", (time.perf_counter() - start) * 1000
+
+    scenarios = (
+        ("one user hammering", lambda i: ("U0000000", "C0000000")),
+        ("many users, one channel", lambda i: (f"U{i:07d}", "C0000001")),
+        ("many users, many channels", lambda i: (f"U{i:07d}", f"C{i:07d}")),
+    )
+    cache = gatekeeper.rate_limiter.local_cache
+    for label, sender in scenarios:
+        # Every scenario starts with full buckets
+        gatekeeper.rate_limiter.local_cache = type(cache)(cache.maxsize, cache.ttl)
+        before = server.requests
+        allowed, throttled = [], []
+        with quiet():
+            for i in range(count):
+                was_throttled, latency = request(*sender(i))
+                (throttled if was_throttled else allowed).append(latency)
+        print(f"{label}: {len(allowed)} dispatched, {len(throttled)} throttled, {server.requests - before} put_events calls")
+        if allowed:
+            report("  allowed", allowed)
+        if throttled:
+            report("  throttled", throttled)
+
+    users = itertools.count()
+    report("limiter check", measure(lambda: gatekeeper.rate_limiter.check("/bench", f"U{next(users)}", "C"), count * 10))
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Dispatch latency of the gatekeeper for the EventBridge route versus a direct
+asynchronous Lambda invoke, both against a local fake AWS endpoint.
+
+Only the gatekeeper side is measured. With EventBridge the event still has to be
+matched by a rule and delivered to the backend afterwards, that hop does not
+exist for direct invokes and is not part of these numbers.
+
+Usage: python benchmarks/gatekeeper_routing.py [iterations] [endpoint_latency_ms]
+"""
+import sys
+
+from boto3 import client
+
+from support import FakeAWSServer, load_lambda, measure, report
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    server = FakeAWSServer(latency=latency_ms / 1000)
+    gatekeeper = load_lambda("lambda/gatekeeper", {"SLACK_SIGNING_SECRET": "benchmark"})
+    gatekeeper.eventbridge = client("events", endpoint_url=server.url, config=gatekeeper.dispatch_config)
+    gatekeeper.lambda_client = client("lambda", endpoint_url=server.url, config=gatekeeper.dispatch_config)
+    payload = {"command": ["/sre"], "text": ["alert"], "channel_id": ["C0000000"], "trigger_id": ["1.2.3"]}
+
+    gatekeeper.ROUTES = {"/sre": {"mode": "eventbridge"}}
+    report("eventbridge put_events", measure(lambda: gatekeeper._dispatch_event("/sre", dict(payload)), iterations))
+
+    gatekeeper.ROUTES = {"/sre": {"mode": "invoke", "function": "opsgenie_lambda"}}
+    report("direct async invoke", measure(lambda: gatekeeper._dispatch_event("/sre", dict(payload)), iterations))
+
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
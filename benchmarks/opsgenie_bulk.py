@@ -0,0 +1,128 @@
+"""
+/ops-bot ack of hundreds of alerts against a local fake Opsgenie adding a handshake cost
+per connection: one bare requests call per alert versus the pooled bulk actions with one
+worker and with OPSGENIE_BULK_WORKERS workers, then the whole modal submission through
+the handler, and a Lambda about to time out to show the deadline.
+
+Usage: python benchmarks/opsgenie_bulk.py [alerts] [opsgenie_latency_ms] [connect_latency_ms]
+"""
+import itertools
+import sys
+import time
+import urllib.parse
+
+import requests
+
+from support import FakeJSONServer, function_env, load_lambda, quiet
+
+from qbot.slack import SlackClient
+
+
+class FakeContext:
+    """
+    The part of the Lambda context the handler reads
+    """
+
+    def __init__(self, remaining_ms):
+        self.deadline = time.monotonic() + remaining_ms / 1000
+
+    def get_remaining_time_in_millis(self):
+        return int((self.deadline - time.monotonic()) * 1000)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.025
+    connect_latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.04
+    alerts = [{"id": f"alert-{i}", "tinyId": str(i), "message": f"disk full on db-{i}"} for i in range(count)]
+    calls = itertools.count()
+
+    def list_alerts(method, path, body):
+        params = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(path).query))
+        offset, limit = int(params["offset"]), int(params["limit"])
+        return 200, {"data": alerts[offset:offset + limit]}
+
+    def alert_action(method, path, body):
+        # One call in 25 is rate limited, as during an alert storm
+        if next(calls) % 25 == 24:
+            return 429, {"message": "rate limited"}, {"Retry-After": "0.2"}
+        return 202, {"result": "Request will be processed", "requestId": "r-1"}
+
+    opsgenie_server = FakeJSONServer(
+        {"/v2/alerts?": list_alerts, "/v2/alerts/": alert_action}, latency=latency, connect_latency=connect_latency
+    )
+    slack_server = FakeJSONServer({"/": {"ok": True, "channel": "C0000000", "ts": "1.2"}})
+    opsgenie = load_lambda(
+        "lambda/opsgenie", function_env("opsgenie", {"OPSGENIE_URL": opsgenie_server.url, "OPSGENIE_SERVICES_CACHE_PATH": ""})
+    )
+    opsgenie.slack = SlackClient("xoxb-benchmark", base_url=slack_server.url)
+
+    def naive():
+        # A loop of requests.post: a new connection per alert, rate limited calls are lost
+        acked = 0
+        for alert in alerts:
+            response = requests.post(
+                f"{opsgenie_server.url}/v2/alerts/{alert['id']}/acknowledge?identifierType=id",
+                headers={"Authorization": "GenieKey benchmark"},
+                json={"user": "benchmark", "source": "Slack"},
+            )
+            acked += response.status_code == 202
+        return {"done": acked, "failed": count - acked, "skipped": 0}
+
+    def bulk(workers):
+        actions = opsgenie.BulkAlertActions(opsgenie_server.url, "benchmark", workers, count, 5)
+        return lambda: actions.run("ack", "database", "benchmark", time.monotonic() + 60)
+
+    def run(label, func):
+        before = (opsgenie_server.connections, opsgenie_server.requests)
+        started = time.perf_counter()
+        with quiet():
+            counts = func()
+        print(
+            f"{label:<40} {(time.perf_counter() - started) * 1000:8.0f}ms  "
+            f"done={counts['done']} failed={counts['failed']} skipped={counts['skipped']}  "
+            f"connections={opsgenie_server.connections - before[0]} calls={opsgenie_server.requests - before[1]}"
+        )
+
+    print(f"ack {count} alerts, Opsgenie latency {latency * 1000:.0f}ms, handshake {connect_latency * 1000:.0f}ms")
+    run("requests.post per alert", naive)
+    run("bulk actions, 1 worker", bulk(1))
+    run(f"bulk actions, {opsgenie.OPSGENIE_BULK_WORKERS} workers", bulk(opsgenie.OPSGENIE_BULK_WORKERS))
+
+    event = {
+        "source": "gatekeeper",
+        "detail": {
+            "v": 1,
+            "route": "/ops-bot",
+            "type": "view_submission",
+            "user_name": "benchmark",
+            "metadata": {"command": "/ops-bot", "text": "ack", "channel_id": "C0000000"},
+            "values": {"alert_query": "database", "alert_note": None},
+            "labels": {},
+        },
+    }
+
+    def handler(context):
+        def submit():
+            before = slack_server.requests
+            opsgenie.lambda_handler(event, context)
+            print(f"  Slack calls: {slack_server.requests - before}", file=sys.stderr)
+            return opsgenie.alert_actions.last_counts
+        return submit
+
+    original_run = opsgenie.alert_actions.run
+
+    def recording_run(*args, **kwargs):
+        opsgenie.alert_actions.last_counts = original_run(*args, **kwargs)
+        return opsgenie.alert_actions.last_counts
+
+    opsgenie.alert_actions.run = recording_run
+    run("handler, modal submission", handler(None))
+    opsgenie.OPSGENIE_BULK_DEADLINE_MARGIN = 1
+    run("handler, 2s left before the timeout", handler(FakeContext(2000)))
+    opsgenie_server.close()
+    slack_server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Time to first modal and time to complete modal of /sre alert with a slow Opsgenie API:
+fetching the services catalog before views.open versus opening a loading modal first
+and filling it in with views.update (static select), the typeahead modal opened directly
+while the catalog is fetched in the background, and with the catalog already cached.
+
+Usage: python benchmarks/opsgenie_modal.py [iterations] [opsgenie_latency_ms] [slack_latency_ms]
+"""
+import sys
+import time
+
+from support import StubHTTP, function_env, load_lambda, percentiles, quiet
+
+# Slack invalidates the trigger_id 3 seconds after the command
+TRIGGER_ID_TTL_MS = 3000
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    opsgenie_latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.8
+    slack_latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.15
+    opsgenie = load_lambda(
+        "lambda/opsgenie",
+        function_env("opsgenie", {"OPSGENIE_SERVICES_CACHE_PATH": "", "OPSGENIE_SERVICES_TYPEAHEAD": "false"}),
+    )
+    typeahead = load_lambda(
+        "lambda/opsgenie",
+        function_env("opsgenie", {"OPSGENIE_SERVICES_CACHE_PATH": "", "OPSGENIE_SERVICES_TYPEAHEAD": "true"}),
+    )
+    catalog = {"data": [{"id": f"svc-{i}", "name": f"service-{i}"} for i in range(200)]}
+    http = StubHTTP(
+        [
+            ("slack.com/api/views.open", {"ok": True, "view": {"id": "V0000000", "hash": "1.abc"}}, slack_latency),
+            ("slack.com/api/", {"ok": True}, slack_latency),
+            ("/v1/services", catalog, opsgenie_latency),
+        ]
+    )
+    for handler in (opsgenie, typeahead):
+        handler.requests = http
+        handler.slack.session = http
+    event = {
+        "source": "gatekeeper",
+        "detail": {"v": 1, "route": "/sre", "type": "command", "text": "alert", "channel_id": "C0000000", "trigger_id": "1.2.3"},
+    }
+
+    def sample(run, handler, cold):
+        """
+        Returns (time to first modal, time to complete modal) in ms, from the views.* calls made by run
+        """
+        if cold:
+            handler.services_cache._fetched_at = None
+        http.history.clear()
+        started = time.perf_counter()
+        with quiet():
+            run()
+        views = [finished for url, finished in http.history if "/views." in url]
+        return (views[0] - started) * 1000, (views[-1] - started) * 1000
+
+    def single_phase():
+        # What the handler did before: the catalog first, views.open once the modal is complete
+        services = opsgenie._get_services()
+        modal = opsgenie._generate_alert_modal(opsgenie._generate_metadata(event["detail"]), services)
+        opsgenie.slack.views_open("1.2.3", modal)
+
+    scenarios = (
+        ("fetch then views.open, cold cache", single_phase, opsgenie, True),
+        ("loading modal then views.update, cold cache", lambda: opsgenie.lambda_handler(event, None), opsgenie, True),
+        ("typeahead, one views.open, cold cache", lambda: typeahead.lambda_handler(event, None), typeahead, True),
+        ("cached catalog, one views.open", lambda: opsgenie.lambda_handler(event, None), opsgenie, False),
+    )
+    for name, run, handler, cold in scenarios:
+        samples = [sample(run, handler, cold) for _ in range(iterations)]
+        first = percentiles([s[0] for s in samples])
+        complete = percentiles([s[1] for s in samples])
+        late = sum(1 for s in samples if s[0] > TRIGGER_ID_TTL_MS)
+        print(
+            f"{name:46} first modal p50={first['p50']:7.1f}ms p95={first['p95']:7.1f}ms"
+            f"  complete p50={complete['p50']:7.1f}ms p95={complete['p95']:7.1f}ms  expired trigger_ids={late}/{iterations}"
+        )
+
+
+if __name__ == "__main__":
+    main()
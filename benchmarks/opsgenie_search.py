@@ -0,0 +1,85 @@
+"""
+Typeahead latency of the service select: index build time and query latency of the
+services search index versus a linear scan, for catalogs with thousands of services,
+and the options load path through the opsgenie handler.
+
+Usage: python benchmarks/opsgenie_search.py [iterations]
+"""
+import itertools
+import random
+import sys
+import time
+
+from support import function_env, load_lambda, measure, quiet, report
+
+from qbot import envelope
+
+WORDS = (
+    "payments checkout auth identity ledger gateway api worker billing search orders inventory "
+    "notifications email sms kafka redis postgres frontend mobile web admin reporting fraud risk "
+    "pricing catalog shipping tracking wallet custody trading settlement compliance kyc"
+).split()
+# What users type: first letters, a word prefix, two words, a substring, a typo-ish fuzzy query, no match
+QUERIES = ("p", "pay", "ledger", "api work", "ateway", "pymnts", "zzzz", "")
+
+
+def catalog(size, seed=7):
+    """
+    Returns size services with multi word names like "Payments Ledger Worker 0042"
+    """
+    rng = random.Random(seed)
+    return [
+        {"id": f"svc-{i}", "name": " ".join(rng.sample(WORDS, 3)).title() + f" {i:04d}"}
+        for i in range(size)
+    ]
+
+
+def linear_search(services, query, limit=100):
+    """
+    The naive alternative: substring scan and sort on every keystroke
+    """
+    query = query.lower()
+    return sorted((s for s in services if query in s["name"].lower()), key=lambda s: s["name"].lower())[:limit]
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    opsgenie = load_lambda("lambda/opsgenie", function_env("opsgenie", {"OPSGENIE_SERVICES_CACHE_PATH": ""}))
+    ServiceIndex = type(opsgenie.ServiceIndex([]))
+
+    for size in (1000, 5000, 20000):
+        services = catalog(size)
+        started = time.perf_counter()
+        index = ServiceIndex(services)
+        print(f"{size} services: index built in {(time.perf_counter() - started) * 1000:.1f} ms")
+        queries = itertools.cycle(QUERIES)
+        report("  index search", measure(lambda: index.search(next(queries)), iterations))
+        report("  linear scan", measure(lambda: linear_search(services, next(queries)), iterations))
+        for query in QUERIES:
+            report(f"    {query!r} ({len(index.search(query))} results)", measure(lambda: index.search(query), iterations))
+
+    # Full options load path of the handler, the catalog cached and the index built
+    services = catalog(5000)
+    opsgenie.services_cache.fetch = lambda: {"data": services}
+    queries = itertools.cycle(QUERIES)
+
+    def options_load():
+        detail = envelope.from_interaction(
+            "/sre",
+            {
+                "type": "block_suggestion",
+                "action_id": "service_select",
+                "value": next(queries),
+                "user": {"id": "U0000000", "username": "benchmark"},
+                "view": {"id": "V0000000", "private_metadata": '{"command": "/sre", "text": "alert"}'},
+            },
+        )
+        return opsgenie.lambda_handler({"source": "gatekeeper", "detail": detail}, None)
+
+    with quiet():
+        options_load()
+    report("options load handler, 5000 services", measure(options_load, iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Latency of getting the Opsgenie services catalog for the /sre alert modal with a
+slow Opsgenie API: fetching on every command versus the stale-while-revalidate cache
+when cold, fresh and stale.
+
+Usage: python benchmarks/opsgenie_services.py [iterations] [opsgenie_latency_ms]
+"""
+import sys
+import time
+
+from support import FakeJSONServer, function_env, load_lambda, measure, quiet, report
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 800.0
+    catalog = {"data": [{"id": f"svc-{i}", "name": f"service-{i}"} for i in range(200)]}
+    server = FakeJSONServer({"/v1/services": catalog}, latency=latency_ms / 1000)
+    opsgenie = load_lambda(
+        "lambda/opsgenie",
+        function_env("opsgenie", {"OPSGENIE_URL": server.url, "OPSGENIE_SERVICES_CACHE_PATH": ""}),
+    )
+    cache = opsgenie.services_cache
+
+    report("fetch on every command", measure(opsgenie._fetch_services, max(3, iterations // 4)))
+
+    def cold():
+        cache._fetched_at = None
+        opsgenie._get_services()
+
+    report("cache cold", measure(cold, max(3, iterations // 4)))
+    report("cache fresh", measure(opsgenie._get_services, iterations))
+
+    def stale():
+        # Age the value past the TTL, the background refresh makes it fresh again
+        cache._fetched_at = time.time() - cache.ttl - 1
+        opsgenie._get_services()
+
+    before = server.requests
+    report("cache stale (background refresh)", measure(stale, iterations))
+    with quiet():
+        cache.refresh_async().result()
+    print(f"stale reads triggered {server.requests - before} background fetches for {iterations} commands")
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
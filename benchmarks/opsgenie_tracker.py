@@ -0,0 +1,164 @@
+"""
+Confirmation of incident create requests against a local fake Opsgenie that processes
+each request after a random delay: every submission polling its own request, the
+IncidentTracker of one execution environment, and the delayed SQS queue (IncidentQueue)
+whose batches are polled by short invocations, for a burst of concurrent submissions.
+The in-memory queue delivers up to 10 visible messages per invocation after a batching
+window of 1 second like the Lambda event source mapping. In Lambda every submission is
+its own invocation, only the queue shares polls between them.
+
+Usage: python benchmarks/opsgenie_tracker.py [submissions] [processing_ms] [opsgenie_latency_ms]
+"""
+import random
+import sys
+import threading
+import time
+import uuid
+
+import requests
+
+from support import FakeJSONServer, percentiles, quiet
+
+sys.path.insert(0, "lambda/opsgenie")
+
+from incident_tracker import IncidentQueue, IncidentTracker  # noqa: E402
+
+NAIVE_POLL_INTERVAL = 0.5
+SQS_BATCH_SIZE = 10
+SQS_BATCHING_WINDOW = 1.0
+
+
+class FakeSQS:
+    """
+    send_message_batch of an SQS client, with a thread invoking `invoke(entries)` with the batches
+    """
+
+    def __init__(self, invoke):
+        self.invoke = invoke
+        self.invocations = 0
+        self._messages = []
+        self._condition = threading.Condition()
+        threading.Thread(target=self._deliver, daemon=True).start()
+
+    def send_message_batch(self, QueueUrl, Entries):
+        with self._condition:
+            for entry in Entries:
+                self._messages.append((time.monotonic() + entry["DelaySeconds"], entry["MessageBody"]))
+            self._condition.notify_all()
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+    def _deliver(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: any(at <= time.monotonic() for at, _ in self._messages), 0.05)
+                if not any(at <= time.monotonic() for at, _ in self._messages):
+                    continue
+            time.sleep(SQS_BATCHING_WINDOW)
+            with self._condition:
+                now = time.monotonic()
+                visible = [message for message in self._messages if message[0] <= now][:SQS_BATCH_SIZE]
+                for message in visible:
+                    self._messages.remove(message)
+            self.invocations += 1
+            records = [{"eventSource": "aws:sqs", "messageId": str(uuid.uuid4()), "body": body} for _, body in visible]
+            self.invoke({"Records": records})
+
+
+def main():
+    submissions = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    processing = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 1.5
+    latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.03
+    rng = random.Random(1)
+    # requestId -> time.monotonic() Opsgenie finished processing it
+    processed_at = {}
+
+    def create(method, path, body):
+        request_id = str(uuid.uuid4())
+        processed_at[request_id] = time.monotonic() + processing * rng.uniform(0.5, 1.5)
+        return 202, {"result": "Request will be processed", "requestId": request_id}
+
+    def status(method, path, body):
+        request_id = path.rsplit("/", 1)[-1]
+        if time.monotonic() < processed_at.get(request_id, float("inf")):
+            return 404, {"message": "Request not processed yet"}
+        return 200, {"data": {"isSuccess": True, "status": "Created", "incidentId": request_id}}
+
+    server = FakeJSONServer(
+        {"/v1/incidents/create": create, "/v1/incidents/requests/": status}, latency=latency, connect_latency=0.04
+    )
+
+    def submit():
+        return requests.post(f"{server.url}/v1/incidents/create", json={}).json()["requestId"]
+
+    def burst(track):
+        """
+        Submits concurrently within a second, returns seconds from processed to confirmed per request
+        """
+        delays = []
+        lock = threading.Lock()
+
+        def confirmed(request_id):
+            with lock:
+                delays.append(time.monotonic() - processed_at[request_id])
+
+        def user(index):
+            time.sleep(index / submissions)
+            track(submit(), confirmed)
+
+        threads = [threading.Thread(target=user, args=(i,)) for i in range(submissions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return delays
+
+    def naive(request_id, confirmed):
+        # Each submission polls its own request on a new connection until it is processed
+        while requests.get(f"{server.url}/v1/incidents/requests/{request_id}").status_code == 404:
+            time.sleep(NAIVE_POLL_INTERVAL)
+        confirmed(request_id)
+
+    tracker = IncidentTracker(server.url, "benchmark", lambda state, request_id, data, callback: callback(request_id), 2)
+
+    def shared(request_id, confirmed):
+        tracker.track(request_id, confirmed)
+
+    # Queue messages carry JSON, the callback is found again by request id
+    callbacks = {}
+    queue_tracker = IncidentTracker(
+        server.url, "benchmark", lambda state, request_id, data, context: callbacks.pop(context)(request_id), 2
+    )
+    sqs = FakeSQS(lambda event: queue_tracker.resolve_queued(IncidentQueue.decode(event), queue))
+    queue = IncidentQueue(sqs, "fake-queue")
+
+    def queued(request_id, confirmed):
+        callbacks[request_id] = confirmed
+        entry = {"request_id": request_id, "context": request_id, "tracked_at": time.time(), "interval": 0.5, "delay": 1}
+        queue.enqueue([entry])
+
+    def drained():
+        while callbacks:
+            time.sleep(0.05)
+
+    for label, track, finish in (
+        (f"polling per submission every {NAIVE_POLL_INTERVAL}s", naive, lambda: None),
+        ("IncidentTracker of one environment", shared, lambda: tracker.wait(60)),
+        ("SQS queue, batches polled", queued, drained),
+    ):
+        before = (server.requests, server.connections)
+        started = time.perf_counter()
+        with quiet():
+            delays = burst(track)
+            finish()
+        stats = percentiles([delay * 1000 for delay in delays])
+        print(
+            f"{label:<40} confirmed={len(delays)}/{submissions} in {time.perf_counter() - started:.1f}s  "
+            f"after processing p50={stats['p50']:.0f}ms p95={stats['p95']:.0f}ms  "
+            f"status calls={server.requests - before[0] - submissions} connections={server.connections - before[1]}"
+        )
+    print(f"SQS queue: {submissions} submission invocations returned at once, {sqs.invocations} polling invocations")
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Time to page of the pushover handler, from the webhook to the Pushover deliveries, against a
+local fake Opsgenie and Pushover. An alert's create, escalate and add note webhooks are sent
+in turn: fetching the alert details for every webhook, webhooks without the details served
+by the alert details cache, and webhooks carrying the message and responders (no fetch).
+
+Usage: python benchmarks/pushover_details.py [alerts] [opsgenie_latency_ms] [pushover_latency_ms]
+"""
+import json
+import sys
+
+from support import FakeJSONServer, function_env, load_lambda, measure, report
+
+ACTIONS = ("Create", "EscalateNext", "AddNote")
+
+
+def main():
+    alerts = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    opsgenie_latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.15
+    pushover_latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.08
+    responders = [{"type": "team", "id": "team-payments"}, {"type": "team", "id": "team-sre"}]
+    message = "Payments API 5xx above 5%"
+
+    alert_details = {"data": {"message": message, "responders": responders}}
+    opsgenie = FakeJSONServer({"/v2/alerts/": alert_details}, latency=opsgenie_latency)
+    pushover_api = FakeJSONServer({"/1/messages.json": {"status": 1, "request": "bench"}}, latency=pushover_latency)
+    pushover = load_lambda(
+        "lambda/pushover",
+        function_env(
+            "pushover",
+            {
+                "AUTH_HEADER": "bench",
+                "OPSGENIE_URL": f"{opsgenie.url}/",
+                "PUSHOVER_URL": f"{pushover_api.url}/1/messages.json",
+                "PUSHOVER_TEAM_ROUTES": json.dumps({"team-payments": "group-payments", "team-sre": "group-sre"}),
+                # Every alert paged, see pushover_digest.py for the coalescing
+                "PUSHOVER_DIGEST_WINDOW": "0",
+            },
+        ),
+    )
+
+    def webhook(alert_id, action, with_details):
+        alert = {"alertId": alert_id}
+        if with_details:
+            alert.update(message=message, responders=responders)
+        return {"headers": {"auth": "bench"}, "body": json.dumps({"action": action, "alert": alert})}
+
+    modes = (
+        ("fetch on every webhook", False, True),
+        ("fetch, alert details cache", False, False),
+        ("details from the webhook", True, False),
+    )
+    print(
+        f"{alerts} alerts x {len(ACTIONS)} webhooks, "
+        f"Opsgenie {opsgenie_latency * 1000:.0f}ms, Pushover {pushover_latency * 1000:.0f}ms"
+    )
+    for label, with_details, clear_cache in modes:
+        events = iter([webhook(f"{label}-{n}", action, with_details) for n in range(alerts) for action in ACTIONS])
+
+        def page():
+            if clear_cache:
+                pushover.alert_cache = pushover.LRUCache(pushover.PUSHOVER_ALERT_CACHE_SIZE)
+            pushover.lambda_handler(next(events), None)
+
+        before = opsgenie.requests
+        report(label, measure(page, alerts * len(ACTIONS)))
+        print(f"  Opsgenie calls per webhook: {(opsgenie.requests - before) / (alerts * len(ACTIONS)):.2f}")
+    opsgenie.close()
+    pushover_api.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Alert storm through the pushover handler against a local fake Pushover: dozens of webhooks
+within seconds, each paging several teams, spread over a few concurrent execution
+environments (handler modules) sharing one digest store. Every alert paged versus
+alerts coalesced into one digest per group and window, with the Pushover messages sent,
+the most sent to one group, how long after its first alert a group was paged and how
+long after an alert its groups got a page or digest covering it.
+
+Usage: python benchmarks/pushover_digest.py [alerts] [storm_seconds] [window_seconds] [environments]
+"""
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from support import FakeJSONServer, function_env, load_lambda, quiet
+
+TEAMS = 6
+MESSAGES = (
+    "Checkout API 5xx above 5%",
+    "Payments DB replica lag above 30s",
+    "Order queue depth above 10k",
+    "Kubernetes node NotReady",
+    "Edge proxy TLS handshake errors",
+)
+
+
+def storm(alerts, seconds, rng):
+    """
+    Returns [(at, alert id, message, team ids)] of the webhooks of a storm, sorted by time
+    """
+    webhooks = []
+    for n in range(alerts):
+        # Most alerts of a storm repeat a few messages
+        message = rng.choices(MESSAGES, weights=(8, 4, 2, 1, 1))[0]
+        webhooks.append((rng.uniform(0, seconds), f"storm-{n}", message, rng.sample(range(TEAMS), 3)))
+    return sorted(webhooks)
+
+
+def run(webhooks, window, environments, pushover_url, sent):
+    """
+    Sends the webhooks to `environments` handler modules, returns {alert id: (at, group keys)} by arrival
+
+    Args:
+    - webhooks (list): The storm
+    - window (float): PUSHOVER_DIGEST_WINDOW, 0 pages every alert
+    - environments (int): Handler modules sharing one digest store
+    - pushover_url (str): The fake Pushover messages URL
+    - sent (list): Cleared, the fake Pushover appends to it
+    """
+    env = {
+        "AUTH_HEADER": "bench",
+        "PUSHOVER_URL": pushover_url,
+        "PUSHOVER_TEAM_ROUTES": json.dumps({f"team-{i}": f"group-{i % 4}" for i in range(TEAMS)}),
+        "PUSHOVER_DIGEST_WINDOW": str(window),
+    }
+    handlers = [load_lambda("lambda/pushover", function_env("pushover", env)) for _ in range(environments)]
+    if window:
+        store = handlers[0].LocalDigestStore()
+        for handler in handlers:
+            handler.coalescer.store = store
+    sent.clear()
+    arrivals = {}
+    start = time.perf_counter()
+    with quiet(), ThreadPoolExecutor(max_workers=environments * 4) as pool:
+        for n, (at, alert_id, message, teams) in enumerate(webhooks):
+            time.sleep(max(at - (time.perf_counter() - start), 0))
+            responders = [{"type": "team", "id": f"team-{team}"} for team in teams]
+            alert = {"alertId": alert_id, "message": message, "responders": responders}
+            event = {"headers": {"auth": "bench"}, "body": json.dumps({"action": "Create", "alert": alert})}
+            arrivals[alert_id] = (time.perf_counter(), sorted({f"group-{team % 4}" for team in teams}))
+            pool.submit(handlers[n % environments].lambda_handler, event, None)
+        pool.shutdown(wait=True)
+        for handler in handlers:
+            if handler.coalescer is not None:
+                handler.coalescer.wait()
+    return arrivals
+
+
+def main():
+    alerts = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+    window = float(sys.argv[3]) if len(sys.argv) > 3 else 2
+    environments = int(sys.argv[4]) if len(sys.argv) > 4 else 3
+
+    sent = []
+    lock = threading.Lock()
+
+    def pushover(method, path, body):
+        form = parse_qs(body.decode())
+        with lock:
+            sent.append((time.perf_counter(), form["user"][0], form["title"][0]))
+        return 200, {"status": 1, "request": "bench"}
+
+    server = FakeJSONServer({"/1/messages.json": pushover}, latency=0.05)
+    webhooks = storm(alerts, seconds, random.Random(11))
+    print(f"{alerts} alerts in {seconds:g}s, 3 teams each routed to 4 groups, {environments} execution environments")
+    for label, digest_window in (("every alert paged", 0), (f"{window:g}s digest window", window)):
+        arrivals = run(webhooks, digest_window, environments, f"{server.url}/1/messages.json", sent)
+        per_group = {}
+        for at, group_key, title in sent:
+            per_group.setdefault(group_key, []).append((at, title))
+        pages = [(at, group_key) for at, group_key, title in sent if title == "Incident detected"]
+        digests = [(at, group_key) for at, group_key, title in sent if title != "Incident detected"]
+
+        first_alert = {}
+        for at, group_keys in sorted(arrivals.values()):
+            for group_key in group_keys:
+                first_alert.setdefault(group_key, at)
+        first_page = [
+            (min(at for at, key in pages if key == group_key) - first_alert[group_key]) * 1000
+            for group_key in first_alert
+        ]
+        # An alert reaches a group with the first page or digest sent to it after the alert arrived
+        reported = []
+        for at, group_keys in arrivals.values():
+            for group_key in group_keys:
+                reported.append(min(sent_at for sent_at, key in pages + digests if key == group_key and sent_at >= at) - at)
+
+        print(label)
+        print(
+            f"  Pushover messages {len(sent):4d} (pages {len(pages)}, digests {len(digests)}), "
+            f"most to one group {max(len(messages) for messages in per_group.values())}"
+        )
+        print(
+            f"  first page of a group after its first alert "
+            f"p50={statistics.median(first_page):7.1f}ms max={max(first_page):7.1f}ms"
+        )
+        print(f"  alert reported to its groups after p50={statistics.median(reported):5.2f}s max={max(reported):5.2f}s")
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
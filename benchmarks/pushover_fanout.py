@@ -0,0 +1,80 @@
+"""
+Webhook to Pushover fan-out for alerts with many responder teams, against a local fake
+Opsgenie and Pushover adding a handshake cost per connection: a requests.post per
+matching team, one after the other, versus the pushover handler (routing map, groups
+de-duplicated, concurrent deliveries over pooled connections).
+
+Usage: python benchmarks/pushover_fanout.py [iterations] [teams] [pushover_latency_ms] [connect_latency_ms]
+"""
+import itertools
+import json
+import sys
+
+import requests
+
+from support import FakeJSONServer, function_env, load_lambda, measure, report
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    teams = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.08
+    connect_latency = float(sys.argv[4]) / 1000 if len(sys.argv) > 4 else 0.06
+    # Two teams share every group, as when a staff group is paged for several teams
+    routes = {f"team-{i}": f"group-{i // 2}" for i in range(teams)}
+    responders = [{"type": "team", "id": team_id} for team_id in routes] + [{"type": "user", "id": "someone"}]
+    alert = {"data": {"message": "Payments API 5xx above 5%", "responders": responders}}
+
+    server = FakeJSONServer(
+        {"/v2/alerts/": alert, "/1/messages.json": {"status": 1, "request": "bench"}},
+        latency=latency,
+        connect_latency=connect_latency,
+    )
+    pushover = load_lambda(
+        "lambda/pushover",
+        function_env(
+            "pushover",
+            {
+                "AUTH_HEADER": "bench",
+                "OPSGENIE_URL": f"{server.url}/",
+                "PUSHOVER_URL": f"{server.url}/1/messages.json",
+                "PUSHOVER_TEAM_ROUTES": json.dumps(routes),
+                # Every alert paged, see pushover_digest.py for the coalescing
+                "PUSHOVER_DIGEST_WINDOW": "0",
+            },
+        ),
+    )
+    # A new alert every webhook, so the handler fetches its details like the sequential version
+    alert_ids = (f"alert-{n}" for n in itertools.count())
+
+    def handler():
+        event = {"headers": {"auth": "bench"}, "body": json.dumps({"alert": {"alertId": next(alert_ids)}})}
+        pushover.lambda_handler(event, None)
+
+    def sequential():
+        # What the handler did: the details, then one new connection per matching team in turn
+        details = requests.get(f"{server.url}/v2/alerts/alert-1").json()["data"]
+        for responder in details["responders"]:
+            group_key = routes.get(responder["id"])
+            if group_key:
+                requests.post(f"{server.url}/1/messages.json", data={"user": group_key, "message": details["message"]})
+
+    groups = len(set(routes.values()))
+    print(f"{teams} responder teams routed to {groups} groups, Pushover latency {latency * 1000:.0f}ms")
+    runs = (
+        ("sequential, request per team", sequential),
+        ("handler, concurrent pooled", handler),
+    )
+    for label, run in runs:
+        before = (server.requests, server.connections)
+        samples = measure(run, iterations)
+        report(label, samples)
+        print(
+            f"  per alert: {(server.requests - before[0]) / iterations:.0f} calls, "
+            f"{(server.connections - before[1]) / iterations:.1f} new connections"
+        )
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
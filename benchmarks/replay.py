@@ -0,0 +1,340 @@
+"""
+Replays recorded requests through the lambda handlers and reports throughput,
+latency percentiles, allocations per request and cold versus warm numbers.
+
+Recordings are JSONL files, one request per line:
+
+    {"function": "gatekeeper", "name": "slash_command", "event": {...}}
+
+`function` is the folder under lambda/, `event` the event as the handler receives
+it (API Gateway proxy event, EventBridge event or keep-warm ping). Slack requests
+to the gatekeeper are signed with a test secret and get unique trigger ids so the
+replay and idempotency guards do not short-circuit them, Opsgenie webhooks get the
+expected auth header. AWS clients point at a local fake endpoint and Slack,
+Opsgenie and Pushover calls are answered by a stub without network I/O.
+
+Usage:
+    python benchmarks/replay.py [recordings.jsonl ...] [--iterations N] [--cold N]
+                                [--json results.json] [--baseline results.json]
+
+With --baseline the script exits with 1 when a warm p95 or cold init p50 is more
+than --max-regression (default 20%) slower than in the baseline results.
+"""
+import argparse
+import copy
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import urllib.parse
+
+from boto3 import client
+
+from support import FakeAWSServer, StubHTTP, function_env, load_lambda, percentiles, quiet, report, slack_event
+
+SECRET = "replay"
+DEFAULT_RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings", "sample.jsonl")
+ENV_OVERRIDES = {
+    "SLACK_SIGNING_SECRET": SECRET,
+    "AUTH_HEADER": "replay-auth",
+    "OPSGENIE_URL": "https://opsgenie.replay/",
+    "PUSHOVER_URL": "https://pushover.replay/1/messages.json",
+    "PUSHOVER_TEAM_ROUTES": json.dumps({"devops": "replay-devops-group", "replay-devops-team": "replay-devops-group"}),
+    # /tmp is empty in a new execution environment, keep cold samples honest
+    "OPSGENIE_SERVICES_CACHE_PATH": "",
+    # Recordings are replayed far faster than users type, keep the limiter in the path without throttling
+    "RATE_LIMIT_PER_USER": "1000000/60",
+    "RATE_LIMIT_PER_CHANNEL": "1000000/60",
+    "RATE_LIMIT_PER_COMMAND": "1000000/60",
+    # Alert submissions wait for the stubbed incident request status, poll it right away
+    "OPSGENIE_INCIDENT_FIRST_POLL": "0.001",
+}
+# Allocation tracing slows every call down, it runs on fewer iterations than the timing pass
+ALLOCATION_ITERATIONS = 20
+
+
+def load_recordings(paths):
+    """
+    Reads the recorded requests of every JSONL file
+
+    Args:
+    - paths (list): Paths of the recording files
+    """
+    records = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+    return records
+
+
+def stub_http(env):
+    """
+    Canned answers for the Slack, Opsgenie and Pushover endpoints the lambdas call
+
+    Args:
+    - env (dict): The environment the lambdas were loaded with
+    """
+    return StubHTTP(
+        [
+            ("slack.com/api/conversations.info", {"ok": True, "channel": {"id": "C0000000", "name": "sre"}}),
+            ("slack.com/api/views.open", {"ok": True, "view": {"id": "V0000000", "hash": "1.replay"}}),
+            ("slack.com/api/", {"ok": True}),
+            ("/v1/services", {"data": [{"id": f"svc-{i}", "name": f"service-{i}"} for i in range(50)]}),
+            ("/v1/incidents/requests/", {"data": {"isSuccess": True, "status": "Created", "incidentId": "replay"}}),
+            ("/v1/incidents/create", {"result": "Request will be processed", "requestId": "replay"}),
+            (
+                "/v2/alerts/",
+                {
+                    "data": {
+                        "message": "Replayed alert",
+                        "responders": [{"type": "team", "id": "replay-devops-team"}],
+                    }
+                },
+            ),
+            (env["PUSHOVER_URL"], {"status": 1, "request": "replay"}),
+        ]
+    )
+
+
+def load_function(function, server):
+    """
+    Loads a lambda with its outbound clients pointed at the fake endpoint and the stub
+
+    Args:
+    - function (str): The folder of the lambda under lambda/
+    - server (FakeAWSServer): The fake AWS endpoint
+    """
+    env = function_env(function, ENV_OVERRIDES)
+    module = load_lambda(f"lambda/{function}", env)
+    for name, service in (("eventbridge", "events"), ("lambda_client", "lambda")):
+        if hasattr(module, name):
+            setattr(module, name, client(service, endpoint_url=server.url, config=getattr(module, "dispatch_config", None)))
+    http = stub_http(env)
+    if hasattr(module, "requests"):
+        module.requests = http
+    if hasattr(module, "session"):
+        module.session = http
+    for name in ("slack", "alert_actions", "incident_tracker"):
+        if hasattr(module, name):
+            getattr(module, name).session = http
+    return module, env
+
+
+def _unique_body(body, sequence):
+    """
+    Suffixes the trigger and view ids of a Slack request body with a sequence number
+    """
+    fields = urllib.parse.parse_qs(body, keep_blank_values=True)
+    if "trigger_id" in fields:
+        fields["trigger_id"] = [f"{fields['trigger_id'][0]}.{sequence}"]
+    if "payload" in fields:
+        payload = json.loads(fields["payload"][0])
+        if "trigger_id" in payload:
+            payload["trigger_id"] = f"{payload['trigger_id']}.{sequence}"
+        if "id" in payload.get("view", {}):
+            payload["view"]["id"] = f"{payload['view']['id']}.{sequence}"
+        fields["payload"] = [json.dumps(payload)]
+    return urllib.parse.urlencode(fields, doseq=True)
+
+
+def prepare(record, env, sequence):
+    """
+    Returns the event of a record ready to be replayed
+
+    Args:
+    - record (dict): The recorded request
+    - env (dict): The environment the lambda was loaded with
+    - sequence (int): Number of the replay, keeps Slack trigger ids unique
+    """
+    event = copy.deepcopy(record["event"])
+    if record["function"] == "gatekeeper" and event.get("body"):
+        body = _unique_body(event["body"], sequence)
+        signed = slack_event(body, env["SLACK_SIGNING_SECRET"])
+        event["body"] = body
+        event["headers"] = {**(event.get("headers") or {}), **signed["headers"]}
+    elif record["function"] == "pushover":
+        event["headers"] = {**(event.get("headers") or {}), "auth": env["AUTH_HEADER"]}
+    return event
+
+
+def run_warm(records, iterations, server):
+    """
+    Replays every record iterations times after one warm-up pass.
+    Returns (latencies per record label, {function: (module, env)}, handler seconds per function).
+    """
+    modules = {}
+    for function in sorted({r["function"] for r in records}):
+        with quiet():
+            modules[function] = load_function(function, server)
+
+    sequence = 0
+    planned = []
+    for _ in range(iterations + 1):
+        for record in records:
+            sequence += 1
+            planned.append((record, prepare(record, modules[record["function"]][1], sequence)))
+
+    latencies = {}
+    busy = {}
+    with quiet():
+        for index, (record, event) in enumerate(planned):
+            handler = modules[record["function"]][0].lambda_handler
+            start = time.perf_counter()
+            handler(event, None)
+            elapsed = time.perf_counter() - start
+            if index < len(records):
+                continue
+            latencies.setdefault(f"{record['function']}/{record['name']}", []).append(elapsed * 1000)
+            busy[record["function"]] = busy.get(record["function"], 0.0) + elapsed
+    return latencies, modules, busy
+
+
+def run_allocations(records, modules, iterations):
+    """
+    Returns {label: (peak KiB, retained KiB)} averaged per request, traced with tracemalloc
+    """
+    allocations = {}
+    sequence = 10**6
+    tracemalloc.start()
+    with quiet():
+        for _ in range(iterations):
+            for record in records:
+                sequence += 1
+                module, env = modules[record["function"]]
+                event = prepare(record, env, sequence)
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                module.lambda_handler(event, None)
+                current, peak = tracemalloc.get_traced_memory()
+                label = f"{record['function']}/{record['name']}"
+                allocations.setdefault(label, []).append(((peak - before) / 1024, (current - before) / 1024))
+    tracemalloc.stop()
+    return {
+        label: (sum(s[0] for s in samples) / len(samples), sum(s[1] for s in samples) / len(samples))
+        for label, samples in allocations.items()
+    }
+
+
+def cold_child(function, paths):
+    """
+    Runs in a fresh interpreter: times module initialization and the first invocation
+    """
+    record = next(
+        r
+        for r in load_recordings(paths)
+        if r["function"] == function and r["event"].get("detail-type") != "Scheduled Event"
+    )
+    server = FakeAWSServer()
+    with quiet():
+        start = time.perf_counter()
+        module, env = load_function(function, server)
+        init = time.perf_counter() - start
+        event = prepare(record, env, 0)
+        start = time.perf_counter()
+        module.lambda_handler(event, None)
+        first = time.perf_counter() - start
+    server.close()
+    print(json.dumps({"init_ms": init * 1000, "first_ms": first * 1000}))
+
+
+def run_cold(functions, paths, samples):
+    """
+    Starts samples fresh interpreters per function and returns {function: {"init_ms": [...], "first_ms": [...]}}
+    """
+    cold = {}
+    for function in functions:
+        results = {"init_ms": [], "first_ms": []}
+        for _ in range(samples):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--cold-child", function, *paths],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            sample = json.loads(output.strip().splitlines()[-1])
+            results["init_ms"].append(sample["init_ms"])
+            results["first_ms"].append(sample["first_ms"])
+        cold[function] = results
+    return cold
+
+
+def compare(results, baseline, max_regression):
+    """
+    Returns the list of regressions of results against baseline
+    """
+    regressions = []
+    for label, stats in results["warm"].items():
+        before = baseline.get("warm", {}).get(label)
+        if before and stats["p95"] > before["p95"] * (1 + max_regression):
+            regressions.append(f"{label} warm p95 {before['p95']:.3f}ms -> {stats['p95']:.3f}ms")
+    for function, stats in results.get("cold", {}).items():
+        before = baseline.get("cold", {}).get(function)
+        if before and stats["init_ms"]["p50"] > before["init_ms"]["p50"] * (1 + max_regression):
+            regressions.append(
+                f"{function} cold init p50 {before['init_ms']['p50']:.3f}ms -> {stats['init_ms']['p50']:.3f}ms"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recordings", nargs="*", default=[DEFAULT_RECORDINGS], help="JSONL recording files")
+    parser.add_argument("--iterations", type=int, default=200, help="Warm replays of every record")
+    parser.add_argument("--cold", type=int, default=5, help="Fresh interpreters per function, 0 to skip")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results file of a previous run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed slowdown against the baseline")
+    parser.add_argument("--cold-child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_child:
+        return cold_child(args.cold_child, args.recordings)
+
+    records = load_recordings(args.recordings)
+    server = FakeAWSServer()
+    latencies, modules, busy = run_warm(records, args.iterations, server)
+    results = {"warm": {}, "throughput_rps": {}, "allocations_kib": {}, "cold": {}}
+
+    print("Warm latency")
+    for label, samples in latencies.items():
+        report(label, samples)
+        results["warm"][label] = percentiles(samples)
+
+    print("\nThroughput (single thread, handler time only)")
+    for function, seconds in busy.items():
+        count = sum(len(s) for label, s in latencies.items() if label.startswith(f"{function}/"))
+        results["throughput_rps"][function] = count / seconds
+        print(f"{function:<40} {count / seconds:10.1f} req/s")
+
+    print("\nAllocations per request")
+    for label, (peak, retained) in run_allocations(records, modules, ALLOCATION_ITERATIONS).items():
+        results["allocations_kib"][label] = {"peak": peak, "retained": retained}
+        print(f"{label:<40} peak={peak:9.1f}KiB retained={retained:9.1f}KiB")
+    server.close()
+
+    if args.cold:
+        print("\nCold start (fresh interpreter per sample)")
+        for function, samples in run_cold(sorted(modules), args.recordings, args.cold).items():
+            results["cold"][function] = {key: percentiles(values) for key, values in samples.items()}
+            report(f"{function} init", samples["init_ms"])
+            report(f"{function} first invocation", samples["first_ms"])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Slack Web API calls against a local fake Slack: a bare requests call per message (a new
+connection each time, 429s dropped) versus the shared qbot.slack client (keep-alive pool,
+Retry-After honored), and sequential calls versus AsyncSlackClient for a fan-out.
+
+The fake adds connect_latency to every new connection, standing in for the TCP and TLS
+handshakes with slack.com.
+
+Usage: python benchmarks/slack_client.py [iterations] [slack_latency_ms] [connect_latency_ms]
+"""
+import asyncio
+import itertools
+import sys
+import time
+
+import requests
+
+from support import FakeJSONServer, measure, quiet, report
+
+from qbot.slack import AsyncSlackClient, SlackClient
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.03
+    connect_latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.06
+    calls = itertools.count()
+
+    def post_message(method, path, body):
+        # Every third call is rate limited, as during an alert storm
+        if next(calls) % 3 == 2:
+            return 429, {"ok": False, "error": "ratelimited"}, {"Retry-After": "1"}
+        return 200, {"ok": True, "ts": "1.2"}
+
+    server = FakeJSONServer(
+        {"/chat.postMessage": post_message, "/": {"ok": True}}, latency=latency, connect_latency=connect_latency
+    )
+    slack = SlackClient("xoxb-benchmark", base_url=server.url)
+
+    def bare():
+        # What every lambda did: no session, no timeout, the response is not retried
+        requests.post(
+            f"{server.url}/conversations.info",
+            headers={"Authorization": "Bearer xoxb-benchmark"},
+            json={"channel": "C0000000"},
+        )
+
+    before = server.connections
+    report("requests.post per call", measure(bare, iterations))
+    print(f"  connections opened: {server.connections - before} for {iterations} calls")
+    before = server.connections
+    report("SlackClient", measure(lambda: slack.call("conversations.info", {"channel": "C0000000"}), iterations))
+    print(f"  connections opened: {server.connections - before} for {iterations} calls")
+
+    messages = 9
+    delivered = 0
+    for _ in range(messages):
+        response = requests.post(f"{server.url}/chat.postMessage", json={"channel": "C0000000", "text": "hi"})
+        delivered += response.ok
+    print(f"rate limited channel, requests.post: {delivered}/{messages} messages delivered")
+    started = time.perf_counter()
+    with quiet():
+        delivered = sum(bool(slack.post_message("C0000000", "hi").get("ok")) for _ in range(messages))
+    print(
+        f"rate limited channel, SlackClient: {delivered}/{messages} messages delivered "
+        f"in {time.perf_counter() - started:.1f}s (Retry-After 1s)"
+    )
+
+    server.routes["/chat.postMessage"] = {"ok": True, "ts": "1.2"}
+    channels = [f"C{i:07d}" for i in range(slack.pool_size)]
+    async_slack = AsyncSlackClient(slack)
+
+    async def fan_out():
+        return await asyncio.gather(*(async_slack.post_message(channel, "hi") for channel in channels))
+
+    report(f"{len(channels)} messages, sequential", measure(lambda: [slack.post_message(c, "hi") for c in channels], 5))
+    report(f"{len(channels)} messages, AsyncSlackClient", measure(lambda: asyncio.run(fan_out()), 5))
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
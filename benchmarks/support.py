@@ -0,0 +1,306 @@
+"""
+Helpers shared by the benchmark scripts in this folder.
+
+Handlers are loaded by path with local.loader. Outbound AWS calls are pointed at
+a local fake endpoint so the numbers include real client and connection costs
+without touching AWS.
+"""
+import contextlib
+import hashlib
+import hmac
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from local import terraform  # noqa: E402
+from local.loader import load_lambda, placeholder_env  # noqa: E402
+
+# load_lambda is re-exported so the benchmarks only import from this module, after it set up sys.path
+__all__ = [
+    "REPO_ROOT",
+    "load_lambda",
+    "function_env",
+    "slack_event",
+    "FakeAWSServer",
+    "FakeJSONServer",
+    "StubResponse",
+    "StubHTTP",
+    "quiet",
+    "measure",
+    "percentiles",
+    "report",
+]
+
+def function_env(function, overrides=None):
+    """
+    Placeholder values for the environment variables lambda.tf sets on a function
+
+    Args:
+    - function (str): The folder of the lambda under lambda/
+    - overrides (dict): Values to use instead of placeholders
+    """
+    functions, _ = terraform.load()
+    names = set()
+    for spec in functions.values():
+        if spec["directory"] == f"lambda/{function}":
+            names.update(spec["env"])
+    env = placeholder_env(names, "benchmark")
+    env.update(overrides or {})
+    return env
+
+
+def slack_event(body, secret, timestamp=None):
+    """
+    Builds an API Gateway proxy event carrying a correctly signed Slack request
+
+    Args:
+    - body (str): The URL encoded Slack request body
+    - secret (str): The Slack signing secret
+    - timestamp (int): The X-Slack-Request-Timestamp value, defaults to now
+    """
+    timestamp = str(int(time.time()) if timestamp is None else timestamp)
+    signature = "v0=" + hmac.new(
+        secret.encode("utf-8"), f"v0:{timestamp}:{body}".encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+    return {
+        "headers": {"X-Slack-Signature": signature, "X-Slack-Request-Timestamp": timestamp},
+        "body": body,
+    }
+
+
+class FakeAWSServer:
+    """
+    Minimal HTTP endpoint answering AWS JSON protocol calls (EventBridge PutEvents, Lambda Invoke)
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                target = self.headers.get("X-Amz-Target", "")
+                if target.endswith("PutEvents"):
+                    entries = json.loads(body).get("Entries", [])
+                    response = json.dumps(
+                        {
+                            "FailedEntryCount": 0,
+                            "Entries": [{"EventId": str(uuid.uuid4())} for _ in entries],
+                        }
+                    ).encode()
+                    status = 200
+                else:
+                    response = b""
+                    status = 202
+                self.send_response(status)
+                self.send_header("Content-Type", "application/x-amz-json-1.1")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FakeJSONServer:
+    """
+    Minimal HTTP endpoint standing in for a third party JSON API (Opsgenie, Slack...).
+    `routes` maps a path prefix to the response data, or to a callable taking
+    (method, path, body) and returning (status, data) or (status, data, headers).
+    Unknown paths get a 404. `connect_latency` is added once per new connection,
+    standing in for the TCP and TLS handshakes of a real API.
+    """
+
+    def __init__(self, routes, latency=0.0, connect_latency=0.0):
+        self.routes = routes
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.requests = 0
+        self.connections = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                server.connections += 1
+                if server.connect_latency:
+                    time.sleep(server.connect_latency)
+
+            def _handle(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                status, data, headers = 404, {"message": "not found"}, {}
+                for prefix, route in server.routes.items():
+                    if self.path.startswith(prefix):
+                        result = route(self.command, self.path, body) if callable(route) else (200, route)
+                        status, data, headers = (*result, {})[:3]
+                        break
+                response = json.dumps(data).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            do_GET = do_POST = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class StubResponse:
+    """
+    The parts of requests.Response the lambdas use
+    """
+
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self._data = data
+        self.text = json.dumps(data)
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class StubHTTP:
+    """
+    Stands in for the requests module in a lambda, answering by URL substring
+    without network I/O. Unknown URLs get a 404.
+
+    Args:
+    - routes (list): (url_substring, response_data) pairs, the first match wins. An optional
+      third item is the latency of the route in seconds.
+    """
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.calls = 0
+        # (url, perf_counter when the response was returned) of every call
+        self.history = []
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        response = StubResponse(404, {"ok": False, "error": "not_found"})
+        for fragment, data, *latency in self.routes:
+            if fragment in url:
+                if latency:
+                    time.sleep(latency[0])
+                response = StubResponse(200, data)
+                break
+        self.history.append((url, time.perf_counter()))
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Discards everything printed inside the block
+    """
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def measure(func, iterations):
+    """
+    Calls func repeatedly and returns the latency of each call in milliseconds.
+    Handler output is discarded so printing does not skew the numbers.
+
+    Args:
+    - func (callable): The function to measure
+    - iterations (int): Number of calls
+    """
+    samples = []
+    with quiet():
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def percentiles(samples):
+    """
+    Returns {"n", "mean", "p50", "p95", "p99"} for a list of millisecond samples
+
+    Args:
+    - samples (list): Latencies in milliseconds
+    """
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    return {
+        "n": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": pct(50),
+        "p95": pct(95),
+        "p99": pct(99),
+    }
+
+
+def report(label, samples):
+    """
+    Prints mean and percentile latency for a list of millisecond samples
+
+    Args:
+    - label (str): Name of the measured scenario
+    - samples (list): Latencies in milliseconds
+    """
+    stats = percentiles(samples)
+    print(
+        f"{label:<40} n={stats['n']:<6} mean={stats['mean']:8.3f}ms "
+        f"p50={stats['p50']:8.3f}ms p95={stats['p95']:8.3f}ms p99={stats['p99']:8.3f}ms"
+    )
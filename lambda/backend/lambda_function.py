@@ -0,0 +1,114 @@
+import json
+import importlib.util
+import os
+import sys
+import threading
+import time
+from qbot import envelope
+from qbot.dispatch import DispatchTable, action_of
+from qbot.log import get_logger
+
+logger = get_logger("backend")
+
+"""
+Consolidated backend: serves the commands of several backends from one function, so one
+warm pool of execution environments answers every low-traffic command instead of one per
+command. backends.json maps every backend folder to the routes and actions it serves. The
+folders are packaged next to this file (scripts/package-lambda.sh), in the repository they
+are its siblings under lambda/.
+
+A backend's lambda_function is imported on the first event routed to it and keep-warm pings
+load every backend, so a cold environment only pays for the backend its first request needs.
+Backends share the Slack client of the process (qbot.slack.shared_client). Their helper
+modules are imported by bare name from their folder, they must not share names across backends.
+"""
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_CONFIG_PATH = os.environ.get("BACKEND_CONFIG_PATH", os.path.join(BACKEND_DIR, "backends.json"))
+
+backends = {}
+backends_lock = threading.Lock()
+dispatch_table = DispatchTable()
+
+
+def _load_config(path=BACKEND_CONFIG_PATH):
+    """
+    Registers every route and action of backends.json in the dispatch table, returns the backend names
+
+    Args:
+    - path (str): Path of backends.json
+    """
+    with open(path) as f:
+        config = json.load(f)
+    names = []
+    for name, routes in config.get("backends", {}).items():
+        for route, actions in routes.items():
+            dispatch_table.register(route, actions, lambda event, context, name=name: _backend(name).lambda_handler(event, context))
+        names.append(name)
+    return names
+
+
+BACKENDS = _load_config()
+
+
+def lambda_handler(event, context):
+    """
+    Process event from event bridge or a direct invoke and hand it to the backend of its route and action
+    """
+    # Check if the incoming event is a Scheduled Event from EventBridge to keep the lambda function warm.
+    if (
+        event.get("source") == "aws.events"
+        and event.get("detail-type") == "Scheduled Event"
+    ):
+        logger.info("Received keep-warm event, warming every backend")
+        for name in BACKENDS:
+            try:
+                _backend(name).lambda_handler(event, context)
+            except Exception as e:
+                logger.error("Failed to warm backend", backend=name, error=repr(e))
+        return {"statusCode": 200, "body": json.dumps("Keep-warm event processed.")}
+
+    detail = envelope.decode(event["detail"])
+    handler = dispatch_table.resolve(detail)
+    if handler is None:
+        logger.warning("No backend for event", route=detail.get("route"), action=action_of(detail), type=detail.get("type"))
+        return {"statusCode": 404, "body": "No backend for this command"}
+    # Backends decode the envelope again, decode() returns a current envelope as is
+    event["detail"] = detail
+    return handler(event, context)
+
+
+def _backend(name):
+    """
+    Returns the lambda_function module of a backend, importing it on first use
+
+    Args:
+    - name (str): The backend folder, e.g. opsgenie
+    """
+    module = backends.get(name)
+    if module is not None:
+        return module
+    with backends_lock:
+        module = backends.get(name)
+        if module is None:
+            started = time.perf_counter()
+            directory = _backend_dir(name)
+            spec = importlib.util.spec_from_file_location(f"{name}_lambda_function", os.path.join(directory, "lambda_function.py"))
+            module = importlib.util.module_from_spec(spec)
+            # The backend imports its helper modules by bare name, at import time or later
+            if directory not in sys.path:
+                sys.path.append(directory)
+            spec.loader.exec_module(module)
+            backends[name] = module
+            logger.info("Loaded backend", backend=name, duration_ms=round((time.perf_counter() - started) * 1000, 1))
+    return module
+
+
+def _backend_dir(name):
+    """
+    Returns the folder of a backend: packaged next to this file, or its sibling in the repository
+    """
+    for base in (BACKEND_DIR, os.path.dirname(BACKEND_DIR)):
+        directory = os.path.join(base, name)
+        if os.path.isfile(os.path.join(directory, "lambda_function.py")):
+            return directory
+    raise FileNotFoundError(f"Backend {name} not found next to {BACKEND_DIR}")
@@ -0,0 +1,135 @@
+"""
+Micro-batching of EventBridge PutEvents entries.
+
+Entries submitted within a short window are sent in a single put_events call,
+respecting the EventBridge limits of 10 entries and 256 KB per request. Every
+submitted entry gets its own future, resolved with its EventId or failed with
+the ErrorCode EventBridge reported for that entry.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# EventBridge PutEvents limits
+MAX_BATCH_ENTRIES = 10
+MAX_BATCH_BYTES = 256 * 1024
+
+
+class PutEventsError(Exception):
+    """
+    Raised for an entry EventBridge rejected inside an otherwise successful put_events call
+    """
+
+    def __init__(self, error_code, error_message):
+        super().__init__(f"{error_code}: {error_message}")
+        self.error_code = error_code
+        self.error_message = error_message
+
+
+def entry_size(entry):
+    """
+    Calculates the size EventBridge accounts for a PutEvents entry
+
+    Args:
+    - entry (dict): The PutEvents request entry
+    """
+    size = 14 if entry.get("Time") else 0
+    for field in ("Source", "DetailType", "Detail"):
+        size += len(entry.get(field, "").encode("utf-8"))
+    for resource in entry.get("Resources", []):
+        size += len(resource.encode("utf-8"))
+    return size
+
+
+def resolve_entries(response, futures):
+    """
+    Maps the per-entry results of a put_events response back to the futures of the submitted entries
+
+    Args:
+    - response (dict): The put_events response
+    - futures (list): One future per submitted entry, in request order
+    """
+    entries = response.get("Entries", [])
+    for future, result in zip(futures, entries):
+        if "ErrorCode" in result:
+            future.set_exception(PutEventsError(result["ErrorCode"], result.get("ErrorMessage", "")))
+        else:
+            future.set_result(result.get("EventId"))
+    # A response with fewer results than entries must not leave the remaining futures pending forever
+    for future in futures[len(entries):]:
+        future.set_exception(PutEventsError("MissingResult", "put_events returned no result for the entry"))
+
+
+class EventBatcher:
+    """
+    Collects entries for at most `window` seconds and sends them together.
+    `put_events` is called with the list of entries and returns the put_events response,
+    batches are sent on `executor` so a slow call does not hold back the next window.
+    """
+
+    def __init__(self, put_events, executor, window):
+        self.put_events = put_events
+        self.executor = executor
+        self.window = window
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, entry):
+        """
+        Queues an entry for the next batch and returns a future for its result
+
+        Args:
+        - entry (dict): The PutEvents request entry
+        """
+        future = Future()
+        size = entry_size(entry)
+        if size > MAX_BATCH_BYTES:
+            future.set_exception(PutEventsError("EntryTooLarge", f"Entry is {size} bytes"))
+            return future
+
+        self._ensure_started()
+        self._queue.put((entry, size, future))
+        return future
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="eventbridge-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        carry = None
+        while True:
+            batch = [carry or self._queue.get()]
+            batch_bytes = batch[0][1]
+            carry = None
+            deadline = time.monotonic() + self.window
+
+            while len(batch) < MAX_BATCH_ENTRIES:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                # Start the next batch with the entry that does not fit anymore
+                if batch_bytes + item[1] > MAX_BATCH_BYTES:
+                    carry = item
+                    break
+                batch.append(item)
+                batch_bytes += item[1]
+
+            self.executor.submit(self._send, batch)
+
+    def _send(self, batch):
+        futures = [future for _, _, future in batch]
+        try:
+            response = self.put_events([entry for entry, _, _ in batch])
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        resolve_entries(response, futures)
@@ -0,0 +1,136 @@
+"""
+Idempotency guard against Slack retries.
+
+A key is claimed in the in-memory tier of the warm container first and then in
+an optional shared tier, so a retry landing on another execution environment is
+caught as well. Shared tiers implement `claim(key, ttl)` and return False when
+the key was already claimed and has not expired, and `release(key)` dropping a
+claim so a request whose dispatch failed is accepted again when Slack retries it.
+"""
+import threading
+import time
+
+from qbot.log import get_logger
+
+logger = get_logger("gatekeeper.idempotency")
+
+
+class LocalIdempotencyStore:
+    """
+    Shared tier stand-in keeping claims in process memory, for tests and local runs
+    """
+
+    def __init__(self):
+        self._claims = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key, ttl):
+        """
+        Claims key for ttl seconds. Returns False if it is already claimed.
+
+        Args:
+        - key (str): The idempotency key
+        - ttl (int): Seconds the claim is kept
+        """
+        now = time.time()
+        with self._lock:
+            if self._claims.get(key, 0) > now:
+                return False
+            self._claims[key] = now + ttl
+            return True
+
+    def release(self, key):
+        """
+        Drops the claim of key
+
+        Args:
+        - key (str): The idempotency key
+        """
+        with self._lock:
+            self._claims.pop(key, None)
+
+
+class DynamoDBIdempotencyStore:
+    """
+    Shared tier backed by a DynamoDB table with a string partition key `id`.
+    Enable DynamoDB TTL on the `expires_at` attribute to have old claims removed.
+    """
+
+    def __init__(self, dynamodb, table_name):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+
+    def claim(self, key, ttl):
+        """
+        Claims key for ttl seconds with a conditional put. Returns False if it is already claimed.
+
+        Args:
+        - key (str): The idempotency key
+        - ttl (int): Seconds the claim is kept
+        """
+        now = int(time.time())
+        try:
+            self.dynamodb.put_item(
+                TableName=self.table_name,
+                Item={"id": {"S": key}, "expires_at": {"N": str(now + ttl)}},
+                # DynamoDB TTL deletes lazily, so expired items still present count as free
+                ConditionExpression="attribute_not_exists(id) OR expires_at < :now",
+                ExpressionAttributeValues={":now": {"N": str(now)}},
+            )
+        except self.dynamodb.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    def release(self, key):
+        """
+        Drops the claim of key
+
+        Args:
+        - key (str): The idempotency key
+        """
+        self.dynamodb.delete_item(TableName=self.table_name, Key={"id": {"S": key}})
+
+
+class IdempotencyGuard:
+    """
+    Two tier check whether a request key is seen for the first time
+    """
+
+    def __init__(self, local_cache, ttl, shared=None):
+        self.local_cache = local_cache
+        self.ttl = ttl
+        self.shared = shared
+
+    def first_seen(self, key):
+        """
+        Returns True the first time key is seen within the TTL, False for duplicates.
+        Errors of the shared tier are logged and treated as first seen.
+
+        Args:
+        - key (str): The idempotency key
+        """
+        if not self.local_cache.add(key):
+            return False
+        if self.shared is None:
+            return True
+        try:
+            return self.shared.claim(key, self.ttl)
+        except Exception as e:
+            logger.error("Idempotency store unavailable, dispatching anyway", error=repr(e))
+            return True
+
+    def forget(self, key):
+        """
+        Forgets key in both tiers, so the next request with it counts as first seen.
+        Errors of the shared tier are logged.
+
+        Args:
+        - key (str): The idempotency key
+        """
+        self.local_cache.delete(key)
+        if self.shared is None:
+            return
+        try:
+            self.shared.release(key)
+        except Exception as e:
+            logger.error("Idempotency store unavailable, key not released", error=repr(e))
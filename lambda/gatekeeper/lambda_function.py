@@ -1,56 +1,163 @@
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
 from boto3 import client
+from botocore.config import Config
+from batcher import EventBatcher, resolve_entries
+from qbot.flush_extension import FlushExtension, RUNTIME_API
+from policy import PolicyLoader
+from idempotency import DynamoDBIdempotencyStore, IdempotencyGuard
+from rate_limiter import DynamoDBRateLimitStore, RateLimiter, parse_limit
+from qbot import envelope
+from qbot.cache import LRUCache
+from qbot.log import get_logger
 import hashlib
 import hmac
 import urllib.parse
 import json
+import math
 import os
+import time
 
+logger = get_logger("gatekeeper")
 
 # Slack constants
 SLACK_SIGNING_SECRET = os.environ["SLACK_SIGNING_SECRET"]
-
-# Channel and command constants
-ALLOWED_CHANNELS = {
-    "/sre": ["*"],  # Commmand can be used in any channel
-    "/ops-bot": ["C05RSEC6QCA"],  # Command can be used in designated channels
-    "/qchain": ["*"],
-}
-ALLOWED_COMMANDS = {
-    "/sre": ["alert"],
-    "/ops-bot": ["alert", "ack", "close", "mute", "maintenance", "help"],
-    "/command": ["test"],
-    "/qchain": ["killswitch"],
-}
-
-RESTRICTED_COMMANDS = {
-    "/qchain": {
-        "killswitch": ["urban.jurca", "iris.garcia", "chris", "alexander", "david", "tangui", "khalifa", "lazar"],
-    },
-}
+# Keyed HMAC state computed once, copied for every request
+SLACK_SIGNING_HMAC = hmac.new(SLACK_SIGNING_SECRET.encode("utf-8"), digestmod=hashlib.sha256)
+# Requests whose timestamp is further than this many seconds from now are rejected as replays
+SLACK_REQUEST_MAX_AGE = int(os.environ.get("SLACK_REQUEST_MAX_AGE", "300"))
+SIGNATURE_CACHE_SIZE = int(os.environ.get("SIGNATURE_CACHE_SIZE", "10000"))
+
+# Authorization policy: allowed channels, actions and restricted users per command
+POLICY_PATH = os.environ.get(
+    "GATEKEEPER_POLICY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "policy.json")
+)
+
+# Routing: per command either "eventbridge" (default) or "invoke" to call the backend function directly
+ROUTES_PATH = os.environ.get(
+    "GATEKEEPER_ROUTES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "routes.json")
+)
+with open(ROUTES_PATH) as f:
+    ROUTES = json.load(f)
+
+# Idempotency constants: Slack retries within this many seconds are acknowledged without dispatching again
+IDEMPOTENCY_TTL = int(os.environ.get("IDEMPOTENCY_TTL", "900"))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# Optional DynamoDB table shared by all execution environments
+IDEMPOTENCY_TABLE = os.environ.get("IDEMPOTENCY_TABLE")
+
+# Rate limits of slash commands as "capacity/seconds" per user, per channel and per command, "0" (default) disables one
+RATE_LIMIT_PER_USER = parse_limit(os.environ.get("RATE_LIMIT_PER_USER", "0"))
+RATE_LIMIT_PER_CHANNEL = parse_limit(os.environ.get("RATE_LIMIT_PER_CHANNEL", "0"))
+RATE_LIMIT_PER_COMMAND = parse_limit(os.environ.get("RATE_LIMIT_PER_COMMAND", "0"))
+RATE_LIMIT_CACHE_SIZE = int(os.environ.get("RATE_LIMIT_CACHE_SIZE", "10000"))
+# Optional DynamoDB table to enforce the limits across execution environments
+RATE_LIMIT_TABLE = os.environ.get("RATE_LIMIT_TABLE")
 
 # EventBridge constants
 EVENT_BUS_NAME = "default"
 EVENT_SOURCE = "gatekeeper"
 EVENT_DETAIL_TYPE = "Slack Command Invoked"
+EVENTBRIDGE_MAX_WORKERS = int(os.environ.get("EVENTBRIDGE_MAX_WORKERS", "4"))
+EVENTBRIDGE_DISPATCH_TIMEOUT = float(os.environ.get("EVENTBRIDGE_DISPATCH_TIMEOUT", "2.5"))
+# Collect events for up to this many milliseconds into one put_events call, 0 disables batching.
+# Only used with GATEKEEPER_ACK_FIRST: a Lambda execution environment serves one request at a time,
+# so a batch never combines requests of different environments and the window only delays the dispatch.
+EVENTBRIDGE_BATCH_WINDOW_MS = float(os.environ.get("EVENTBRIDGE_BATCH_WINDOW_MS", "0"))
+# Upper bound for the batch window so it never eats into Slack's 3 second budget
+MAX_BATCH_WINDOW_MS = 250
+# Seconds the backend may take to answer an options load, Slack gives up after 3 seconds
+OPTIONS_LOAD_TIMEOUT = float(os.environ.get("OPTIONS_LOAD_TIMEOUT", "2.5"))
+# Acknowledge Slack as soon as the request is validated and finish the EventBridge dispatch in the background
+ACK_FIRST = os.environ.get("GATEKEEPER_ACK_FIRST", "false").lower() == "true"
+
+"""
+Initialize clients before lambda_handler so warm invocations reuse the same
+connection pool and worker threads instead of rebuilding them per request
+"""
+dispatch_config = Config(
+    max_pool_connections=EVENTBRIDGE_MAX_WORKERS,
+    tcp_keepalive=True,
+    connect_timeout=1,
+    read_timeout=2,
+    retries={"max_attempts": 2, "mode": "standard"},
+)
+eventbridge = client("events", config=dispatch_config)
+# Only created when a command is routed with direct invoke or answers options loads,
+# loading a service model costs cold start time
+lambda_client = (
+    client("lambda", config=dispatch_config)
+    if any(route.get("mode") == "invoke" or route.get("options") for route in ROUTES.values())
+    else None
+)
+executor = ThreadPoolExecutor(
+    max_workers=EVENTBRIDGE_MAX_WORKERS, thread_name_prefix="eventbridge"
+)
+batcher = None
+if EVENTBRIDGE_BATCH_WINDOW_MS > 0 and not ACK_FIRST:
+    logger.warning("EVENTBRIDGE_BATCH_WINDOW_MS is ignored without GATEKEEPER_ACK_FIRST, the window would delay the ack")
+elif EVENTBRIDGE_BATCH_WINDOW_MS > 0:
+    batcher = EventBatcher(
+        lambda entries: eventbridge.put_events(Entries=entries),
+        executor,
+        min(EVENTBRIDGE_BATCH_WINDOW_MS, MAX_BATCH_WINDOW_MS) / 1000,
+    )
+policy = PolicyLoader(POLICY_PATH)
+# Signatures of recently accepted requests. A timestamp stays acceptable for at most twice the max age.
+seen_signatures = LRUCache(SIGNATURE_CACHE_SIZE, 2 * SLACK_REQUEST_MAX_AGE)
+# Shared by the idempotency and rate limit tables, only created when one of them is configured
+dynamodb = (
+    client("dynamodb", config=Config(tcp_keepalive=True, connect_timeout=1, read_timeout=1))
+    if IDEMPOTENCY_TABLE or RATE_LIMIT_TABLE
+    else None
+)
+idempotency = IdempotencyGuard(
+    LRUCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL),
+    IDEMPOTENCY_TTL,
+    DynamoDBIdempotencyStore(dynamodb, IDEMPOTENCY_TABLE) if IDEMPOTENCY_TABLE else None,
+)
+rate_limits = {"user": RATE_LIMIT_PER_USER, "channel": RATE_LIMIT_PER_CHANNEL, "command": RATE_LIMIT_PER_COMMAND}
+rate_limiter = RateLimiter(
+    # An expired bucket is a full one, so entries only need to live for the longest refill period
+    LRUCache(RATE_LIMIT_CACHE_SIZE, max((limit[1] for limit in rate_limits.values() if limit), default=1)),
+    rate_limits,
+    DynamoDBRateLimitStore(dynamodb, RATE_LIMIT_TABLE) if RATE_LIMIT_TABLE else None,
+)
+# Holds the environment open after the response until background dispatches finished
+flusher = FlushExtension("gatekeeper-flush")
+if ACK_FIRST:
+    flusher.register()
 
 
 def lambda_handler(event, context):
     """
     Validate and decode request from Slack. Route the payload to EventBRidge.
     """
-    print(event)
+    started = time.perf_counter()
+    try:
+        return _handle_request(event)
+    finally:
+        logger.info("Acknowledged request", time_to_ack_ms=round((time.perf_counter() - started) * 1000, 1))
+        flusher.invocation_finished()
+
+
+def _handle_request(event):
+    """
+    Validate and route a single request, returns the response for API Gateway
+
+    Args:
+    - event (dict): The event object from the lambda handler
+    """
+    logger.debug_payload("Received event", event=event)
     # Check if the incoming event is a Scheduled Event from EventBridge to keep the lambda function warm.
     if (
         event.get("source") == "aws.events"
         and event.get("detail-type") == "Scheduled Event"
     ):
-        print("Received keep-warm event. Exiting without further processing.")
+        logger.info("Received keep-warm event. Exiting without further processing.")
         return {"statusCode": 200, "body": json.dumps("Keep-warm event processed.")}
 
     if not _is_valid_request(event):
-        print("Invalid request signature")
+        logger.warning("Invalid request signature")
         return {"statusCode": 200, "body": "Invalid request signature"}
 
     # This is the payload from slack whi is in URL encoded format. Always decode it.
@@ -59,11 +166,20 @@ def lambda_handler(event, context):
     # If the payload has a "payload" field, assume its an interactivity event otherwise assume its a slash command
     if "payload" in decoded_body:
         payload = json.loads(decoded_body["payload"][0])
-        print(payload)
+        logger.debug_payload("Received interactivity payload", payload=payload)
         private_metadata = json.loads(payload["view"]["private_metadata"])
         command = private_metadata.get("command")
 
-        asyncio.run(_put_event_to_eventbridge_async(command, decoded_body))
+        # Options loads of external selects are answered synchronously, they change nothing
+        if payload.get("type") == "block_suggestion":
+            return _load_options(command, envelope.from_interaction(command, payload))
+
+        key = _idempotency_key(event, decoded_body, payload)
+        if key is not None and not idempotency.first_seen(key):
+            logger.info("Duplicate request, already dispatched", command=command)
+            return {"statusCode": 200, "body": ""}
+
+        _dispatch_event(command, envelope.from_interaction(command, payload), key)
         return {"statusCode": 200, "body": ""}
     else:
         channel_id = decoded_body.get("channel_id", [None])[0]
@@ -73,35 +189,88 @@ def lambda_handler(event, context):
         action = decoded_body.get("text", [None])[0]
 
         if not _is_authorized_user(command, action, user_name):
-            print("User not authorized")
+            logger.warning("User not authorized", command=command, action=action, user_name=user_name)
             return {
                 "statusCode": 200,
                 "body": "User not authorized",
             }
 
         if not _is_valid_channel(command, channel_id):
-            print("Invalid channel usage")
+            logger.warning("Invalid channel usage", command=command, channel_id=channel_id)
             return {
                 "statusCode": 200,
                 "body": "Invalid channel usage. Contact application owner for more information.",
             }
 
         if not _is_valid_action(command, action):
-            print("Invalid command usage")
+            logger.warning("Invalid command usage", command=command, action=action)
             return {
                 "statusCode": 200,
                 "body": "Invalid command usage. Only the following actions are allowed for "
                 + command
                 + ": "
-                + ", ".join(ALLOWED_COMMANDS[command])
+                + ", ".join(policy.get().action_names.get(command, ()))
                 + ".",
             }
 
-        asyncio.run(_put_event_to_eventbridge_async(command, decoded_body))
+        key = _idempotency_key(event, decoded_body)
+        if key is not None and not idempotency.first_seen(key):
+            logger.info("Duplicate request, already dispatched", command=command)
+            return {"statusCode": 200, "body": ""}
+
+        # After the duplicate check, so Slack retries do not use up tokens
+        scope, retry_after = rate_limiter.check(command, user_id, channel_id)
+        if scope is not None:
+            logger.warning("Rate limited", command=command, scope=scope, user_id=user_id, channel_id=channel_id)
+            return {"statusCode": 200, "body": _rate_limited_message(command, scope, retry_after)}
+
+        _dispatch_event(command, envelope.from_command(command, decoded_body), key)
         # return {"statusCode": 200, "body": f"Received Slack message: {decoded_body}"}
         return {"statusCode": 200, "body": ""}
 
 
+def _idempotency_key(event, decoded_body, payload=None):
+    """
+    Returns the key identifying a Slack request across retries: the trigger_id or the view id
+    of an interactivity event. None when the request has neither, the signature is no key:
+    Slack signs a retry again with a new timestamp and an identical one is a replay, rejected
+    by _is_valid_request
+
+    Args:
+    - event (dict): The event object from the lambda handler
+    - decoded_body (dict): The decoded request body
+    - payload (dict): The decoded interactivity payload, if any
+    """
+    if payload is not None:
+        if payload.get("trigger_id"):
+            return "trigger:" + payload["trigger_id"]
+        if payload.get("view", {}).get("id"):
+            return "view:" + payload["view"]["id"]
+    elif decoded_body.get("trigger_id"):
+        return "trigger:" + decoded_body["trigger_id"][0]
+
+    if "X-Slack-Retry-Num" in event["headers"]:
+        logger.info("Slack retry without trigger_id, dispatching again", retry_num=event["headers"]["X-Slack-Retry-Num"])
+    return None
+
+
+def _rate_limited_message(command, scope, retry_after):
+    """
+    Returns the message shown to a throttled user
+
+    Args:
+    - command (str): The command from the slack request
+    - scope (str): The limit that was hit: user, channel or command
+    - retry_after (float): Seconds until the request would be allowed
+    """
+    wait = f"Please try again in {math.ceil(retry_after)} seconds."
+    if scope == "user":
+        return f"You are using {command} too often. {wait}"
+    if scope == "channel":
+        return f"{command} is used too often in this channel. {wait}"
+    return f"{command} is receiving too many requests right now. {wait}"
+
+
 def _is_authorized_user(command, action, user_name):
     """
     Validates authorization of user to a given command + action
@@ -111,18 +280,13 @@ def _is_authorized_user(command, action, user_name):
     - action (str): The action from the slack request
     - user_name (str): The user_name from the slack request
     """
-    if command not in RESTRICTED_COMMANDS:
-        return True
-    elif action not in RESTRICTED_COMMANDS[command]:
-        return True
-    elif user_name in RESTRICTED_COMMANDS[command][action]:
-        return True
+    return policy.get().is_authorized_user(command, action, user_name)
 
-    return False
 
 def _is_valid_request(event):
     """
-    Validates Slack request signature
+    Validates Slack request signature. Stale timestamps and signatures seen before are
+    rejected before any HMAC is computed.
 
     Args:
     - event (dict): The event object from the lambda handler
@@ -131,20 +295,30 @@ def _is_valid_request(event):
     slack_request_timestamp = event["headers"].get("X-Slack-Request-Timestamp", "")
     request_body = event["body"]
 
+    try:
+        request_age = abs(time.time() - int(slack_request_timestamp))
+    except ValueError:
+        return False
+    if request_age > SLACK_REQUEST_MAX_AGE:
+        logger.warning("Request timestamp outside of the replay window", timestamp=slack_request_timestamp)
+        return False
+
+    if slack_signature in seen_signatures:
+        logger.warning("Replayed request signature")
+        return False
+
     # Create a basestring by concatenating the version, the request timestamp, and the request body
     base_string = f"v0:{slack_request_timestamp}:{request_body}"
 
     # Calculate the HMAC using SHA256
-    calculated_signature = (
-        "v0="
-        + hmac.new(
-            bytes(SLACK_SIGNING_SECRET, "utf-8"),
-            msg=bytes(base_string, "utf-8"),
-            digestmod=hashlib.sha256,
-        ).hexdigest()
-    )
+    signing_hmac = SLACK_SIGNING_HMAC.copy()
+    signing_hmac.update(base_string.encode("utf-8"))
+    calculated_signature = "v0=" + signing_hmac.hexdigest()
 
-    return hmac.compare_digest(calculated_signature, slack_signature)
+    if not hmac.compare_digest(calculated_signature, slack_signature):
+        return False
+    # Only remember verified signatures, otherwise anyone could fill the cache
+    return seen_signatures.add(slack_signature)
 
 
 def _is_valid_channel(command, channel_id):
@@ -155,13 +329,7 @@ def _is_valid_channel(command, channel_id):
     - command (str): The command from the slack request
     - channel_id (str): The channel id from the slack request
     """
-    if ALLOWED_CHANNELS[command][0] == "*":
-        return True
-
-    if channel_id not in ALLOWED_CHANNELS[command]:
-        return False
-    else:
-        return True
+    return policy.get().is_valid_channel(command, channel_id)
 
 
 def _is_valid_action(command, action):
@@ -172,27 +340,82 @@ def _is_valid_action(command, action):
     - command (str): The command from the slack request
     - action (str): The action from the slack request
     """
-    if command not in ALLOWED_COMMANDS.keys():
-        return False
-    if action not in ALLOWED_COMMANDS[command]:
-        return False
-    return True
+    return policy.get().is_valid_action(command, action)
 
 
-async def _put_event_to_eventbridge_async(command, payload):
+def _dispatch_event(command, payload, key=None):
     """
-    Workaround method to perform async calls from a lambda function. Slack requires a response within 3 seconds.
+    Sends the event through the long-lived executor, either directly to the backend function when the
+    command is routed with invoke, or to EventBridge (batched when enabled). Slack requires a response within 3 seconds. In ack-first mode the dispatch is left running and
+    flushed by the extension after the response, otherwise it waits at most EVENTBRIDGE_DISPATCH_TIMEOUT seconds.
+    When the dispatch fails the idempotency key is forgotten, so a Slack retry of the request is dispatched again.
 
     Args:
     - command (str): The command from the slack request
-    - payload (dict): The payload from the slack request
+    - payload (dict): The envelope built from the slack request
+    - key (str): The idempotency key claimed for the request, if any
     """
-    loop = asyncio.get_event_loop()
+    route = ROUTES.get(command, {})
+    if route.get("mode") == "invoke":
+        future = executor.submit(_invoke_backend, command, payload, route)
+    elif batcher is not None:
+        future = batcher.submit(_build_entry(command, payload))
+    else:
+        future = executor.submit(_put_event_to_eventbridge, command, payload)
+    if key is not None:
+        future.add_done_callback(lambda f: _forget_failed_dispatch(key, f))
+    # Inside Lambda a background dispatch is only safe when the extension can delay the freeze
+    if ACK_FIRST and (flusher.registered or not RUNTIME_API):
+        flusher.track(future)
+        future.add_done_callback(lambda f: _log_dispatch_error(command, f))
+        return future
+
+    try:
+        future.result(timeout=EVENTBRIDGE_DISPATCH_TIMEOUT)
+    except Exception as e:
+        # Never raise here, Slack would show the user a generic dispatch_failed error
+        logger.error("Error dispatching event", command=command, error=repr(e))
+    return future
+
+
+def _log_dispatch_error(command, future):
+    """
+    Logs the error of a background dispatch
 
-    with ThreadPoolExecutor() as executor:
-        await loop.run_in_executor(
-            executor, _put_event_to_eventbridge, command, payload
-        )
+    Args:
+    - command (str): The command from the slack request
+    - future (concurrent.futures.Future): The finished dispatch
+    """
+    if future.exception() is not None:
+        logger.error("Error dispatching event", command=command, error=repr(future.exception()))
+
+
+def _forget_failed_dispatch(key, future):
+    """
+    Forgets the idempotency key of a failed dispatch
+
+    Args:
+    - key (str): The idempotency key claimed for the request
+    - future (concurrent.futures.Future): The finished dispatch
+    """
+    if future.exception() is not None:
+        idempotency.forget(key)
+
+
+def _build_entry(command, payload):
+    """
+    Builds the PutEvents entry for the given payload
+
+    Args:
+    - command (str): The command from the slack request
+    - payload (dict): The envelope built from the slack request
+    """
+    return {
+        "EventBusName": EVENT_BUS_NAME,
+        "Source": EVENT_SOURCE,
+        "DetailType": EVENT_DETAIL_TYPE,
+        "Detail": envelope.encode(payload),
+    }
 
 
 def _put_event_to_eventbridge(command, payload):
@@ -201,20 +424,102 @@ def _put_event_to_eventbridge(command, payload):
 
     Args:
     - command (str): The command from the slack request
-    - payload (dict): The payload from the slack request
-    """
-    eventbridge = client("events")
-    payload["route"] = command
-
-    eventbridge.put_events(
-        Entries=[
-            {
-                "EventBusName": EVENT_BUS_NAME,
-                "Source": EVENT_SOURCE,
-                "DetailType": EVENT_DETAIL_TYPE,
-                "Detail": json.dumps(payload),
-            }
-        ]
-    )
+    - payload (dict): The envelope built from the slack request
+    """
+    response = eventbridge.put_events(Entries=[_build_entry(command, payload)])
+
+    # put_events reports rejected entries in the response instead of raising
+    future = Future()
+    resolve_entries(response, [future])
+    event_id = future.result()
+    logger.info("Event sent to EventBridge", command=command, event_id=event_id)
+    return event_id
+
 
-    print("Event sent to EventBridge")
+def _invoke_backend(command, payload, route):
+    """
+    Invokes the backend function of the command asynchronously with the same event shape
+    EventBridge delivers. Falls back to EventBridge unless the route sets "fallback": false.
+
+    Args:
+    - command (str): The command from the slack request
+    - payload (dict): The envelope built from the slack request
+    - route (dict): The route of the command from ROUTES
+    """
+    try:
+        response = lambda_client.invoke(
+            FunctionName=route["function"],
+            InvocationType="Event",
+            Payload=_backend_event(payload),
+        )
+    except Exception as e:
+        if not route.get("fallback", True):
+            raise
+        logger.warning("Direct invoke failed, falling back to EventBridge", command=command, error=repr(e))
+        return _put_event_to_eventbridge(command, payload)
+
+    logger.info("Invoked backend", command=command, function=route["function"], status_code=response["StatusCode"])
+    return response["StatusCode"]
+
+
+def _backend_event(payload):
+    """
+    Returns the invoke payload of a backend function, shaped like the event EventBridge delivers
+
+    Args:
+    - payload (dict): The envelope built from the slack request
+    """
+    event = {
+        "version": "0",
+        "source": EVENT_SOURCE,
+        "detail-type": EVENT_DETAIL_TYPE,
+        "detail": payload,
+    }
+    return json.dumps(event, separators=(",", ":")).encode("utf-8")
+
+
+def _load_options(command, payload):
+    """
+    Answers a Slack options load by invoking the backend of the command synchronously
+    when its route sets "options": true. Returns no options when that fails or takes
+    longer than OPTIONS_LOAD_TIMEOUT.
+
+    Args:
+    - command (str): The command from the view's private_metadata
+    - payload (dict): The envelope built from the block_suggestion payload
+    """
+    route = ROUTES.get(command, {})
+    if not route.get("options") or lambda_client is None:
+        logger.warning("Options load for a command without options route", command=command)
+        return _options_response([])
+
+    def invoke():
+        response = lambda_client.invoke(
+            FunctionName=route["function"],
+            InvocationType="RequestResponse",
+            Payload=_backend_event(payload),
+        )
+        result = json.loads(response["Payload"].read())
+        if response.get("FunctionError"):
+            raise RuntimeError(f"{response['FunctionError']}: {result}")
+        return result
+
+    try:
+        return executor.submit(invoke).result(timeout=OPTIONS_LOAD_TIMEOUT)
+    except Exception as e:
+        logger.error("Options load failed", command=command, action_id=payload.get("action_id"), error=repr(e))
+        return _options_response([])
+
+
+def _options_response(options):
+    """
+    Returns the API Gateway response of an options load
+
+    Args:
+    - options (list): Block Kit options
+    """
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps({"options": options}),
+    }
@@ -0,0 +1,124 @@
+"""
+Authorization policy of the gatekeeper.
+
+The policy document (policy.json) lists per command the channels it may be used
+in, the allowed actions and the users restricted actions are limited to:
+
+    {
+        "version": 1,
+        "commands": {
+            "/ops-bot": {"channels": ["C05RSEC6QCA"], "actions": ["alert", "ack"]},
+            "/qchain": {"channels": ["*"], "actions": ["killswitch"], "restricted": {"killswitch": ["chris"]}}
+        }
+    }
+
+It is compiled once into frozensets and dicts so every decision is a hash lookup,
+and recompiled only when the file changes.
+"""
+import json
+import os
+import threading
+import time
+
+from qbot.log import get_logger
+
+ANY_CHANNEL = "*"
+
+logger = get_logger("gatekeeper.policy")
+
+
+class CompiledPolicy:
+    """
+    Hash-indexed form of a policy document
+    """
+
+    __slots__ = ("version", "any_channel", "channels", "actions", "action_names", "restricted")
+
+    def __init__(self, document):
+        commands = document.get("commands", {})
+        self.version = document.get("version")
+        # Commands usable in every channel
+        self.any_channel = frozenset(
+            command for command, rules in commands.items() if ANY_CHANNEL in rules.get("channels", [])
+        )
+        self.channels = frozenset(
+            (command, channel)
+            for command, rules in commands.items()
+            for channel in rules.get("channels", [])
+            if channel != ANY_CHANNEL
+        )
+        self.actions = frozenset(
+            (command, action) for command, rules in commands.items() for action in rules.get("actions", [])
+        )
+        # Kept in document order for user facing messages
+        self.action_names = {command: tuple(rules.get("actions", [])) for command, rules in commands.items()}
+        self.restricted = {
+            (command, action): frozenset(users)
+            for command, rules in commands.items()
+            for action, users in rules.get("restricted", {}).items()
+        }
+
+    def is_authorized_user(self, command, action, user_name):
+        """
+        Returns False only for restricted command + action combinations the user is not listed for
+
+        Args:
+        - command (str): The command from the slack request
+        - action (str): The action from the slack request
+        - user_name (str): The user_name from the slack request
+        """
+        users = self.restricted.get((command, action))
+        return users is None or user_name in users
+
+    def is_valid_channel(self, command, channel_id):
+        """
+        Validates command and channel id combination, unknown commands are never valid
+
+        Args:
+        - command (str): The command from the slack request
+        - channel_id (str): The channel id from the slack request
+        """
+        return command in self.any_channel or (command, channel_id) in self.channels
+
+    def is_valid_action(self, command, action):
+        """
+        Validates command and action combination
+
+        Args:
+        - command (str): The command from the slack request
+        - action (str): The action from the slack request
+        """
+        return (command, action) in self.actions
+
+
+class PolicyLoader:
+    """
+    Returns the compiled policy of a file, recompiling only when its mtime changes.
+    The file is checked at most every `check_interval` seconds.
+    """
+
+    def __init__(self, path, check_interval=30):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._policy = None
+        self._mtime = None
+        self._next_check = 0
+
+    def get(self):
+        """
+        Returns the current CompiledPolicy
+        """
+        now = time.monotonic()
+        if self._policy is not None and now < self._next_check:
+            return self._policy
+
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime != self._mtime:
+                with open(self.path) as f:
+                    self._policy = CompiledPolicy(json.load(f))
+                self._mtime = mtime
+                logger.info("Loaded policy", version=self._policy.version, path=self.path)
+            self._next_check = now + self.check_interval
+        return self._policy
@@ -0,0 +1,195 @@
+"""
+Token bucket rate limiting of slash commands per user, per channel and per command.
+
+Every limit is "capacity/seconds": a bucket holds up to `capacity` tokens and
+refills completely within `seconds`. A request takes one token from each of its
+buckets and is throttled when any of them is empty. Buckets live in the memory of
+the warm container first. An optional shared tier limits across execution
+environments, it implements `take(buckets)` for the [(key, capacity, seconds)]
+of a request, counts the request in all of them or in none and returns the
+index of the first full bucket with the seconds to wait, (None, 0) when the
+request is allowed.
+"""
+import math
+import threading
+import time
+
+from qbot.log import get_logger
+
+logger = get_logger("gatekeeper.rate_limiter")
+
+
+def parse_limit(value):
+    """
+    Parses a "capacity/seconds" limit, returns None for "0" or an empty value (no limit)
+
+    Args:
+    - value (str): The limit, e.g. "5/60" for five requests a minute
+    """
+    if not value or value.strip() == "0":
+        return None
+    capacity, seconds = value.split("/")
+    return int(capacity), float(seconds)
+
+
+class LocalRateLimitStore:
+    """
+    Shared tier stand-in keeping fixed windows in process memory, for tests and local runs
+    """
+
+    def __init__(self):
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def take(self, buckets):
+        """
+        Counts one request in the current window of every bucket, or in none when one is full.
+        Returns (index, seconds until its window ends) of the first full bucket, (None, 0) otherwise.
+
+        Args:
+        - buckets (list): (key, capacity, seconds) of every bucket of the request
+        """
+        now = time.time()
+        with self._lock:
+            counted = []
+            for index, (key, capacity, seconds) in enumerate(buckets):
+                window = int(now // seconds)
+                start, count = self._windows.get(key, (window, 0))
+                if start != window:
+                    count = 0
+                if count >= capacity:
+                    return index, (window + 1) * seconds - now
+                counted.append((key, window, count + 1))
+            for key, window, count in counted:
+                self._windows[key] = (window, count)
+            return None, 0
+
+
+class DynamoDBRateLimitStore:
+    """
+    Shared tier backed by a DynamoDB table with a string partition key `id`.
+    Counts requests per fixed window, an approximation of the token bucket that needs
+    no read-modify-write. The buckets of a request are counted with one TransactWriteItems
+    call of conditional updates, so a throttled request is counted in none of them.
+    Enable DynamoDB TTL on the `expires_at` attribute to have old windows removed.
+    """
+
+    def __init__(self, dynamodb, table_name, attempts=3):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.attempts = attempts
+
+    def take(self, buckets):
+        """
+        Counts one request in the current window of every bucket, or in none when one is full.
+        Returns (index, seconds until its window ends) of the first full bucket, (None, 0) otherwise.
+        Transactions cancelled by concurrent requests for the same buckets are retried.
+
+        Args:
+        - buckets (list): (key, capacity, seconds) of every bucket of the request
+        """
+        now = time.time()
+        items = []
+        for key, capacity, seconds in buckets:
+            window = int(now // seconds)
+            items.append(
+                {
+                    "Update": {
+                        "TableName": self.table_name,
+                        "Key": {"id": {"S": f"{key}#{window}"}},
+                        "UpdateExpression": "ADD requests :one SET expires_at = :expires_at",
+                        "ConditionExpression": "attribute_not_exists(requests) OR requests < :capacity",
+                        "ExpressionAttributeValues": {
+                            ":one": {"N": "1"},
+                            ":capacity": {"N": str(capacity)},
+                            ":expires_at": {"N": str(math.ceil((window + 1) * seconds))},
+                        },
+                    }
+                }
+            )
+        for attempt in range(self.attempts):
+            try:
+                self.dynamodb.transact_write_items(TransactItems=items)
+                return None, 0
+            except self.dynamodb.exceptions.TransactionCanceledException as e:
+                reasons = [reason.get("Code") for reason in e.response.get("CancellationReasons", [])]
+                if "ConditionalCheckFailed" in reasons:
+                    index = reasons.index("ConditionalCheckFailed")
+                    seconds = buckets[index][2]
+                    return index, (int(now // seconds) + 1) * seconds - now
+                if attempt == self.attempts - 1:
+                    raise
+
+
+class RateLimiter:
+    """
+    Two tier token bucket limiter keyed by user, channel and command.
+    `local_cache` is a qbot.cache.LRUCache holding (tokens, updated) per bucket, its TTL must be at least
+    the longest refill period since an evicted or expired bucket counts as full. `limits` maps
+    "user", "channel" and "command" to (capacity, seconds), or None to not limit that scope.
+    """
+
+    def __init__(self, local_cache, limits, shared=None):
+        self.local_cache = local_cache
+        self.limits = {scope: limit for scope, limit in limits.items() if limit}
+        self.shared = shared
+        self._lock = threading.Lock()
+
+    def check(self, command, user_id, channel_id):
+        """
+        Takes a token for the request from every bucket. Returns (scope, seconds to wait)
+        of the first empty bucket, or (None, 0) when the request is allowed. The local tokens of a
+        request the shared tier throttles are given back. Errors of the shared tier are logged and
+        the request is allowed.
+
+        Args:
+        - command (str): The command from the slack request
+        - user_id (str): The user id from the slack request
+        - channel_id (str): The channel id from the slack request
+        """
+        keys = self._keys(command, user_id, channel_id)
+        now = time.monotonic()
+        with self._lock:
+            buckets = {}
+            for scope, key in keys:
+                capacity, seconds = self.limits[scope]
+                tokens, updated = self.local_cache.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated) * capacity / seconds)
+                if tokens < 1:
+                    return scope, (1 - tokens) * seconds / capacity
+                buckets[key] = tokens
+            # Only take tokens once every bucket has one, a throttled request costs nothing
+            for key, tokens in buckets.items():
+                self.local_cache.set(key, (tokens - 1, now))
+
+        if self.shared is None or not keys:
+            return None, 0
+        try:
+            index, retry_after = self.shared.take([(key, *self.limits[scope]) for scope, key in keys])
+        except Exception as e:
+            logger.error("Rate limit store unavailable, allowing request", error=repr(e))
+            return None, 0
+        if index is None:
+            return None, 0
+        self._refund(keys)
+        return keys[index][0], retry_after
+
+    def _refund(self, keys):
+        """
+        Gives back the local tokens of a request the shared tier throttled, it was never run
+        """
+        with self._lock:
+            for scope, key in keys:
+                capacity, _ = self.limits[scope]
+                tokens, updated = self.local_cache.get(key, (capacity, time.monotonic()))
+                self.local_cache.set(key, (min(capacity, tokens + 1), updated))
+
+    def _keys(self, command, user_id, channel_id):
+        keys = []
+        if "user" in self.limits:
+            keys.append(("user", f"user:{command}:{user_id}"))
+        if "channel" in self.limits:
+            keys.append(("channel", f"channel:{command}:{channel_id}"))
+        if "command" in self.limits:
+            keys.append(("command", f"command:{command}"))
+        return keys
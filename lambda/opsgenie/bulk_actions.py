@@ -0,0 +1,253 @@
+"""
+Bulk Opsgenie alert actions for /ops-bot: acknowledge, close or snooze every alert
+matching a search query.
+
+The matching alerts are listed first, page by page, and only then acted on: the
+query filters on the status the actions change, so paging while closing would
+shift the offsets and skip alerts. The per-alert calls run on a bounded thread
+pool sharing one Session whose connection pool has a connection per worker, so
+hundreds of alerts cost a few handshakes and take about alerts / workers round
+trips. Nothing is started past the deadline, alerts not reached are reported as
+skipped and are picked up by running the command again.
+
+Rate limited calls (HTTP 429) and 5xx are retried with jittered exponential
+backoff, after Retry-After when Opsgenie sends one, as long as the retry fits
+before the deadline. Failures are counted, not raised: raising in a backend makes
+EventBridge deliver the event again.
+"""
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from qbot.log import get_logger
+
+logger = get_logger("opsgenie.bulk")
+
+# Opsgenie returns at most 100 alerts per page
+ALERT_PAGE_SIZE = 100
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.25
+BACKOFF_CAP = 2.0
+
+"""
+Actions by name: (API action of /v2/alerts/{id}/<action>, filter added to the query, past tense for reports).
+Only alerts the action changes are selected, acknowledging an acknowledged alert is a wasted call.
+"""
+ACTIONS = {
+    "ack": ("acknowledge", "status: open AND acknowledged: false", "acknowledged"),
+    "close": ("close", "status: open", "closed"),
+    "mute": ("snooze", "status: open AND snoozed: false", "muted"),
+}
+
+
+class BulkAlertActions:
+    """
+    Runs an alert action on every alert matching a query, concurrently
+
+    Args:
+    - base_url (str): The Opsgenie API URL, without trailing slash
+    - token (str): The Opsgenie API key
+    - workers (int): Concurrent Opsgenie calls, also the size of the connection pool
+    - max_alerts (int): Most alerts acted on by one command
+    - timeout (float): Seconds an Opsgenie call may take
+    """
+
+    def __init__(self, base_url, token, workers, max_alerts, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.workers = workers
+        self.max_alerts = max_alerts
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"GenieKey {token}"
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="opsgenie-bulk")
+
+    def run(self, action, query, user, deadline, note=None, mute_minutes=None, progress=None, progress_interval=2.0):
+        """
+        Runs action on the alerts matching query and returns the counts of the outcome:
+        {"matched", "done", "failed", "skipped", "truncated", "listed"}. "listed" is False when the
+        alerts could not be listed, then nothing was acted on.
+
+        Args:
+        - action (str): A key of ACTIONS
+        - query (str): The Opsgenie search query, see search_query
+        - user (str): The Slack user the actions are recorded for
+        - deadline (float): time.monotonic() after which no call is started
+        - note (str): Note added to every alert
+        - mute_minutes (int): Minutes alerts are snoozed for, mute only
+        - progress (callable): Called with the counts so far, at most every progress_interval seconds
+        - progress_interval (float): Seconds between progress calls
+        """
+        api_action, _, _ = ACTIONS[action]
+        started = time.perf_counter()
+        counts = {"matched": 0, "done": 0, "failed": 0, "skipped": 0, "truncated": False, "listed": True}
+        alerts, truncated = self.find(search_query(action, query), deadline)
+        if alerts is None:
+            counts["listed"] = False
+            return counts
+        counts["matched"] = len(alerts)
+        counts["truncated"] = truncated
+
+        body = {"user": user, "source": "Slack"}
+        if note:
+            body["note"] = note
+        if api_action == "snooze":
+            end_time = datetime.now(timezone.utc) + timedelta(minutes=mute_minutes or 60)
+            body["endTime"] = end_time.isoformat(timespec="seconds").replace("+00:00", "Z")
+
+        pending = {
+            self._executor.submit(self._act, alert["id"], api_action, body, deadline) for alert in alerts
+        }
+        last_progress = time.monotonic()
+        while pending:
+            # Wake up in time to cancel what has not started at the deadline
+            timeout = max(0.0, min(progress_interval, deadline - time.monotonic()))
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.cancelled():
+                    counts["skipped"] += 1
+                else:
+                    counts[future.result()] += 1
+            if pending and time.monotonic() >= deadline:
+                # Queued calls are dropped, the running ones finish within their timeout
+                for future in pending:
+                    if future.cancel():
+                        counts["skipped"] += 1
+                pending = {future for future in pending if not future.cancelled()}
+                deadline = float("inf")
+            if progress is not None and pending and time.monotonic() - last_progress >= progress_interval:
+                last_progress = time.monotonic()
+                progress(dict(counts))
+
+        logger.info(
+            "Bulk alert action finished",
+            action=action,
+            query=query,
+            duration_ms=round((time.perf_counter() - started) * 1000, 1),
+            **{key: value for key, value in counts.items() if key != "listed"},
+        )
+        return counts
+
+    def find(self, query, deadline):
+        """
+        Returns (alerts, truncated) for the alerts matching query, newest first and at most max_alerts.
+        alerts is None when the first page could not be read.
+
+        Args:
+        - query (str): The Opsgenie search query
+        - deadline (float): time.monotonic() after which no page is requested
+        """
+        alerts = []
+        seen = set()
+        offset = 0
+        while len(alerts) < self.max_alerts:
+            if time.monotonic() >= deadline:
+                return (alerts, True) if offset else (None, False)
+            status, data = self._request(
+                "GET",
+                "/v2/alerts",
+                deadline,
+                params={
+                    "query": query,
+                    "limit": ALERT_PAGE_SIZE,
+                    "offset": offset,
+                    "sort": "createdAt",
+                    "order": "desc",
+                },
+            )
+            if status != 200:
+                if offset == 0:
+                    return None, False
+                logger.warning("Alert listing stopped early", offset=offset, status=status)
+                return alerts, True
+            page = data.get("data") or []
+            for alert in page:
+                # New alerts shift the pages while they are read
+                if alert["id"] not in seen:
+                    seen.add(alert["id"])
+                    alerts.append(alert)
+            if len(page) < ALERT_PAGE_SIZE:
+                return alerts[:self.max_alerts], False
+            offset += ALERT_PAGE_SIZE
+        return alerts[:self.max_alerts], True
+
+    def _act(self, alert_id, api_action, body, deadline):
+        """
+        Runs one alert action, returns "done", "failed" or "skipped" when the deadline passed
+        """
+        if time.monotonic() >= deadline:
+            return "skipped"
+        status, data = self._request(
+            "POST", f"/v2/alerts/{alert_id}/{api_action}", deadline, params={"identifierType": "id"}, json=body
+        )
+        if status == 202 or status == 200:
+            return "done"
+        logger.warning("Alert action failed", alert_id=alert_id, action=api_action, status=status, error=data.get("message"))
+        return "failed"
+
+    def _request(self, method, path, deadline, **kwargs):
+        """
+        Calls the Opsgenie API and returns (status, data), status is None when no response was received
+        """
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+            except requests.ReadTimeout as e:
+                # Not retried, Opsgenie may have executed the call
+                return None, {"message": repr(e)}
+            except requests.ConnectionError as e:
+                error = repr(e)
+            except requests.RequestException as e:
+                return None, {"message": repr(e)}
+
+            if response is not None and response.status_code not in RETRY_STATUS_CODES:
+                try:
+                    return response.status_code, response.json()
+                except ValueError:
+                    return response.status_code, {}
+
+            delay = _retry_delay(response, attempt)
+            if attempt >= MAX_RETRIES or time.monotonic() + delay >= deadline:
+                if response is None:
+                    return None, {"message": error}
+                return response.status_code, {"message": f"http_{response.status_code}"}
+            time.sleep(delay)
+            attempt += 1
+
+
+def search_query(action, query):
+    """
+    Returns the Opsgenie query selecting the alerts an action applies to. A single word
+    without a field is taken as a tag, e.g. "database" selects alerts tagged database.
+
+    Args:
+    - action (str): A key of ACTIONS
+    - query (str): The query typed by the user
+    """
+    query = (query or "").strip()
+    if not query:
+        raise ValueError("A query is required, acting on every alert is not allowed")
+    if ":" not in query and " " not in query:
+        query = f"tag: {query}"
+    return f"({query}) AND {ACTIONS[action][1]}"
+
+
+def _retry_delay(response, attempt):
+    """
+    Seconds to wait before the next attempt: Retry-After when Opsgenie sent one, jittered backoff otherwise
+    """
+    if response is not None:
+        try:
+            return float(response.headers["Retry-After"]) + random.uniform(0, BACKOFF_BASE)
+        except (KeyError, ValueError):
+            pass
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
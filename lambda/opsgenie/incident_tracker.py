@@ -0,0 +1,285 @@
+"""
+Tracks Opsgenie incident create requests until Opsgenie processed them.
+
+/v1/incidents/create only answers "Request will be processed" with a requestId,
+whether the incident was created is known once /v1/incidents/requests/{requestId}
+stops answering 404. IncidentTracker polls those statuses on one background
+thread for every request tracked in the execution environment: each round polls
+all requests due within BATCH_WINDOW seconds concurrently over a pooled Session,
+so concurrent submissions share rounds and connections instead of polling on
+their own. Every request is first polled `first_poll` seconds after it was
+tracked, then with exponential backoff from `interval` up to `max_interval`
+seconds, and given up on after `max_age` seconds.
+
+The outcome is handed to `on_result(state, request_id, data, context)` with
+state "created", "failed" or "timeout". The thread is frozen with the execution
+environment between invocations and resumes with the next one.
+
+Lambda runs one invocation per execution environment, so concurrent submissions
+land on different environments and only share that thread within one of them.
+With an IncidentQueue the requests are tracked through a delayed SQS queue
+instead: the submission queues its request and returns, and the batches the
+queue delivers to the function are polled together by resolve_queued(), which
+queues the requests still being processed again with their backoff as delay
+before reporting the resolved ones. Messages whose request could not be queued
+again are returned as batch item failures, so SQS redelivers only those.
+"""
+import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from qbot.log import get_logger
+
+logger = get_logger("opsgenie.tracker")
+
+# Requests due this soon are polled in the current round
+BATCH_WINDOW = 0.25
+# Most messages of one SendMessageBatch call and longest delay of an SQS message
+SQS_BATCH_SIZE = 10
+SQS_MAX_DELAY = 900
+
+
+class IncidentTracker:
+    """
+    Shared poller of Opsgenie incident request statuses
+
+    Args:
+    - base_url (str): The Opsgenie API URL, without trailing slash
+    - token (str): The Opsgenie API key
+    - on_result (callable): Called with (state, request_id, data, context) once a request is resolved
+    - timeout (float): Seconds a status call may take
+    - workers (int): Status calls made concurrently in a round, also the size of the connection pool
+    - first_poll (float): Seconds between tracking a request and its first poll
+    - interval (float): Seconds between the first and the second poll, doubled after every poll
+    - max_interval (float): Most seconds between two polls of a request
+    - max_age (float): Seconds after which a request still being processed is reported as "timeout"
+    """
+
+    def __init__(
+        self, base_url, token, on_result, timeout, workers=4, first_poll=1.0, interval=0.5, max_interval=8.0, max_age=60.0
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.on_result = on_result
+        self.timeout = timeout
+        self.first_poll = first_poll
+        self.interval = interval
+        self.max_interval = max_interval
+        self.max_age = max_age
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"GenieKey {token}"
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.polls = 0
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="opsgenie-tracker")
+
+    def track(self, request_id, context=None):
+        """
+        Starts tracking a create request
+
+        Args:
+        - request_id (str): The requestId answered by Opsgenie
+        - context (any): Passed to on_result, e.g. the Slack message to update
+        """
+        now = time.monotonic()
+        with self._condition:
+            self._pending[request_id] = {
+                "context": context,
+                "tracked_at": now,
+                "next_poll": now + self.first_poll,
+                "interval": self.interval,
+            }
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="opsgenie-tracker", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def wait(self, timeout):
+        """
+        Blocks until no request is tracked or timeout seconds passed, returns how many are still tracked
+
+        Args:
+        - timeout (float): Most seconds to wait
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: not self._pending, max(0.0, timeout))
+            return len(self._pending)
+
+    def __len__(self):
+        with self._condition:
+            return len(self._pending)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._pending:
+                    self._thread = None
+                    self._condition.notify_all()
+                    return
+                now = time.monotonic()
+                due = [
+                    (request_id, entry)
+                    for request_id, entry in self._pending.items()
+                    if entry["next_poll"] <= now + BATCH_WINDOW
+                ]
+                if not due:
+                    self._condition.wait(min(entry["next_poll"] for entry in self._pending.values()) - now)
+                    continue
+
+            results = self.poll([request_id for request_id, _ in due])
+            resolved = []
+            with self._condition:
+                now = time.monotonic()
+                for (request_id, entry), (state, data) in zip(due, results):
+                    if state == "pending" and now - entry["tracked_at"] < self.max_age:
+                        entry["next_poll"] = now + entry["interval"] * random.uniform(0.8, 1.0)
+                        entry["interval"] = min(self.max_interval, entry["interval"] * 2)
+                        continue
+                    resolved.append((state if state != "pending" else "timeout", request_id, data, entry))
+                    self._pending.pop(request_id, None)
+
+            for state, request_id, data, entry in resolved:
+                self._resolved(state, request_id, data, entry["context"], time.monotonic() - entry["tracked_at"])
+            if resolved:
+                with self._condition:
+                    self._condition.notify_all()
+
+    def poll(self, request_ids):
+        """
+        Polls the status of create requests concurrently, returns [(state, data)] in the same order
+
+        Args:
+        - request_ids (list): The requestIds answered by Opsgenie
+        """
+        results = list(self._executor.map(self._poll, request_ids))
+        self.polls += len(request_ids)
+        return results
+
+    def resolve_queued(self, entries, queue):
+        """
+        Polls the requests of a batch of IncidentQueue messages once, queues the ones still being processed
+        again, delayed by their backoff, and then hands the resolved ones to on_result. Returns the message
+        ids of the requests that could not be queued again, for SQS to deliver them once more.
+
+        Args:
+        - entries (list): The decoded messages, see IncidentQueue.decode
+        - queue (IncidentQueue): The queue the requests still being processed are sent back to
+        """
+        now = time.time()
+        pending, resolved = [], []
+        for entry, (state, data) in zip(entries, self.poll([entry["request_id"] for entry in entries])):
+            age = now - entry["tracked_at"]
+            if state == "pending" and age < self.max_age:
+                interval = entry.get("interval", self.interval)
+                pending.append({**entry, "interval": min(self.max_interval, interval * 2), "delay": interval})
+                continue
+            resolved.append((state if state != "pending" else "timeout", entry, data, age))
+
+        # Queued first, a failure must not redeliver the requests already reported
+        failed = []
+        if pending:
+            try:
+                failed = queue.enqueue(pending)
+            except Exception as e:
+                logger.error("Failed to queue incident requests again", requests=len(pending), error=repr(e))
+                failed = pending
+        for state, entry, data, age in resolved:
+            self._resolved(state, entry["request_id"], data, entry["context"], age)
+        return [entry["message_id"] for entry in failed if entry.get("message_id")]
+
+    def _resolved(self, state, request_id, data, context, age):
+        logger.info("Incident request resolved", request_id=request_id, state=state, duration_ms=round(age * 1000, 1))
+        try:
+            self.on_result(state, request_id, data, context)
+        except Exception as e:
+            logger.error("Failed to report incident request", request_id=request_id, error=repr(e))
+
+    def _poll(self, request_id):
+        """
+        Returns ("created" | "failed" | "pending", data) for a create request
+        """
+        try:
+            response = self.session.get(f"{self.base_url}/v1/incidents/requests/{request_id}", timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.warning("Incident request status failed", request_id=request_id, error=repr(e))
+            return "pending", {}
+        if response.status_code == 404:
+            # Not processed yet
+            return "pending", {}
+        if response.status_code != 200:
+            # Rate limited or failing, polled again with the backoff of the request
+            logger.warning("Incident request status failed", request_id=request_id, status_code=response.status_code)
+            return "pending", {}
+        try:
+            data = response.json().get("data") or {}
+        except ValueError:
+            return "pending", {}
+        return ("created" if data.get("isSuccess") else "failed"), data
+
+
+class IncidentQueue:
+    """
+    Delayed SQS queue of the create requests to poll, shared by every execution environment.
+    The queue triggers the function with batches of messages, see IncidentTracker.resolve_queued.
+
+    Args:
+    - sqs (botocore.client.SQS): The SQS client
+    - queue_url (str): The URL of the queue
+    """
+
+    def __init__(self, sqs, queue_url):
+        self.sqs = sqs
+        self.queue_url = queue_url
+
+    def enqueue(self, entries):
+        """
+        Sends the requests to the queue, each delivered after its delay. Returns the entries SQS rejected.
+
+        Args:
+        - entries (list): Dicts with request_id, context (JSON serializable, passed to on_result),
+          tracked_at (epoch seconds of the submission), interval (seconds of the next backoff)
+          and delay (seconds before the next poll)
+        """
+        failed = []
+        for start in range(0, len(entries), SQS_BATCH_SIZE):
+            batch = entries[start:start + SQS_BATCH_SIZE]
+            response = self.sqs.send_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[
+                    {
+                        "Id": str(n),
+                        "MessageBody": json.dumps(
+                            {key: value for key, value in entry.items() if key not in ("delay", "message_id")}
+                        ),
+                        "DelaySeconds": min(SQS_MAX_DELAY, math.ceil(entry["delay"])),
+                    }
+                    for n, entry in enumerate(batch)
+                ],
+            )
+            for rejected in response.get("Failed", []):
+                logger.warning("SQS rejected incident request", code=rejected.get("Code"), error=rejected.get("Message"))
+                failed.append(batch[int(rejected["Id"])])
+        return failed
+
+    @staticmethod
+    def decode(event):
+        """
+        Returns the entries of an SQS event with the message_id of their message, None when the
+        event does not come from SQS
+
+        Args:
+        - event (dict): The Lambda event
+        """
+        records = event.get("Records") or []
+        if not records or records[0].get("eventSource") != "aws:sqs":
+            return None
+        return [{**json.loads(record["body"]), "message_id": record["messageId"]} for record in records]
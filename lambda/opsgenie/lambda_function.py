@@ -1,51 +1,315 @@
 import json
 import requests
 import os
+import time
+from qbot import envelope
+from qbot.blocks import Items, Slot, Template, dumps
+from qbot.cache import FileStore, StaleWhileRevalidateCache
+from qbot.log import get_logger
+from qbot.slack import shared_client
+from bulk_actions import ACTIONS as BULK_ACTIONS, BulkAlertActions
+from incident_tracker import IncidentQueue, IncidentTracker
+from service_index import ServiceIndex
+
+logger = get_logger("opsgenie")
 
 # Slack constants
 SLACK_BOT_TOKEN = os.environ["SLACK_BOT_TOKEN"]
 # Opsgenie constants
 OPSGENIE_URL = os.environ["OPSGENIE_URL"]
 OPSGENIE_TOKEN = os.environ["OPSGENIE_TOKEN"]
+# Web UI of the Opsgenie account, e.g. https://example.app.opsgenie.com, for links to incidents
+OPSGENIE_APP_URL = os.environ.get("OPSGENIE_APP_URL", "").rstrip("/")
+# Seconds an Opsgenie API call may take, the modal has to open within 3 seconds of the command
+OPSGENIE_TIMEOUT = float(os.environ.get("OPSGENIE_TIMEOUT", "2"))
+# The services catalog is refreshed in the background once older than the TTL and served
+# stale for at most MAX_STALE seconds, so Opsgenie is only on the request path of a cold cache
+OPSGENIE_SERVICES_TTL = int(os.environ.get("OPSGENIE_SERVICES_TTL", "300"))
+OPSGENIE_SERVICES_MAX_STALE = int(os.environ.get("OPSGENIE_SERVICES_MAX_STALE", "86400"))
+# Empty to keep the catalog in memory only
+OPSGENIE_SERVICES_CACHE_PATH = os.environ.get("OPSGENIE_SERVICES_CACHE_PATH", "/tmp/opsgenie-services.json")
+# Services per page (Opsgenie allows at most 100) and the most pages fetched for one catalog
+OPSGENIE_PAGE_SIZE = 100
+OPSGENIE_MAX_PAGES = int(os.environ.get("OPSGENIE_MAX_PAGES", "50"))
+# With typeahead the service select is an external_select answered from the search index,
+# otherwise a static_select limited to the first MAX_SELECT_OPTIONS services
+OPSGENIE_SERVICES_TYPEAHEAD = os.environ.get("OPSGENIE_SERVICES_TYPEAHEAD", "true").lower() == "true"
+# Slack shows at most 100 options in a select and 75 characters of an option text
+MAX_SELECT_OPTIONS = 100
+MAX_OPTION_TEXT = 75
+# /ops-bot ack, close and mute: concurrent Opsgenie calls, most alerts per command and seconds a call may take
+OPSGENIE_BULK_WORKERS = int(os.environ.get("OPSGENIE_BULK_WORKERS", "10"))
+OPSGENIE_BULK_MAX_ALERTS = int(os.environ.get("OPSGENIE_BULK_MAX_ALERTS", "500"))
+OPSGENIE_BULK_TIMEOUT = float(os.environ.get("OPSGENIE_BULK_TIMEOUT", "5"))
+# Seconds between progress updates of the Slack message
+OPSGENIE_BULK_PROGRESS_INTERVAL = float(os.environ.get("OPSGENIE_BULK_PROGRESS_INTERVAL", "2"))
+# Seconds of the Lambda timeout kept for the calls in flight and the final Slack update,
+# and the time budget when the handler runs without a Lambda context (local runner, benchmarks)
+OPSGENIE_BULK_DEADLINE_MARGIN = float(os.environ.get("OPSGENIE_BULK_DEADLINE_MARGIN", "10"))
+OPSGENIE_BULK_TIME_BUDGET = float(os.environ.get("OPSGENIE_BULK_TIME_BUDGET", "50"))
+# Incident create requests are polled from OPSGENIE_INCIDENT_FIRST_POLL seconds after the submission,
+# backing off up to OPSGENIE_INCIDENT_MAX_INTERVAL, and reported unconfirmed after OPSGENIE_INCIDENT_MAX_AGE
+OPSGENIE_INCIDENT_FIRST_POLL = float(os.environ.get("OPSGENIE_INCIDENT_FIRST_POLL", "1"))
+OPSGENIE_INCIDENT_MAX_INTERVAL = float(os.environ.get("OPSGENIE_INCIDENT_MAX_INTERVAL", "8"))
+OPSGENIE_INCIDENT_MAX_AGE = float(os.environ.get("OPSGENIE_INCIDENT_MAX_AGE", "45"))
+# Delayed SQS queue tracking the create requests, its batches trigger the function. Without it the
+# requests are polled in the invocation's environment, waiting at most OPSGENIE_INCIDENT_WAIT seconds.
+OPSGENIE_INCIDENT_QUEUE_URL = os.environ.get("OPSGENIE_INCIDENT_QUEUE_URL")
+OPSGENIE_INCIDENT_WAIT = float(os.environ.get("OPSGENIE_INCIDENT_WAIT", "10"))
+
+slack = shared_client(SLACK_BOT_TOKEN)
+alert_actions = BulkAlertActions(
+    OPSGENIE_URL, OPSGENIE_TOKEN, OPSGENIE_BULK_WORKERS, OPSGENIE_BULK_MAX_ALERTS, OPSGENIE_BULK_TIMEOUT
+)
+incident_tracker = IncidentTracker(
+    OPSGENIE_URL,
+    OPSGENIE_TOKEN,
+    lambda *args: _report_incident(*args),
+    OPSGENIE_TIMEOUT,
+    first_poll=OPSGENIE_INCIDENT_FIRST_POLL,
+    max_interval=OPSGENIE_INCIDENT_MAX_INTERVAL,
+    max_age=OPSGENIE_INCIDENT_MAX_AGE,
+)
+incident_queue = None
+if OPSGENIE_INCIDENT_QUEUE_URL:
+    from boto3 import client
+
+    incident_queue = IncidentQueue(client("sqs"), OPSGENIE_INCIDENT_QUEUE_URL)
+services_cache = StaleWhileRevalidateCache(
+    "opsgenie-services",
+    lambda: _fetch_services(),
+    OPSGENIE_SERVICES_TTL,
+    OPSGENIE_SERVICES_MAX_STALE,
+    FileStore(OPSGENIE_SERVICES_CACHE_PATH) if OPSGENIE_SERVICES_CACHE_PATH else None,
+)
+# (catalog, ServiceIndex, {service id: option JSON}) of the catalog the index was built from
+service_index = None
+# (catalog, rendered static_select) of the catalog the select was rendered from
+static_service_select = None
+
+"""
+Block Kit of the alert modal, serialized once per container. Only the metadata and the
+service select are filled in per request, see qbot.blocks.
+"""
+ALERT_MODAL = Template({
+    "type": "modal",
+    "private_metadata": Slot("metadata"),
+    "submit": {"type": "plain_text", "text": "Create alert", "emoji": True},
+    "close": {"type": "plain_text", "text": "Cancel", "emoji": True},
+    "title": {"type": "plain_text", "text": "On Call Bot", "emoji": True},
+    "blocks": [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": ":wave: Hi there! I'm the On Call Bot. I can help you create an alert in Opsgenie.",
+            },
+        },
+        {
+            "type": "divider",
+        },
+        {
+            "type": "section",
+            "block_id": "service_select_block",
+            "text": {
+                "type": "mrkdwn",
+                "text": ":gear: *Choose a service*\nSelect the service that is affected by the issue",
+            },
+            "accessory": Slot("service_select"),
+        },
+        {
+            "type": "section",
+            "block_id": "priority_select_block",
+            "text": {
+                "type": "mrkdwn",
+                "text": ":1234: *Choose priority*\nP1 -> Critical, P2 -> High, P3 -> Medium",
+            },
+            "accessory": {
+                "type": "static_select",
+                "action_id": "priority_select",
+                "placeholder": {
+                    "type": "plain_text",
+                    "text": "Choose priority",
+                    "emoji": True,
+                },
+                "initial_option": {
+                    "text": {"type": "plain_text", "text": "P1", "emoji": True},
+                    "value": "P1",
+                },
+                "options": [
+                    {
+                        "text": {"type": "plain_text", "text": "P1", "emoji": True},
+                        "value": "P1",
+                    },
+                    {
+                        "text": {"type": "plain_text", "text": "P2", "emoji": True},
+                        "value": "P2",
+                    },
+                    {
+                        "text": {"type": "plain_text", "text": "P3", "emoji": True},
+                        "value": "P3",
+                    }
+                ],
+            },
+        },
+        {
+            "type": "input",
+            "block_id": "issue_description_block",
+            "element": {
+                "type": "plain_text_input",
+                "action_id": "issue_description",
+            },
+            "label": {
+                "type": "plain_text",
+                "text": ":spiral_note_pad: Describe the issue with as much detail as possible",
+                "emoji": True,
+            },
+        },
+        {
+            "type": "input",
+            "block_id": "issue_url_block",
+            "element": {"type": "url_text_input", "action_id": "issue_url"},
+            "label": {
+                "type": "plain_text",
+                "text": ":link: If there is a link to the issue, please provide it here",
+                "emoji": True,
+            },
+            "optional": True,
+        },
+    ]
+})
+# Service select answered by options loads, identical for every request
+TYPEAHEAD_SERVICE_SELECT = dumps({
+    "type": "external_select",
+    "action_id": "service_select",
+    "placeholder": {"type": "plain_text", "text": "Type to search services", "emoji": True},
+    "min_query_length": 0,
+})
+STATIC_SERVICE_SELECT = Template({
+    "type": "static_select",
+    "action_id": "service_select",
+    "placeholder": {"type": "plain_text", "text": "Choose a service", "emoji": True},
+    "initial_option": Slot("initial_option"),
+    "options": [Items("options")],
+})
+# A modal showing a single message, the loading modal and fetch errors
+MESSAGE_MODAL = Template({
+    "type": "modal",
+    "private_metadata": Slot("metadata"),
+    "close": {"type": "plain_text", "text": "Cancel", "emoji": True},
+    "title": {"type": "plain_text", "text": "On Call Bot", "emoji": True},
+    "blocks": [{"type": "section", "text": {"type": "mrkdwn", "text": Slot("text")}}],
+})
+OPTIONS_RESPONSE = Template({"options": [Items("options")]})
+# Modal of /ops-bot ack, close and mute selecting the alerts by tag or query
+BULK_MODAL = Template({
+    "type": "modal",
+    "private_metadata": Slot("metadata"),
+    "submit": {"type": "plain_text", "text": Slot("submit"), "emoji": True},
+    "close": {"type": "plain_text", "text": "Cancel", "emoji": True},
+    "title": {"type": "plain_text", "text": "On Call Bot", "emoji": True},
+    "blocks": [
+        {"type": "section", "text": {"type": "mrkdwn", "text": Slot("text")}},
+        {
+            "type": "input",
+            "block_id": "alert_query_block",
+            "element": {
+                "type": "plain_text_input",
+                "action_id": "alert_query",
+                "placeholder": {"type": "plain_text", "text": "database or priority: P1 AND message: payments*"},
+            },
+            "label": {"type": "plain_text", "text": ":mag: Alerts", "emoji": True},
+            "hint": {
+                "type": "plain_text",
+                "text": "A single word selects the alerts with that tag, anything else is an Opsgenie search query",
+            },
+        },
+        Items("blocks"),
+        {
+            "type": "input",
+            "block_id": "alert_note_block",
+            "element": {"type": "plain_text_input", "action_id": "alert_note"},
+            "label": {"type": "plain_text", "text": ":spiral_note_pad: Note added to the alerts", "emoji": True},
+            "optional": True,
+        },
+    ],
+})
+MUTE_DURATION_BLOCK = dumps({
+    "type": "input",
+    "block_id": "mute_duration_block",
+    "element": {
+        "type": "static_select",
+        "action_id": "mute_duration",
+        "initial_option": {"text": {"type": "plain_text", "text": "1 hour"}, "value": "60"},
+        "options": [
+            {"text": {"type": "plain_text", "text": text}, "value": value}
+            for text, value in (("30 minutes", "30"), ("1 hour", "60"), ("4 hours", "240"), ("1 day", "1440"))
+        ],
+    },
+    "label": {"type": "plain_text", "text": ":zzz: Mute for", "emoji": True},
+})
+# (submit button, intro) of the bulk modal by action
+BULK_MODAL_TEXT = {
+    "ack": ("Acknowledge", ":white_check_mark: Acknowledge every open alert matching the search below."),
+    "close": ("Close", ":x: Close every open alert matching the search below."),
+    "mute": ("Mute", ":zzz: Snooze every open alert matching the search below, notifications resume afterwards."),
+}
+OPS_BOT_HELP = "\n".join([
+    "*/ops-bot* actions:",
+    "• `alert` - create an Opsgenie incident",
+    "• `ack` - acknowledge the open alerts matching a tag or query",
+    "• `close` - close the open alerts matching a tag or query",
+    "• `mute` - snooze the open alerts matching a tag or query",
+    "• `help` - show this message",
+])
 
 
 def lambda_handler(event, context):
     """
     Process event from event bridge and route to Opsgenie
     """
+    # Incident create requests delivered by the SQS queue, polled together
+    queued = IncidentQueue.decode(event)
+    if queued is not None:
+        failed = incident_tracker.resolve_queued(queued, incident_queue)
+        logger.info("Polled queued incident requests", requests=len(queued), failed=len(failed))
+        # Only the messages whose request could not be queued again are delivered once more
+        return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in failed]}
+
     # Check if the incoming event is a Scheduled Event from EventBridge to keep the lambda function warm.
     if (
         event.get("source") == "aws.events"
         and event.get("detail-type") == "Scheduled Event"
     ):
-        print("Received keep-warm event. Exiting without further processing.")
+        logger.info("Received keep-warm event. Exiting without further processing.")
+        _warm_services_cache()
+        # Requests left tracked in this environment when a previous invocation ended are resolved now
+        incident_tracker.wait(_incident_wait(context))
         return {"statusCode": 200, "body": json.dumps("Keep-warm event processed.")}
 
-    # If the payload has a "payload" field, assume its an interactivity event otherwise assume its a slash command
-    if "payload" in event["detail"]:
-        print("Recieved interactivity event")
-        print(event)
-        payload = json.loads(event["detail"]["payload"][0])
+    detail = envelope.decode(event["detail"])
+    # Typeahead of the service select, invoked synchronously by the gatekeeper
+    if detail["type"] == "block_suggestion":
+        return _load_service_options(detail)
+
+    # Anything that is not a slash command is an interactivity event
+    if detail["type"] != "command":
+        logger.info("Received interactivity event")
+        logger.debug_payload("Event received", event=event)
         # IMPORTANT: only listen to view_submission events
-        if payload.get("type", "") != "view_submission":
+        if detail["type"] != "view_submission":
             return {"statusCode": 200, "body": "Ignoring event"}
 
-        private_metadata = json.loads(payload["view"]["private_metadata"])
-        command = private_metadata.get("text")
-        channel_id = private_metadata.get("channel_id")
-
-        
+        command = detail["metadata"].get("text")
+        channel_id = detail["metadata"].get("channel_id")
 
         if command == "alert":
-            print("Recieved alert modal submissions")
-            _process_alert_modal(payload)
-            _post_message_to_slack(channel_id, "[SRE] Alert created successfully")
-        elif command == "ack":
-            # To be implemented or discarded
-            pass
-        elif command == "close":
-            # To be implemented or discarded
-            pass
+            logger.info("Received alert modal submission", channel_id=channel_id)
+            _submit_alert(detail, channel_id)
+            incident_tracker.wait(_incident_wait(context))
+        elif command in BULK_ACTIONS:
+            logger.info("Received bulk alert modal submission", command=command, channel_id=channel_id)
+            _process_bulk_modal(detail, context)
         elif command == "override":
             # To be implemented or discarded
             pass
@@ -53,272 +317,380 @@ def lambda_handler(event, context):
             # To be implemented or discarded
             pass
         else:
-            print("Unknown modal submission")
-            _post_message_to_slack(channel_id, "Unknown modal submission")
+            logger.warning("Unknown modal submission", command=command)
+            slack.post_message(channel_id, "Unknown modal submission")
             return {"statusCode": 500, "body": ""}
 
     else:
-        """
-        The following code is for /sre alert command only. Break into multiple functions if you want to support multiple command actions
-        """
-        print("Recieved slash command")
-        print(event)
-        trigger_id = event["detail"]["trigger_id"][0]
-        channel_id = event["detail"]["channel_id"][0]
-
-        metadata = _generate_metadata(event)
-
-        servies = _get_services()
-        modal = _generate_alert_modal(metadata, servies)
-
-        # Call Slack's API to open the modal
-        response = requests.post(
-            "https://slack.com/api/views.open",
-            headers={
-                "Authorization": f"Bearer {SLACK_BOT_TOKEN}",
-                "Content-Type": "application/json",
-            },
-            json={"trigger_id": trigger_id, "view": modal},
-        )
-        print("Response from Slack")
-        print(response.text)
-
-        if not response.ok:
-            print(response.text)
-            return {
-                "statusCode": 500,
-                "body": f"Failed to open Slack modal. Error: {response.text}",
-            }
+        logger.info("Received slash command", route=detail["route"], text=detail.get("text"))
+        logger.debug_payload("Event received", event=event)
+        action = (detail.get("text") or "").strip()
+        if action in BULK_ACTIONS:
+            return _open_bulk_modal(detail, action)
+        if action == "help":
+            return _post_ephemeral(detail, OPS_BOT_HELP)
+        if action == "maintenance":
+            return _post_ephemeral(detail, "Maintenance windows are not supported yet, create them in Opsgenie.")
+        return _open_alert_modal(detail)
+
+
+def _open_alert_modal(detail):
+    """
+    Opens the alert modal within the lifetime of the trigger_id. With the typeahead the modal
+    does not contain the catalog and is opened directly. Otherwise, when the services catalog
+    is not in memory yet, a loading modal is opened first and replaced with views.update
+    once the catalog was fetched, so a slow Opsgenie API cannot expire the trigger_id.
 
+    Args:
+    - detail (dict): The decoded slash command envelope
+    """
+    started = time.perf_counter()
+    metadata = _generate_metadata(detail)
+
+    if OPSGENIE_SERVICES_TYPEAHEAD or services_cache.ready():
+        response = slack.views_open(detail["trigger_id"], _build_alert_modal(metadata))
+        if not response.get("ok"):
+            return {"statusCode": 500, "body": f"Failed to open Slack modal. Error: {response.get('error')}"}
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("Opened alert modal", phases=1, time_to_first_modal_ms=elapsed_ms, time_to_complete_modal_ms=elapsed_ms)
         return {"statusCode": 200, "body": "Modal opened successfully"}
 
+    response = slack.views_open(detail["trigger_id"], _generate_loading_modal(metadata))
+    if not response.get("ok"):
+        return {"statusCode": 500, "body": f"Failed to open Slack modal. Error: {response.get('error')}"}
+    time_to_first_modal_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    try:
+        modal = _build_alert_modal(metadata)
+    except Exception as e:
+        logger.error("Failed to retrieve services", error=repr(e))
+        modal = _generate_error_modal(metadata, "Could not load the services from Opsgenie, close this and try again.")
+    view = response.get("view") or {}
+    # The hash makes the update fail instead of overwriting a view changed in the meantime
+    response = slack.views_update(view.get("id"), modal, view.get("hash"))
+    if not response.get("ok"):
+        return {"statusCode": 500, "body": f"Failed to update Slack modal. Error: {response.get('error')}"}
+    logger.info(
+        "Opened alert modal",
+        phases=2,
+        time_to_first_modal_ms=time_to_first_modal_ms,
+        time_to_complete_modal_ms=round((time.perf_counter() - started) * 1000, 1),
+    )
+    return {"statusCode": 200, "body": "Modal opened successfully"}
+
 
-def _generate_metadata(event):
+def _build_alert_modal(metadata):
+    """
+    Returns the full alert modal, blocking on the services catalog when the static select needs it and it is not cached
+
+    Args:
+    - metadata (str): The serialized modal metadata
+    """
+    if OPSGENIE_SERVICES_TYPEAHEAD:
+        # The modal itself does not need the catalog, the options loads that follow do
+        _prefetch_services()
+        return _generate_alert_modal(metadata)
+    return _generate_alert_modal(metadata, _get_services())
+
+
+def _generate_metadata(detail):
     """
     Add internal metadata for modals to route events correctly
 
     Args:
-    - event (dict): The event object from the lambda handler
+    - detail (dict): The decoded event envelope
     """
-    command = event["detail"]["route"]
-    channel_id = event["detail"]["channel_id"][0]
-    text = event["detail"]["text"][0]
     metadata = {
-        "command": command,
-        "text": text,
-        "channel_id": channel_id,
+        "command": detail["route"],
+        "text": detail.get("text"),
+        "channel_id": detail.get("channel_id"),
     }
     return json.dumps(metadata)
 
 
 def _get_services():
     """
-    Retrieves a list of services from Opsgenie where the owner team matches Opsgenie token integration
+    Returns the cached services catalog, see services_cache
+    """
+    return services_cache.get()
+
+
+def _get_service_index():
+    """
+    Returns the search index of the cached catalog and the serialized options of its services,
+    both rebuilt whenever the catalog was refreshed
+    """
+    global service_index
+    catalog = _get_services()
+    current = service_index
+    if current is None or current[0] is not catalog:
+        current = (catalog, ServiceIndex(catalog.get("data", [])), {})
+        service_index = current
+        logger.info("Built services index", count=len(current[1]))
+    return current[1], current[2]
+
+
+def _load_service_options(detail):
+    """
+    Answers a Slack options load of the service select from the search index
+
+    Args:
+    - detail (dict): The decoded block_suggestion envelope
+    """
+    options = []
+    if detail.get("action_id") == "service_select":
+        try:
+            index, cache = _get_service_index()
+            services = index.search(detail.get("query") or "", MAX_SELECT_OPTIONS)
+            options = [_service_option(service, cache) for service in services]
+        except Exception as e:
+            logger.error("Failed to load service options", error=repr(e))
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": OPTIONS_RESPONSE.render(options=options),
+    }
+
+
+def _service_option(service, cache):
+    """
+    Returns the select option of a service as JSON, serialized once per catalog
+
+    Args:
+    - service (dict): The service from the Opsgenie catalog
+    - cache (dict): Options serialized for the same catalog, by service id
+    """
+    option = cache.get(service["id"])
+    if option is None:
+        option = dumps({
+            "text": {"type": "plain_text", "text": service["name"][:MAX_OPTION_TEXT], "emoji": True},
+            "value": service["id"],
+        })
+        cache[service["id"]] = option
+    return option
+
+
+def _prefetch_services():
+    """
+    Starts a background refresh of the catalog if it is missing or older than its TTL
+    """
+    age = services_cache.age()
+    if age is None or age >= OPSGENIE_SERVICES_TTL:
+        services_cache.refresh_async()
+
+
+def _warm_services_cache():
+    """
+    Refreshes the services catalog while no user is waiting, if it is missing or older than its TTL
+    """
+    age = services_cache.age()
+    if age is not None and age < OPSGENIE_SERVICES_TTL:
+        return
+    try:
+        services_cache.refresh()
+    except Exception as e:
+        logger.error("Failed to refresh services", error=repr(e))
+
+
+def _fetch_services():
+    """
+    Retrieves all services from Opsgenie where the owner team matches Opsgenie token integration,
+    following the pages of the list API
     """
-    url = f"{OPSGENIE_URL}/v1/services?sort=name&order=asc"
+    url = f"{OPSGENIE_URL}/v1/services?limit={OPSGENIE_PAGE_SIZE}&sort=name&order=asc"
     headers = {
         "Authorization": f"GenieKey {OPSGENIE_TOKEN}",
         "Content-Type": "application/json",
     }
-    response = requests.get(url, headers=headers)
-    print("Response from Opsgenie")
-    print(response.json())
-    return response.json()
+    services = []
+    pages = 0
+    while url and pages < OPSGENIE_MAX_PAGES:
+        response = requests.get(url, headers=headers, timeout=OPSGENIE_TIMEOUT)
+        # Never cache an error response
+        response.raise_for_status()
+        page = response.json()
+        pages += 1
+        services.extend(page.get("data", []))
+        url = (page.get("paging") or {}).get("next")
+    if url:
+        logger.warning("Services catalog truncated", pages=pages, count=len(services))
+    logger.info("Retrieved services from Opsgenie", count=len(services), pages=pages)
+    logger.debug_payload("Services from Opsgenie", services=services)
+    return {"data": services}
+
+
+def _generate_alert_modal(metadata, services=None):
+    """
+    Render the Slack modal for responding to /sre alert command
+
+    Args:
+    - metadata (str): The metadata to be passed to the modal
+    - services (dict): The services catalog for a static select, None for a typeahead select
+    """
+    service_select = TYPEAHEAD_SERVICE_SELECT
+    if services is not None:
+        service_select = _static_service_select(services)
+    modal = ALERT_MODAL.render(metadata=metadata, service_select=service_select)
+    logger.debug_payload("Generated alert modal", modal=modal)
+    return modal
 
 
-def _generate_alert_modal(metadata, services={}):
+def _static_service_select(services):
     """
-    Create a Slack modal for responding to /sre alert command
+    Returns the static select of the first services of the catalog, rendered once per catalog
 
     Args:
-    - metadata (dict): The metadata to be passed to the modal
-    - services (dict): The list of services from Opsgenie
-    """
-    modal = {
-        "type": "modal",
-        "private_metadata": metadata,
-        "submit": {"type": "plain_text", "text": "Create alert", "emoji": True},
-        "close": {"type": "plain_text", "text": "Cancel", "emoji": True},
-        "title": {"type": "plain_text", "text": "On Call Bot", "emoji": True},
-        "blocks": [
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": ":wave: Hi there! I'm the On Call Bot. I can help you create an alert in Opsgenie.",
-                },
-            },
-            {
-                "type": "divider",
-            },
-            {
-                "type": "section",
-                "block_id": "service_select_block",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": ":gear: *Choose a service*\nSelect the service that is affected by the issue",
-                },
-                "accessory": {
-                    "type": "static_select",
-                    "action_id": "service_select",
-                    "placeholder": {
-                        "type": "plain_text",
-                        "text": "Choose a service",
-                        "emoji": True,
-                    },
-                    "initial_option": None,
-                    "options": [],
-                },
-            },
-            {
-                "type": "section",
-                "block_id": "priority_select_block",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": ":1234: *Choose priority*\nP1 -> Critical, P2 -> High, P3 -> Medium",
-                },
-                "accessory": {
-                    "type": "static_select",
-                    "action_id": "priority_select",
-                    "placeholder": {
-                        "type": "plain_text",
-                        "text": "Choose priority",
-                        "emoji": True,
-                    },
-                    "initial_option": {
-                        "text": {"type": "plain_text", "text": "P1", "emoji": True},
-                        "value": "P1",
-                    },
-                    "options": [
-                        {
-                            "text": {"type": "plain_text", "text": "P1", "emoji": True},
-                            "value": "P1",
-                        },
-                        {
-                            "text": {"type": "plain_text", "text": "P2", "emoji": True},
-                            "value": "P2",
-                        },
-                        {
-                            "text": {"type": "plain_text", "text": "P3", "emoji": True},
-                            "value": "P3",
-                        }
-                    ],
-                },
-            },
-            {
-                "type": "input",
-                "block_id": "issue_description_block",
-                "element": {
-                    "type": "plain_text_input",
-                    "action_id": "issue_description",
-                },
-                "label": {
-                    "type": "plain_text",
-                    "text": ":spiral_note_pad: Describe the issue with as much detail as possible",
-                    "emoji": True,
-                },
-            },
-            {
-                "type": "input",
-                "block_id": "issue_url_block",
-                "element": {"type": "url_text_input", "action_id": "issue_url"},
-                "label": {
-                    "type": "plain_text",
-                    "text": ":link: If there is a link to the issue, please provide it here",
-                    "emoji": True,
-                },
-                "optional": True,
-            },
-        ]
-    }
+    - services (dict): The services catalog
+    """
+    global static_service_select
+    current = static_service_select
+    if current is not None and current[0] is services:
+        return current[1]
 
     # Populate initial service and other services
-    for service in services.get("data", []):
-        if modal["blocks"][2]["accessory"]["initial_option"] == None:
-            modal["blocks"][2]["accessory"]["initial_option"] = {
-                "text": {
-                    "type": "plain_text",
-                    "text": service["name"],
-                    "emoji": True,
-                },
-                "value": service["id"],
-            }
+    catalog = services.get("data", [])
+    cache = {}
+    options = [_service_option(service, cache) for service in catalog[:MAX_SELECT_OPTIONS]]
+    select = TYPEAHEAD_SERVICE_SELECT
+    if options:
+        select = STATIC_SERVICE_SELECT.render(initial_option=options[0], options=options)
+    if len(catalog) > MAX_SELECT_OPTIONS:
+        logger.warning("Services beyond the select limit are not shown", count=len(catalog))
+    static_service_select = (services, select)
+    return select
+
+
+def _generate_loading_modal(metadata):
+    """
+    Render the placeholder modal opened while the services catalog is fetched
 
-        modal["blocks"][2]["accessory"]["options"].append(
-            {
-                "text": {
-                    "type": "plain_text",
-                    "text": service["name"],
-                    "emoji": True,
-                },
-                "value": service["id"],
-            }
-        )
-    print(modal)
-    return modal
+    Args:
+    - metadata (str): The metadata to be passed to the modal
+    """
+    return _generate_error_modal(metadata, ":hourglass_flowing_sand: Loading services from Opsgenie...")
 
 
-def _process_alert_modal(payload):
+def _generate_error_modal(metadata, text):
     """
-    Process the data from the alert modal and submit to Opsgenie
+    Render a modal showing a single message and no inputs
 
     Args:
-    - payload (dict): The payload from the modal submission
+    - metadata (str): The metadata to be passed to the modal
+    - text (str): The mrkdwn message
     """
-    service_block = (
-        payload.get("view", {})
-        .get("state", {})
-        .get("values", {})
-        .get("service_select_block", {})
-    )
-    service_id = (
-        service_block.get("service_select", {}).get("selected_option", {}).get("value")
-    )
-    service_name = (
-        service_block.get("service_select", {})
-        .get("selected_option", {})
-        .get("text", {})
-        .get("text")
-    )
+    return MESSAGE_MODAL.render(metadata=metadata, text=text)
 
-    issue_description_block = (
-        payload.get("view", {})
-        .get("state", {})
-        .get("values", {})
-        .get("issue_description_block", {})
-    )
-    issue_description = issue_description_block.get("issue_description", {}).get(
-        "value", ""
-    )
 
-    issue_priority_block = (
-        payload.get("view", {})
-        .get("state", {})
-        .get("values", {})
-        .get("priority_select_block", {})
+def _submit_alert(detail, channel_id):
+    """
+    Submits the alert modal to Opsgenie and posts a message tracking the create request,
+    updated by _report_incident once Opsgenie processed it
+
+    Args:
+    - detail (dict): The decoded envelope of the modal submission
+    - channel_id (str): The channel the command was sent from
+    """
+    service_name = detail["labels"].get("service_select")
+    try:
+        response_data = _process_alert_modal(detail)
+    except Exception as e:
+        logger.error("Failed to submit alert to Opsgenie", error=repr(e))
+        response_data = {}
+    request_id = response_data.get("requestId")
+    if response_data.get("result") != "Request will be processed" or not request_id:
+        slack.post_message(channel_id, f"[SRE] :x: Opsgenie did not accept the alert for {service_name}, try again.")
+        return
+    message = slack.post_message(
+        channel_id, f"[SRE] :hourglass_flowing_sand: Alert for {service_name} submitted, waiting for Opsgenie..."
     )
+    if not message.get("ts"):
+        return
+    tracked = (channel_id, message["ts"], service_name)
+    if incident_queue is not None:
+        entry = {
+            "request_id": request_id,
+            "context": tracked,
+            "tracked_at": time.time(),
+            "interval": incident_tracker.interval,
+            "delay": OPSGENIE_INCIDENT_FIRST_POLL,
+        }
+        try:
+            if not incident_queue.enqueue([entry]):
+                return
+            logger.error("SQS rejected incident request, polling it here", request_id=request_id)
+        except Exception as e:
+            logger.error("Failed to queue incident request, polling it here", request_id=request_id, error=repr(e))
+    incident_tracker.track(request_id, tracked)
+
+
+def _report_incident(state, request_id, data, message):
+    """
+    Updates the message of an incident create request with its outcome, called by incident_tracker
 
-    issue_priority = issue_priority_block.get("priority_select", {}).get(
-        "selected_option", {}
-    ).get("value", "")
+    Args:
+    - state (str): "created", "failed" or "timeout"
+    - request_id (str): The requestId of the create request
+    - data (dict): The request status from Opsgenie
+    - message (tuple): (channel, ts, service name) of the Slack message
+    """
+    channel, ts, service_name = message
+    if state == "created":
+        incident_id = data.get("incidentId")
+        incident = f"<{OPSGENIE_APP_URL}/incident/detail/{incident_id}|incident>" if OPSGENIE_APP_URL else "incident"
+        text = f"[SRE] :white_check_mark: Alert created successfully, Opsgenie {incident} for {service_name} is open."
+    elif state == "failed":
+        text = f"[SRE] :x: Opsgenie failed to create the incident for {service_name}: {data.get('status') or 'unknown error'}"
+    else:
+        text = (
+            f"[SRE] :warning: Opsgenie has not confirmed the incident for {service_name} yet, "
+            f"check Opsgenie before submitting again (request {request_id})."
+        )
+    slack.call("chat.update", {"channel": channel, "ts": ts, "text": text})
 
-    issue_url_block = (
-        payload.get("view", {})
-        .get("state", {})
-        .get("values", {})
-        .get("issue_url_block", {})
-    )
-    issue_url = issue_url_block.get("issue_url", {}).get("value", "")
 
-    print(
-        "Service ID: "
-        + service_id
-        + "\nIssue description: "
-        + issue_description
-        + "\nIssue priority: "
-        + issue_priority
-        + "\nIssue URL: "
-        + issue_url
+def _remaining_time(context):
+    """
+    Seconds the invocation may keep working, OPSGENIE_BULK_DEADLINE_MARGIN seconds before the Lambda timeout
+
+    Args:
+    - context (LambdaContext): The Lambda context, None when run locally
+    """
+    if context is None:
+        return OPSGENIE_BULK_TIME_BUDGET
+    return context.get_remaining_time_in_millis() / 1000 - OPSGENIE_BULK_DEADLINE_MARGIN
+
+
+def _incident_wait(context):
+    """
+    Seconds the invocation waits for the incident requests tracked in its environment, none are when
+    they go through the queue
+
+    Args:
+    - context (LambdaContext): The Lambda context, None when run locally
+    """
+    return min(_remaining_time(context), OPSGENIE_INCIDENT_WAIT)
+
+
+def _process_alert_modal(detail):
+    """
+    Process the data from the alert modal and submit to Opsgenie
+
+    Args:
+    - detail (dict): The decoded envelope of the modal submission
+    """
+    values = detail["values"]
+    service_id = values.get("service_select")
+    service_name = detail["labels"].get("service_select")
+    issue_description = values.get("issue_description") or ""
+    issue_priority = values.get("priority_select") or ""
+    issue_url = values.get("issue_url") or ""
+
+    logger.info(
+        "Processing alert modal",
+        service_id=service_id,
+        issue_description=issue_description,
+        issue_priority=issue_priority,
+        issue_url=issue_url,
     )
 
     # Create an incident in Opsgenie via rest API
@@ -350,68 +722,109 @@ def _process_alert_modal(payload):
         "notifyStakeholders": False,
     }
 
-    response = requests.post(url, headers=headers, json=payload)
+    response = requests.post(url, headers=headers, json=payload, timeout=OPSGENIE_TIMEOUT)
     response_data = response.json()
     if response_data["result"] != "Request will be processed":
-        print(f"Error sending message to Opsgenie: {response_data.get('requestId', 'Unknown ID')}")
+        logger.error("Error sending message to Opsgenie", request_id=response_data.get("requestId", "Unknown ID"))
         # raise Exception(f"Error sending message to Opsgenie: {response_data.get('requestId', 'Unknown ID')}") -> This causes eventbridge to loop and retry sending the event avoid raising exceptions like so
 
-    print("Response from Opsgenie:")
-    print(response_data)
+    logger.debug_payload("Response from Opsgenie", response=response_data)
     return response_data
 
 
-def _get_slack_channel_name(channel_id):
+def _open_bulk_modal(detail, action):
     """
-    Retrieves the name of a Slack channel given its ID.
+    Opens the modal selecting the alerts of /ops-bot ack, close or mute
 
     Args:
-    - channel_id (str): ID of the Slack channel to retrieve the name for.
+    - detail (dict): The decoded slash command envelope
+    - action (str): A key of bulk_actions.ACTIONS
     """
-    url = "https://slack.com/api/conversations.info"
-    headers = {
-        "Content-Type": "application/x-www-form-urlencoded",
-        "Authorization": f"Bearer {SLACK_BOT_TOKEN}",
-    }
-    params = {"channel": channel_id}
-
-    response = requests.get(url, headers=headers, params=params)
-    data = response.json()
-
-    if data.get("ok"):
-        return data["channel"]["name"]
-    else:
-        print(f"Error: {data.get('error')}")
-        return None
+    submit, text = BULK_MODAL_TEXT[action]
+    modal = BULK_MODAL.render(
+        metadata=_generate_metadata(detail),
+        submit=submit,
+        text=text,
+        blocks=[MUTE_DURATION_BLOCK] if action == "mute" else [],
+    )
+    response = slack.views_open(detail["trigger_id"], modal)
+    if not response.get("ok"):
+        return {"statusCode": 500, "body": f"Failed to open Slack modal. Error: {response.get('error')}"}
+    return {"statusCode": 200, "body": "Modal opened successfully"}
 
 
-def _post_message_to_slack(channel_id, message_text):
+def _process_bulk_modal(detail, context):
     """
-    Posts a message to a Slack channel.
+    Runs a bulk alert action from its modal, reporting progress in a Slack message updated in place.
+    Stops starting Opsgenie calls OPSGENIE_BULK_DEADLINE_MARGIN seconds before the Lambda timeout.
 
     Args:
-    - channel_id (str): ID of the Slack channel to send the message to.
-    - message_text (str): Text of the message to send.
+    - detail (dict): The decoded envelope of the modal submission
+    - context (LambdaContext): The Lambda context, None when run locally
     """
+    action = detail["metadata"].get("text")
+    channel_id = detail["metadata"].get("channel_id")
+    values = detail["values"]
+    query = (values.get("alert_query") or "").strip()
+    deadline = time.monotonic() + _remaining_time(context)
+
+    message = slack.post_message(channel_id, f"[SRE] Looking up the alerts matching `{query}`...")
+
+    def report(counts, finished=False):
+        text = _bulk_report_text(action, query, counts, finished)
+        if message.get("ts"):
+            slack.call("chat.update", {"channel": channel_id, "ts": message["ts"], "text": text})
+        elif finished:
+            slack.post_message(channel_id, text)
+
+    try:
+        counts = alert_actions.run(
+            action,
+            query,
+            detail.get("user_name") or "Slack",
+            deadline,
+            note=values.get("alert_note"),
+            mute_minutes=int(values.get("mute_duration") or 60),
+            progress=report,
+            progress_interval=OPSGENIE_BULK_PROGRESS_INTERVAL,
+        )
+    except ValueError as e:
+        slack.post_message(channel_id, f"[SRE] {e}")
+        return
+    report(counts, finished=True)
 
-    url = "https://slack.com/api/chat.postMessage"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {SLACK_BOT_TOKEN}",
-    }
-    data = {
-        "channel": channel_id,
-        "text": message_text,
-    }
-    print(data)
 
-    response = requests.post(url, headers=headers, json=data)
-    response_data = response.json()
+def _bulk_report_text(action, query, counts, finished):
+    """
+    Returns the progress or summary message of a bulk alert action
 
-    if not response_data["ok"]:
-        print(f"Error sending message to Slack: {response_data['error']}")
-        # raise Exception(f"Error sending message to Slack: {response_data['error']}") <- this causes eventbridge to retry event sending avoid raising exceptions like so
+    Args:
+    - action (str): A key of bulk_actions.ACTIONS
+    - query (str): The query typed by the user
+    - counts (dict): The counts returned by BulkAlertActions.run
+    - finished (bool): Whether the action completed
+    """
+    if not counts["listed"]:
+        return f"[SRE] Could not list the alerts matching `{query}` from Opsgenie, try again."
+    past = BULK_ACTIONS[action][2]
+    state = "Done" if finished else "In progress"
+    text = f"[SRE] {state}: {counts['done']}/{counts['matched']} alerts matching `{query}` {past}"
+    if counts["failed"]:
+        text += f", {counts['failed']} failed"
+    if counts["skipped"]:
+        text += f", {counts['skipped']} skipped for lack of time"
+    if finished and (counts["skipped"] or counts["truncated"] or counts["failed"]):
+        text += ". Run the command again for the remaining alerts"
+    return text + "."
+
+
+def _post_ephemeral(detail, text):
+    """
+    Answers a slash command with a message only the user who sent it sees
 
-    print("Response from Slack:")
-    print(response_data)
-    return response_data
+    Args:
+    - detail (dict): The decoded slash command envelope
+    - text (str): The mrkdwn message
+    """
+    slack.call("chat.postEphemeral", {"channel": detail.get("channel_id"), "user": detail.get("user_id"), "text": text})
+    return {"statusCode": 200, "body": ""}
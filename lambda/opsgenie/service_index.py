@@ -0,0 +1,121 @@
+"""
+In-memory search index over the Opsgenie services catalog for Slack typeahead.
+
+Matches are ranked in tiers, each only computed while fewer than `limit` results
+were found:
+1. the name starts with the query
+2. every word of the query is the prefix of a word of the name
+3. the name contains the query
+4. the characters of the query appear in order in the name (fuzzy), tighter matches first
+
+Prefix lookups use bisect over the sorted names and a sorted list of
+(word, position) pairs, so the common typeahead case does not scan the catalog.
+Substring and fuzzy matches scan the names joined in one string with a single
+regex, in C rather than a Python loop over services. Within a tier services keep
+their alphabetical order.
+"""
+import re
+from bisect import bisect_left, bisect_right
+
+WORD_SEPARATOR = re.compile(r"[^0-9a-z]+")
+
+
+class ServiceIndex:
+    """
+    Search index over a list of services, dicts with at least "id" and "name"
+    """
+
+    def __init__(self, services):
+        self.services = sorted(services, key=lambda service: service["name"].lower())
+        # Names never contain a newline, it separates them in the text scanned by regex
+        self.names = [service["name"].lower().replace("\n", " ") for service in self.services]
+        self._text = "\n".join(self.names)
+        self._offsets = []
+        offset = 0
+        for name in self.names:
+            self._offsets.append(offset)
+            offset += len(name) + 1
+        entries = []
+        for position, name in enumerate(self.names):
+            words = set(WORD_SEPARATOR.split(name))
+            words.discard("")
+            entries.extend((word, position) for word in words)
+        entries.sort()
+        self._words = [entry[0] for entry in entries]
+        self._positions = [entry[1] for entry in entries]
+
+    def __len__(self):
+        return len(self.services)
+
+    def search(self, query, limit=100):
+        """
+        Returns at most limit services matching the query, best matches first.
+        An empty query returns the first services alphabetically.
+
+        Args:
+        - query (str): What the user typed
+        - limit (int): Maximum number of results, Slack shows at most 100 options
+        """
+        query = query.strip().lower()
+        if not query:
+            return self.services[:limit]
+
+        found = []
+        seen = set()
+
+        def extend(positions):
+            for position in positions:
+                if position not in seen:
+                    seen.add(position)
+                    found.append(position)
+                    if len(found) >= limit:
+                        return True
+            return False
+
+        first = bisect_left(self.names, query)
+        if extend(range(first, bisect_left(self.names, query + "\uffff", first))):
+            return self._services(found)
+
+        words = [word for word in WORD_SEPARATOR.split(query) if word]
+        if words:
+            matching = self._prefixed(words[0]).intersection(*(self._prefixed(word) for word in words[1:]))
+            if extend(sorted(matching)):
+                return self._services(found)
+
+        if extend(self._scan(re.escape(query))):
+            return self._services(found)
+
+        # "abc" becomes a[^b\n]*b[^c\n]*c: no backtracking, never spans two names, tighter matches rank first
+        fuzzy = re.escape(query[0]) + "".join(f"[^{re.escape(char)}\n]*{re.escape(char)}" for char in query[1:])
+        scored = sorted(
+            (end - start, position) for position, start, end in self._scan(fuzzy, spans=True) if position not in seen
+        )
+        extend(position for _, position in scored)
+        return self._services(found)
+
+    def _scan(self, pattern, spans=False):
+        """
+        Yields the positions of the names matching pattern, once per name, with the match span when spans is set
+        """
+        pattern = re.compile(pattern)
+        text = self._text
+        match = pattern.search(text)
+        while match:
+            position = bisect_right(self._offsets, match.start()) - 1
+            yield (position, *match.span()) if spans else position
+            # Continue after the end of the matched name
+            end = text.find("\n", match.end())
+            if end < 0:
+                return
+            match = pattern.search(text, end + 1)
+
+    def _prefixed(self, prefix):
+        """
+        Returns the set of positions of services having a word starting with prefix
+        """
+        start = bisect_left(self._words, prefix)
+        end = bisect_left(self._words, prefix + "\uffff", start)
+        return set(self._positions[start:end])
+
+    def _services(self, positions):
+        return [self.services[position] for position in positions]
@@ -0,0 +1,311 @@
+"""
+Coalescing of alert storms into one digest per Pushover group.
+
+The first alert for a group is paged immediately and opens a window of `window`
+seconds for that group. Alerts for the group arriving while the window is open
+are only counted, by message, and the invocation that opened the window sends
+one digest with the count and the most frequent messages when it closes. A
+window nobody flushed, e.g. because its invocation ran out of time, is flushed
+by the next alert for the group, which then opens a new window.
+
+Windows live in a store shared by the execution environments. Stores implement
+`open(group_key, now, closes_at)` returning False when a window is already open
+or undrained, `append(group_key, message, now)` returning False when there is
+no open window, and `drain(group_key, opened_at, now)` removing the window
+opened at `opened_at` (or, when None, an expired one) and returning
+(opened_at, count, {message: count}) or None.
+"""
+import math
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, wait
+
+from qbot.log import get_logger
+
+logger = get_logger("pushover.coalescer")
+
+# Messages are counted by their first characters, storms repeat the same alert with different suffixes
+MESSAGE_KEY_LENGTH = 100
+
+
+class LocalDigestStore:
+    """
+    Store stand-in keeping windows in process memory, for tests and local runs
+    """
+
+    def __init__(self):
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def open(self, group_key, now, closes_at):
+        """
+        Opens a window for group_key. Returns False if one is open or was not drained yet.
+
+        Args:
+        - group_key (str): The Pushover group key
+        - now (float): Epoch seconds of the alert
+        - closes_at (float): Epoch seconds the window closes at
+        """
+        with self._lock:
+            if group_key in self._windows:
+                return False
+            self._windows[group_key] = {"opened_at": now, "closes_at": closes_at, "count": 0, "messages": Counter()}
+            return True
+
+    def append(self, group_key, message, now):
+        """
+        Counts an alert in the open window of group_key. Returns False if there is no open window.
+
+        Args:
+        - group_key (str): The Pushover group key
+        - message (str): The alert message
+        - now (float): Epoch seconds of the alert
+        """
+        with self._lock:
+            window = self._windows.get(group_key)
+            if window is None or window["closes_at"] <= now:
+                return False
+            window["count"] += 1
+            window["messages"][message[:MESSAGE_KEY_LENGTH]] += 1
+            return True
+
+    def drain(self, group_key, opened_at, now):
+        """
+        Removes the window opened at opened_at, or an expired window when opened_at is None.
+        Returns (opened_at, count, {message: count}) or None when there is no such window.
+
+        Args:
+        - group_key (str): The Pushover group key
+        - opened_at (float): Epoch seconds the window was opened at, None for any expired window
+        - now (float): Epoch seconds of the drain
+        """
+        with self._lock:
+            window = self._windows.get(group_key)
+            if window is None:
+                return None
+            if opened_at is None and window["closes_at"] > now:
+                return None
+            if opened_at is not None and window["opened_at"] != opened_at:
+                return None
+            del self._windows[group_key]
+            return window["opened_at"], window["count"], dict(window["messages"])
+
+
+class DynamoDBDigestStore:
+    """
+    Store backed by a DynamoDB table with a string partition key `id`, one item per
+    open window. Alerts are counted with one conditional update and a window is
+    drained with a conditional delete returning the item, so concurrent invocations
+    never count an alert twice nor send a digest twice. Enable DynamoDB TTL on the
+    `expires_at` attribute to have windows left behind removed.
+    """
+
+    def __init__(self, dynamodb, table_name, expires_after=3600):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.expires_after = expires_after
+
+    def open(self, group_key, now, closes_at):
+        """
+        Opens a window for group_key with a conditional put. Returns False if one is open or was not drained yet.
+
+        Args:
+        - group_key (str): The Pushover group key
+        - now (float): Epoch seconds of the alert
+        - closes_at (float): Epoch seconds the window closes at
+        """
+        try:
+            self.dynamodb.put_item(
+                TableName=self.table_name,
+                Item={
+                    "id": {"S": group_key},
+                    "opened_at": {"N": repr(now)},
+                    "closes_at": {"N": repr(closes_at)},
+                    "alert_count": {"N": "0"},
+                    "messages": {"M": {}},
+                    "expires_at": {"N": str(math.ceil(closes_at + self.expires_after))},
+                },
+                ConditionExpression="attribute_not_exists(id)",
+            )
+        except self.dynamodb.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    def append(self, group_key, message, now):
+        """
+        Counts an alert in the open window of group_key. Returns False if there is no open window.
+
+        Args:
+        - group_key (str): The Pushover group key
+        - message (str): The alert message
+        - now (float): Epoch seconds of the alert
+        """
+        try:
+            self.dynamodb.update_item(
+                TableName=self.table_name,
+                Key={"id": {"S": group_key}},
+                UpdateExpression="SET messages.#message = if_not_exists(messages.#message, :zero) + :one ADD alert_count :one",
+                ConditionExpression="closes_at > :now",
+                ExpressionAttributeNames={"#message": message[:MESSAGE_KEY_LENGTH] or "-"},
+                ExpressionAttributeValues={":zero": {"N": "0"}, ":one": {"N": "1"}, ":now": {"N": repr(now)}},
+            )
+        except self.dynamodb.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    def drain(self, group_key, opened_at, now):
+        """
+        Deletes the window opened at opened_at, or an expired window when opened_at is None.
+        Returns (opened_at, count, {message: count}) or None when there is no such window.
+
+        Args:
+        - group_key (str): The Pushover group key
+        - opened_at (float): Epoch seconds the window was opened at, None for any expired window
+        - now (float): Epoch seconds of the drain
+        """
+        if opened_at is None:
+            condition, values = "closes_at <= :now", {":now": {"N": repr(now)}}
+        else:
+            condition, values = "opened_at = :opened_at", {":opened_at": {"N": repr(opened_at)}}
+        try:
+            response = self.dynamodb.delete_item(
+                TableName=self.table_name,
+                Key={"id": {"S": group_key}},
+                ConditionExpression=condition,
+                ExpressionAttributeValues=values,
+                ReturnValues="ALL_OLD",
+            )
+        except self.dynamodb.exceptions.ConditionalCheckFailedException:
+            return None
+        item = response.get("Attributes")
+        if not item:
+            return None
+        messages = {message: int(count["N"]) for message, count in item["messages"]["M"].items()}
+        return float(item["opened_at"]["N"]), int(item["alert_count"]["N"]), messages
+
+
+class AlertCoalescer:
+    """
+    Pages the first alert of a group and coalesces the following ones of its window into a digest
+
+    Args:
+    - store (object): The window store, see the module docstring
+    - window (float): Seconds alerts for a group are coalesced after the one paged
+    - send_digest (callable): Called with (group_key, title, message), returns whether Pushover accepted it
+    - top (int): Most frequent messages listed in a digest
+    """
+
+    def __init__(self, store, window, send_digest, top=3):
+        self.store = store
+        self.window = window
+        self.send_digest = send_digest
+        self.top = top
+        self._scheduled = set()
+        self._lock = threading.Lock()
+
+    def add(self, group_key, message, deadline=None):
+        """
+        Records an alert for group_key. Returns (page, future): page is True when the alert must be
+        sent now, future the digest flush it scheduled when it opened a window, otherwise None.
+        Errors of the store are logged and the alert is paged.
+
+        Args:
+        - group_key (str): The Pushover group key
+        - message (str): The alert message
+        - deadline (float): Epoch seconds the digest must be sent by at the latest, None for the window end
+        """
+        try:
+            # A second round only happens after an expired window was flushed here
+            for _ in range(2):
+                now = time.time()
+                if self.store.open(group_key, now, now + self.window):
+                    return True, self._schedule(group_key, now, min(now + self.window, deadline or math.inf))
+                if self.store.append(group_key, message, now):
+                    return False, None
+                self.flush(group_key)
+        except Exception as e:
+            logger.error("Digest store unavailable, paging alert", group_key=group_key, error=repr(e))
+            return True, None
+        logger.warning("No window could be opened or appended to, paging alert", group_key=group_key)
+        return True, None
+
+    def flush(self, group_key, opened_at=None):
+        """
+        Drains the window opened at opened_at, or an expired window when None, and sends its digest.
+        Returns the number of alerts in the digest, 0 when nothing was sent.
+
+        Args:
+        - group_key (str): The Pushover group key
+        - opened_at (float): Epoch seconds the window was opened at
+        """
+        try:
+            drained = self.store.drain(group_key, opened_at, time.time())
+        except Exception as e:
+            logger.error("Failed to drain digest window", group_key=group_key, error=repr(e))
+            return 0
+        if drained is None:
+            return 0
+        opened_at, count, messages = drained
+        if count == 0:
+            return 0
+        title, text = self.digest(count, messages, time.time() - opened_at)
+        started = time.perf_counter()
+        sent = self.send_digest(group_key, title, text)
+        logger.info(
+            "Pushover digest sent",
+            group_key=group_key,
+            alerts=count,
+            messages=len(messages),
+            sent=sent,
+            duration_ms=round((time.perf_counter() - started) * 1000, 1),
+        )
+        return count
+
+    def digest(self, count, messages, age):
+        """
+        Returns (title, message) of the digest of a window
+
+        Args:
+        - count (int): Alerts coalesced
+        - messages (dict): Alerts by message
+        - age (float): Seconds since the window was opened
+        """
+        title = f"{count} more alert{'s' if count != 1 else ''} in the last {math.ceil(age)}s"
+        top = Counter(messages).most_common(self.top)
+        lines = [f"{n}x {message}" for message, n in top]
+        others = count - sum(n for _, n in top)
+        if others:
+            lines.append(f"and {others} more")
+        return title, "\n".join(lines)
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the scheduled digests are sent. Returns False if the timeout expired first.
+
+        Args:
+        - timeout (float): Maximum number of seconds to wait, None waits forever
+        """
+        with self._lock:
+            pending = list(self._scheduled)
+        return not wait(pending, timeout).not_done
+
+    def _schedule(self, group_key, opened_at, at):
+        future = Future()
+        with self._lock:
+            self._scheduled.add(future)
+
+        def run():
+            try:
+                future.set_result(self.flush(group_key, opened_at))
+            except Exception as e:
+                logger.error("Digest flush failed", group_key=group_key, error=repr(e))
+                future.set_exception(e)
+            with self._lock:
+                self._scheduled.discard(future)
+
+        timer = threading.Timer(max(at - time.time(), 0), run)
+        # The timer is frozen with the execution environment, the flush extension delays the freeze until it fired
+        timer.daemon = True
+        timer.start()
+        return future
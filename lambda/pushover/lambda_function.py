@@ -1,70 +1,213 @@
 import json
 import requests
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from coalescer import AlertCoalescer, DynamoDBDigestStore, LocalDigestStore
+from qbot.cache import LRUCache
+from qbot.flush_extension import FlushExtension, RUNTIME_API
+from qbot.log import get_logger
+
+logger = get_logger("pushover")
 
 # Custom header added to Opsgenie webhook
 AUTH_HEADER = os.environ["AUTH_HEADER"]
 # Pushover constants
 PUSHOVER_URL = os.environ["PUSHOVER_URL"]
 PUSHOVER_TOKEN = os.environ["PUSHOVER_TOKEN"]
-PUSHOVER_WEB3_GROUP = os.environ["PUSHOVER_WEB3_GROUP"]
-PUSHOVER_HUB_GROUP = os.environ["PUSHOVER_HUB_GROUP"]
-PUSHOVER_TRADING_GROUP = os.environ["PUSHOVER_TRADING_GROUP"]
-PUSHOVER_BLOCKCHAIN_GROUP = os.environ["PUSHOVER_BLOCKCHAIN_GROUP"]
-PUSHOVER_MPC_GROUP = os.environ["PUSHOVER_MPC_GROUP"]
-PUSHOVER_DEVOPS_GROUP = os.environ["PUSHOVER_DEVOPS_GROUP"]
-PUSHOVER_STAFF_GROUP = os.environ["PUSHOVER_STAFF_GROUP"]
-PUSHOVER_SECURITY_GROUP = os.environ["PUSHOVER_SECURITY_GROUP"]
+# Opsgenie team id to the Pushover group key, or list of group keys, its alerts are sent to, as JSON
+PUSHOVER_TEAM_ROUTES = os.environ["PUSHOVER_TEAM_ROUTES"]
+# Seconds a Pushover or Opsgenie call may take and deliveries sent concurrently
+PUSHOVER_TIMEOUT = float(os.environ.get("PUSHOVER_TIMEOUT", "3"))
+PUSHOVER_WORKERS = int(os.environ.get("PUSHOVER_WORKERS", "8"))
 # Opsgenie constants
 OPSGENIE_URL = os.environ["OPSGENIE_URL"]
 OPSGENIE_TOKEN = os.environ["OPSGENIE_TOKEN"]
-OPSGENIE_WEB3_TEAM = os.environ["OPSGENIE_WEB3_TEAM"]
-OPSGENIE_HUB_TEAM = os.environ["OPSGENIE_HUB_TEAM"]
-OPSGENIE_TRADING_TEAM = os.environ["OPSGENIE_TRADING_TEAM"]
-OPSGENIE_BLOCKCHAIN_TEAM = os.environ["OPSGENIE_BLOCKCHAIN_TEAM"]
-OPSGENIE_MPC_TEAM = os.environ["OPSGENIE_MPC_TEAM"]
-OPSGENIE_DEVOPS_TEAM = os.environ["OPSGENIE_DEVOPS_TEAM"]
-OPSGENIE_STAFF_TEAM = os.environ["OPSGENIE_STAFF_TEAM"]
-OPSGENIE_SECURITY_TEAM = os.environ["OPSGENIE_SECURITY_TEAM"]
+# Seconds and number of alerts the details fetched from Opsgenie are kept for the next webhooks of an alert
+PUSHOVER_ALERT_CACHE_TTL = float(os.environ.get("PUSHOVER_ALERT_CACHE_TTL", "120"))
+PUSHOVER_ALERT_CACHE_SIZE = int(os.environ.get("PUSHOVER_ALERT_CACHE_SIZE", "256"))
+# Seconds the alerts for a group following the one paged are coalesced into a digest, 0 pages every alert
+PUSHOVER_DIGEST_WINDOW = float(os.environ.get("PUSHOVER_DIGEST_WINDOW", "0"))
+# Most frequent messages listed in a digest
+PUSHOVER_DIGEST_TOP = int(os.environ.get("PUSHOVER_DIGEST_TOP", "3"))
+# DynamoDB table sharing the digest windows between execution environments, required inside Lambda.
+# Local runs keep them in process memory when unset.
+PUSHOVER_DIGEST_TABLE = os.environ.get("PUSHOVER_DIGEST_TABLE")
+# Seconds before the Lambda timeout a digest is sent at the latest
+PUSHOVER_DIGEST_DEADLINE_MARGIN = float(os.environ.get("PUSHOVER_DIGEST_DEADLINE_MARGIN", "2"))
+
+
+def _load_team_routes(config):
+    """
+    Returns {team id: (group keys)} from the PUSHOVER_TEAM_ROUTES JSON
+
+    Args:
+    - config (str): JSON object mapping Opsgenie team ids to a Pushover group key or a list of them
+    """
+    routes = {}
+    for team_id, groups in json.loads(config).items():
+        routes[team_id] = tuple([groups] if isinstance(groups, str) else groups)
+    return routes
+
+
+TEAM_ROUTES = _load_team_routes(PUSHOVER_TEAM_ROUTES)
+
+# Keep-alive connections to Pushover and Opsgenie shared by the deliveries of warm invocations
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=2, pool_maxsize=PUSHOVER_WORKERS)
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
+executor = ThreadPoolExecutor(max_workers=PUSHOVER_WORKERS, thread_name_prefix="pushover")
+# Alert details fetched from Opsgenie by alert id, an alert's create, escalate and add note webhooks come in quick succession
+alert_cache = LRUCache(PUSHOVER_ALERT_CACHE_SIZE)
+
+# Holds the environment open after the response until the digests of the windows it opened are sent
+flusher = FlushExtension("pushover-flush")
+coalescer = None
+if PUSHOVER_DIGEST_WINDOW > 0 and RUNTIME_API and not PUSHOVER_DIGEST_TABLE:
+    # The storm's other webhooks land on other execution environments, memory of one would coalesce nothing
+    logger.warning("PUSHOVER_DIGEST_TABLE is not set, paging every alert")
+elif PUSHOVER_DIGEST_WINDOW > 0:
+    # Inside Lambda a digest sent after the response needs the extension to delay the freeze
+    if flusher.register() or not RUNTIME_API:
+        if PUSHOVER_DIGEST_TABLE:
+            from boto3 import client
+            from botocore.config import Config
+
+            dynamodb = client("dynamodb", config=Config(tcp_keepalive=True, connect_timeout=1, read_timeout=1))
+            digest_store = DynamoDBDigestStore(dynamodb, PUSHOVER_DIGEST_TABLE)
+        else:
+            digest_store = LocalDigestStore()
+        coalescer = AlertCoalescer(
+            digest_store,
+            PUSHOVER_DIGEST_WINDOW,
+            lambda group_key, title, message: _send_alert_to_pushover(group_key, title, message),
+            PUSHOVER_DIGEST_TOP,
+        )
+    else:
+        logger.warning("Flush extension unavailable, paging every alert")
 
 
 def lambda_handler(event, context):
-    print(event)
+    try:
+        return _handle_webhook(event, context)
+    finally:
+        flusher.invocation_finished()
+
+
+def _handle_webhook(event, context):
+    """
+    Pages the Pushover groups of the responders of the alert of an Opsgenie webhook
+
+    Args:
+    - event (dict): The API Gateway proxy event
+    - context (LambdaContext): The Lambda context, None when run locally
+    """
+    logger.debug_payload("Event received", event=event)
     auth_header = event["headers"]["auth"]
     if auth_header != AUTH_HEADER:
         return {"statusCode": 401, "body": "Invalid auth header"}
 
+    started = time.perf_counter()
     # Parse the payload
     payload = json.loads(event["body"])
-    alert_id = payload["alert"]["alertId"]
+    alert = payload["alert"]
+    alert_id = alert["alertId"]
 
-    # Fetch the alert details
-    alert_details = _get_alert_details(alert_id)
-    message = alert_details["data"]["message"]
-    responders = alert_details["data"]["responders"]
+    # The webhook carries the message and responders, Opsgenie is only asked when they are missing
+    message, responders, source = _alert_details(alert)
 
-    for responder in responders:
-        team_id = responder["id"]
-        if team_id == OPSGENIE_WEB3_TEAM:
-            _send_alert_to_pushover(PUSHOVER_WEB3_GROUP, "Incident detected", message)
-        if team_id == OPSGENIE_HUB_TEAM:
-            _send_alert_to_pushover(PUSHOVER_HUB_GROUP, "Incident detected", message)
-        if team_id == OPSGENIE_TRADING_TEAM:
-            _send_alert_to_pushover(PUSHOVER_TRADING_GROUP, "Incident detected", message)
-        if team_id == OPSGENIE_BLOCKCHAIN_TEAM:
-            _send_alert_to_pushover(PUSHOVER_BLOCKCHAIN_GROUP, "Incident detected", message)
-        if team_id == OPSGENIE_MPC_TEAM:
-            _send_alert_to_pushover(PUSHOVER_MPC_GROUP, "Incident detected", message)
-        if team_id == OPSGENIE_DEVOPS_TEAM:
-            _send_alert_to_pushover(PUSHOVER_DEVOPS_GROUP, "Incident detected", message)
-        if team_id == OPSGENIE_STAFF_TEAM:
-            _send_alert_to_pushover(PUSHOVER_STAFF_GROUP, "Incident detected", message)
-        if team_id == OPSGENIE_SECURITY_TEAM:
-            _send_alert_to_pushover(PUSHOVER_SECURITY_GROUP, "Incident detected", message)
+    groups = _target_groups(responders)
+    deadline = _deadline(context)
+    # Every group once, concurrently: an alert for many teams costs one round trip instead of one per team
+    results = list(executor.map(lambda group_key: _page_group(group_key, message, deadline), groups))
+    logger.info(
+        "Pushover alert fanned out",
+        alert_id=alert_id,
+        responders=len(responders),
+        groups=len(groups),
+        delivered=results.count(True),
+        coalesced=results.count(None),
+        details_from=source,
+        duration_ms=round((time.perf_counter() - started) * 1000, 1),
+    )
 
     return {"statusCode": 200, "body": "Pushover alert sent successfully"}
 
 
+def _page_group(group_key, message, deadline):
+    """
+    Pages a group, unless the alert joins the digest of a window open for the group. Returns whether
+    Pushover accepted the page, None when the alert was coalesced.
+
+    Args:
+    - group_key (str): The Pushover group key
+    - message (str): The message of the alert
+    - deadline (float): Epoch seconds a digest must be sent by
+    """
+    if coalescer is not None:
+        page, future = coalescer.add(group_key, message, deadline)
+        if future is not None:
+            flusher.track(future)
+        if not page:
+            return None
+    return _send_alert_to_pushover(group_key, "Incident detected", message)
+
+
+def _deadline(context):
+    """
+    Epoch seconds the digests opened by the invocation are sent by, PUSHOVER_DIGEST_DEADLINE_MARGIN seconds
+    before the Lambda timeout. None when run locally, digests are then sent when their window closes.
+
+    Args:
+    - context (LambdaContext): The Lambda context, None when run locally
+    """
+    if context is None:
+        return None
+    return time.time() + context.get_remaining_time_in_millis() / 1000 - PUSHOVER_DIGEST_DEADLINE_MARGIN
+
+
+def _target_groups(responders):
+    """
+    Returns the Pushover group keys of the responder teams of an alert, each once and in responder order
+
+    Args:
+    - responders (list): The responders of the Opsgenie alert
+    """
+    groups = {}
+    for responder in responders:
+        for group_key in TEAM_ROUTES.get(responder.get("id"), ()):
+            groups[group_key] = None
+    return list(groups)
+
+
+def _alert_details(alert):
+    """
+    Returns (message, responders, source) of the alert of a webhook. The webhook's own fields are
+    used when present, otherwise the details fetched from Opsgenie, cached for PUSHOVER_ALERT_CACHE_TTL.
+
+    Args:
+    - alert (dict): The alert of the Opsgenie webhook payload
+    """
+    message = alert.get("message")
+    responders = alert.get("responders")
+    if responders is None and alert.get("teams") is not None:
+        # Webhooks without responders list the ids of the alert's teams
+        responders = [{"type": "team", "id": team_id} for team_id in alert["teams"]]
+    if message and responders is not None:
+        return message, responders, "webhook"
+
+    alert_id = alert["alertId"]
+    data = alert_cache.get(alert_id)
+    source = "cache"
+    if data is None:
+        data = _get_alert_details(alert_id)["data"]
+        alert_cache.set(alert_id, data, PUSHOVER_ALERT_CACHE_TTL)
+        source = "opsgenie"
+    return message or data["message"], responders if responders is not None else data["responders"], source
+
+
 def _get_alert_details(alert_id):
     """
     Retrieves the alert details from Opsgenie
@@ -77,15 +220,15 @@ def _get_alert_details(alert_id):
         "Authorization": f"GenieKey {OPSGENIE_TOKEN}",
         "Content-Type": "application/json",
     }
-    response = requests.get(url, headers=headers)
-    print("Response from Opsgenie")
-    print(response.json())
-    return response.json()
+    response = session.get(url, headers=headers, timeout=PUSHOVER_TIMEOUT)
+    alert_details = response.json()
+    logger.debug_payload("Response from Opsgenie", response=alert_details)
+    return alert_details
 
 
 def _send_alert_to_pushover(group_key, title, message):
     """
-    Sends the alert to Pushover
+    Sends the alert to Pushover, returns whether Pushover accepted it
 
     Args:
     - group_key (str): The Pushover group key
@@ -102,7 +245,23 @@ def _send_alert_to_pushover(group_key, title, message):
         "message": message,
     }
 
-    response = requests.post(url, headers=headers, data=data)
+    started = time.perf_counter()
+    try:
+        response = session.post(url, headers=headers, data=data, timeout=PUSHOVER_TIMEOUT)
+    except requests.RequestException as e:
+        logger.error(
+            "Pushover delivery failed",
+            group_key=group_key,
+            error=repr(e),
+            duration_ms=round((time.perf_counter() - started) * 1000, 1),
+        )
+        return False
 
-    print(response.status_code)
-    print(response.text)
+    logger.info(
+        "Response from Pushover",
+        group_key=group_key,
+        status_code=response.status_code,
+        response=response.text,
+        duration_ms=round((time.perf_counter() - started) * 1000, 1),
+    )
+    return response.ok
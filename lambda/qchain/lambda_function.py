@@ -1,12 +1,16 @@
 import json
-import requests
 import os
 import base64
 import re
-import boto3
-from botocore.signers import RequestSigner
-from kubernetes import client, config
+import threading
+import time
+from functools import lru_cache
+from qbot import envelope
+from qbot.blocks import Items, Slot, Template
+from qbot.log import get_logger
+from qbot.slack import shared_client
 
+logger = get_logger("qchain")
 
 # Slack constants
 SLACK_BOT_TOKEN = os.environ["SLACK_BOT_TOKEN"]
@@ -19,28 +23,76 @@ EKS_NAMESPACE = os.environ["QCHAIN_EKS_NAMESPACE"]
 DEPLOYMENTS = [
     ### REMOVED FOR SECURITY REASONS ###
 ]
+# Seconds before the assumed role credentials expire at which they are renewed
+CREDENTIALS_REFRESH_MARGIN = 300
 
 """
-Initialize clients before lambda_handler to avoid cold starts
+boto3, kubernetes and the assumed role session are loaded on first use instead of at import.
+Assuming the role at import made every cold start wait on STS and failed the whole init
+when STS was unreachable. Keep-warm pings prime them so Slack requests find them loaded.
 """
-# Assume role in Staging A
-sts = boto3.client('sts')
-service_id = sts.meta.service_model.service_id
-assumed_role=sts.assume_role(
-    RoleArn="REMOVED FOR SECURITY REASONS",
-    RoleSessionName="KillSwitchSession"
-)
-credentials=assumed_role['Credentials']
-
-# Create a new session with the assumed role's credentials
-session = boto3.Session(region_name=AWS_REGION,
-    aws_access_key_id=credentials['AccessKeyId'],
-    aws_secret_access_key=credentials['SecretAccessKey'],
-    aws_session_token=credentials['SessionToken'],
-)
-
-# New EKS client
-eks = session.client("eks")
+eks_session = None
+eks_session_lock = threading.Lock()
+slack = shared_client(SLACK_BOT_TOKEN)
+
+"""
+Block Kit of the killswitch modal, serialized once per container, see qbot.blocks.
+The section of every deployment only depends on its status and is cached per (deployment, status).
+"""
+KILLSWITCH_MODAL = Template({
+    "type": "modal",
+    "private_metadata": Slot("metadata"),
+    "submit": {"type": "plain_text", "text": "Submit", "emoji": True},
+    "close": {"type": "plain_text", "text": "Cancel", "emoji": True},
+    "title": {"type": "plain_text", "text": "Qredochain Killswitch", "emoji": True},
+    "blocks": [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": ":rotating_light: Qredochain Killswitch actions :rotating_light:"
+            }
+        },
+        {
+            "type": "divider"
+        },
+        Items("sections"),
+    ],
+})
+SERVICE_SECTION = Template({
+    "type": "section",
+    "text": {
+      "type": "mrkdwn",
+      "text": Slot("label")
+    },
+    "accessory": {
+      "type": "static_select",
+      "placeholder": {
+        "type": "plain_text",
+        "text": Slot("status"),
+        "emoji": True
+      },
+      "options": [
+        {
+          "text": {
+            "type": "plain_text",
+            "text": "Running",
+            "emoji": True
+          },
+          "value": "Running"
+        },
+        {
+          "text": {
+            "type": "plain_text",
+            "text": "Stopped",
+            "emoji": True
+          },
+          "value": "Stopped"
+        }
+      ],
+      "action_id": Slot("service")
+    }
+})
 
 def lambda_handler(event, context):
     """
@@ -51,256 +103,173 @@ def lambda_handler(event, context):
         event.get("source") == "aws.events"
         and event.get("detail-type") == "Scheduled Event"
     ):
-        print("Received keep-warm event. Exiting without further processing.")
+        logger.info("Received keep-warm event. Exiting without further processing.")
+        _prime()
         return {"statusCode": 200, "body": json.dumps("Keep-warm event processed.")}
 
     # Load kubeconfig
     _load_kubeconfig()
 
-    print("Event received:")
-    print(event)
-    # If the payload has a "payload" field, assume its an interactivity event otherwise assume its a slash command
-    if "payload" in event["detail"]:
-        payload = json.loads(event["detail"]["payload"][0])
-
+    logger.debug_payload("Event received", event=event)
+    detail = envelope.decode(event["detail"])
+    # Anything that is not a slash command is an interactivity event
+    if detail["type"] != "command":
         # IMPORTANT: only listen to view_submission events
-        if payload.get("type", "") != "view_submission":
+        if detail["type"] != "view_submission":
             return {"statusCode": 200, "body": "Ignoring event"}
 
-        print("Recieved interactivity event")
-        private_metadata = json.loads(payload["view"]["private_metadata"])
-        command = private_metadata.get("text")
-        channel_id = private_metadata.get("channel_id")
+        logger.info("Received interactivity event")
+        command = detail["metadata"].get("text")
+        channel_id = detail["metadata"].get("channel_id")
 
         if command == "killswitch":
-            print("Recieved alert modal submissions")
-            _process_killswitch_modal(payload, channel_id)
+            logger.info("Received killswitch modal submission", channel_id=channel_id)
+            _process_killswitch_modal(detail, channel_id)
             msg = f'*[Qchain]* Qredochain Killswitch procedure completed'
-            _post_message_to_slack(channel_id, msg)
+            slack.post_message(channel_id, msg)
         else:
-            print("Unknown modal submission")
-            _post_message_to_slack(channel_id, "Unknown modal submission")
+            logger.warning("Unknown modal submission", command=command)
+            slack.post_message(channel_id, "Unknown modal submission")
             return {"statusCode": 500, "body": ""}
 
     else:
         """
         The following code is for /qchain killswitch command only. Break into multiple functions if you want to support multiple command actions
         """
-        print("Recieved slash command")
-        trigger_id = event["detail"]["trigger_id"][0]
-        channel_id = event["detail"]["channel_id"][0]
+        logger.info("Received slash command")
+        trigger_id = detail["trigger_id"]
 
-        metadata = _generate_metadata(event)
-        print("metadata:")
-        print(metadata)
+        metadata = _generate_metadata(detail)
+        logger.debug("Generated metadata", metadata=metadata)
         modal = _generate_killswitch_modal(metadata)
 
         # Call Slack's API to open the modal
-        response = requests.post(
-            "https://slack.com/api/views.open",
-            headers={
-                "Authorization": f"Bearer {SLACK_BOT_TOKEN}",
-                "Content-Type": "application/json",
-            },
-            json={"trigger_id": trigger_id, "view": modal},
-        )
-        print("Response from Slack")
-        print(response.text)
-
-        if not response.ok:
-            print(response.text)
+        response = slack.views_open(trigger_id, modal)
+        if not response.get("ok"):
             return {
                 "statusCode": 500,
-                "body": f"Failed to open Slack modal. Error: {response.text}",
+                "body": f"Failed to open Slack modal. Error: {response.get('error')}",
             }
         # Send notification to Slack
-        msg = f'*[Qchain]* @{event["detail"]["user_name"][0]} started the Qredochain Killswitch procedure'
-        _post_message_to_slack(event['detail']['channel_id'][0], msg)
+        msg = f'*[Qchain]* @{detail["user_name"]} started the Qredochain Killswitch procedure'
+        slack.post_message(detail["channel_id"], msg)
 
         return {"statusCode": 200, "body": "Modal opened successfully"}
 
 
-def _generate_metadata(event):
+def _generate_metadata(detail):
     """
     Add internal metadata for modals to route events correctly
 
     Args:
-    - event (dict): The event object from the lambda handler
+    - detail (dict): The decoded event envelope
     """
-    command = event["detail"]["route"]
-    channel_id = event["detail"]["channel_id"][0]
-    user_id = event["detail"]["user_id"][0]
-    user_name = event["detail"]["user_name"][0]
-    text = event["detail"]["text"][0]
     metadata = {
-        "command": command,
-        "text": text,
-        "channel_id": channel_id,
-        "user_id": user_id,
-        "user_name": user_name,
+        "command": detail["route"],
+        "text": detail.get("text"),
+        "channel_id": detail.get("channel_id"),
+        "user_id": detail.get("user_id"),
+        "user_name": detail.get("user_name"),
     }
     return json.dumps(metadata)
 
 
 def _generate_killswitch_modal(metadata):
     """
-    Create a Slack modal for responding to /qchain killswitch command
+    Render the Slack modal for responding to /qchain killswitch command
 
     Args:
-    - metadata (dict): The metadata to be passed to the modal
+    - metadata (str): The metadata to be passed to the modal
     """
-    modal = {
-        "type": "modal",
-        "private_metadata": metadata,
-        "submit": {"type": "plain_text", "text": "Submit", "emoji": True},
-        "close": {"type": "plain_text", "text": "Cancel", "emoji": True},
-        "title": {"type": "plain_text", "text": "Qredochain Killswitch", "emoji": True},
-        "blocks": [
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": ":rotating_light: Qredochain Killswitch actions :rotating_light:"
-                }
-            },
-            {
-                "type": "divider"
-            },
-        ],
-    }
-
     # Get current status of deployments
     status = _get_killswitch_services_status()
-    print(status)
+    logger.info("Killswitch services status", status=status)
     # Populate sections with the killswitch deployments
-    for service in DEPLOYMENTS:
-        section = {
-            "type": "section",
-            "text": {
-              "type": "mrkdwn",
-              "text": f"*{service}*"
-            },
-            "accessory": {
-              "type": "static_select",
-              "placeholder": {
-                "type": "plain_text",
-                "text": status[service],
-                "emoji": True
-              },
-              "options": [
-                {
-                  "text": {
-                    "type": "plain_text",
-                    "text": "Running",
-                    "emoji": True
-                  },
-                  "value": "Running"
-                },
-                {
-                  "text": {
-                    "type": "plain_text",
-                    "text": "Stopped",
-                    "emoji": True
-                  },
-                  "value": "Stopped"
-                }
-              ],
-              "action_id": f"{service}"
-            }
-        }
-        modal['blocks'].append(section)
-
-    return modal
+    sections = [_service_section(service, status[service]) for service in DEPLOYMENTS]
+    return KILLSWITCH_MODAL.render(metadata=metadata, sections=sections)
 
 
-def _process_killswitch_modal(payload, channel_id):
+@lru_cache(maxsize=None)
+def _service_section(service, status):
     """
-    Process the data from the alert modal and scale deployments accordingly
+    Returns the serialized section of a killswitch deployment
 
     Args:
-    - payload (dict): The payload from the modal submission
-    - channel_id (str): Slack channel id
+    - service (str): The deployment name, also the action_id of its select
+    - status (str): Running or Stopped, shown as the placeholder of the select
     """
-    print(payload)
-    user_selection = {}
-    # TODO: Get selection for each service in a dict and call scale_killswitch_services()
-    values = (
-        payload.get("view", {})
-        .get("state", {})
-        .get("values", {})
-    )
-    for v in values.keys():
-        service = list(values[v].keys())[0]
-        selection = values[v][service].get("selected_option", {})
-        if selection is not None:
-            value = selection.get("value", "")
-            user_selection[service] = value
-
-    print("User selection:")
-    print(user_selection)
-    _scale_killswitch_services(user_selection, channel_id)
-    return "Done"
+    return SERVICE_SECTION.render(label=f"*{service}*", status=status, service=service)
 
 
-def _get_slack_channel_name(channel_id):
+def _process_killswitch_modal(detail, channel_id):
     """
-    Retrieves the name of a Slack channel given its ID.
+    Process the data from the alert modal and scale deployments accordingly
 
     Args:
-    - channel_id (str): ID of the Slack channel to retrieve the name for.
+    - detail (dict): The decoded envelope of the modal submission
+    - channel_id (str): Slack channel id
     """
-    url = "https://slack.com/api/conversations.info"
-    headers = {
-        "Content-Type": "application/x-www-form-urlencoded",
-        "Authorization": f"Bearer {SLACK_BOT_TOKEN}",
-    }
-    params = {"channel": channel_id}
-
-    response = requests.get(url, headers=headers, params=params)
-    data = response.json()
+    logger.debug_payload("Killswitch modal submission", detail=detail)
+    # The select of every service uses the service name as action_id, unselected ones are None
+    user_selection = {service: value for service, value in detail["values"].items() if value is not None}
 
-    if data.get("ok"):
-        return data["channel"]["name"]
-    else:
-        print(f"Error: {data.get('error')}")
-        return None
+    logger.info("User selection", selection=user_selection)
+    _scale_killswitch_services(user_selection, channel_id)
+    return "Done"
 
 
-def _post_message_to_slack(channel_id, message_text):
+def _prime():
     """
-    Posts a message to a Slack channel.
-
-    Args:
-    - channel_id (str): ID of the Slack channel to send the message to.
-    - message_text (str): Text of the message to send.
+    Loads the lazily initialized modules and session so the next request does not pay for them
     """
+    try:
+        import kubernetes.client  # noqa: F401
+        import kubernetes.config  # noqa: F401
 
-    url = "https://slack.com/api/chat.postMessage"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {SLACK_BOT_TOKEN}",
-    }
-    data = {
-        "channel": channel_id,
-        "text": message_text,
-    }
-    print(data)
-
-    response = requests.post(url, headers=headers, json=data)
-    response_data = response.json()
+        _get_eks_session()
+    except Exception as e:
+        logger.error("Failed to prime clients", error=repr(e))
 
-    if not response_data["ok"]:
-        print(f"Error sending message to Slack: {response_data['error']}")
-        # raise Exception(f"Error sending message to Slack: {response_data['error']}") <- this causes eventbridge to retry event sending avoid raising exceptions like so
 
-    print("Response from Slack:")
-    print(response_data)
-    return response_data
+def _get_eks_session():
+    """
+    Returns (session, eks client, sts service id) of the assumed killswitch role.
+    The role is assumed on first use and again when its credentials are about to expire.
+    """
+    global eks_session
+    with eks_session_lock:
+        if eks_session is None or eks_session["expires_at"] - time.time() < CREDENTIALS_REFRESH_MARGIN:
+            import boto3
+
+            # Assume role in Staging A
+            sts = boto3.client('sts')
+            assumed_role = sts.assume_role(
+                RoleArn="REMOVED FOR SECURITY REASONS",
+                RoleSessionName="KillSwitchSession"
+            )
+            credentials = assumed_role['Credentials']
+
+            # Create a new session with the assumed role's credentials
+            session = boto3.Session(region_name=AWS_REGION,
+                aws_access_key_id=credentials['AccessKeyId'],
+                aws_secret_access_key=credentials['SecretAccessKey'],
+                aws_session_token=credentials['SessionToken'],
+            )
+            eks_session = {
+                "session": session,
+                # New EKS client
+                "eks": session.client("eks"),
+                "service_id": sts.meta.service_model.service_id,
+                "expires_at": credentials['Expiration'].timestamp(),
+            }
+            logger.info("Assumed killswitch role")
+        return eks_session["session"], eks_session["eks"], eks_session["service_id"]
 
 def _get_cluster_info():
     """
     Retrieve cluster endpoint and certificate
     """
+    _, eks, _ = _get_eks_session()
     cluster_info = eks.describe_cluster(name=EKS_CLUSTER_NAME)
     endpoint = cluster_info['cluster']['endpoint']
     cert_authority = cluster_info['cluster']['certificateAuthority']['data']
@@ -314,6 +283,9 @@ def _get_bearer_token():
     """
     Create authentication token
     """
+    from botocore.signers import RequestSigner
+
+    session, _, service_id = _get_eks_session()
     signer = RequestSigner(
         service_id,
         session.region_name,
@@ -364,13 +336,17 @@ def _load_kubeconfig():
         'preferences': {},
         'users': [{'name': 'user1', "user" : {'token': _get_bearer_token()}}]
     }
+    from kubernetes import config
+
     config.load_kube_config_from_dict(config_dict=kubeconfig)
-    print("Kubeconfig loaded")
+    logger.info("Kubeconfig loaded")
 
 def _get_killswitch_services_status():
     """
     Retrieves the status of killswitch services, Running or Stopped
     """
+    from kubernetes import client
+
     status = {}
     apps_v1_api = client.AppsV1Api()
     for deployment in DEPLOYMENTS:
@@ -389,6 +365,8 @@ def _scale_killswitch_services(services, channel_id):
     - services (Dict{str: str}): Set of services with the desired state: Running or Stopped
     - channel_id (str): Slack channel id
     """
+    from kubernetes import client
+
     status = _get_killswitch_services_status()
     apps_v1_api = client.AppsV1Api()
     report_msg = []
@@ -404,4 +382,4 @@ def _scale_killswitch_services(services, channel_id):
             # Add report message
             report_msg.append(f"Scaled service `{service}` to `{scale.spec.replicas}` replicas")
     if len(report_msg) >= 1:
-        _post_message_to_slack(channel_id, ('\n').join(report_msg))
+        slack.post_message(channel_id, ('\n').join(report_msg))
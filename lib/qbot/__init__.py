@@ -0,0 +1,4 @@
+"""
+Code shared by all Q-Bot lambdas. scripts/package-lambda.sh adds this package to
+the root of every lambda zip, so handlers import it as `qbot`.
+"""
@@ -0,0 +1,130 @@
+"""
+Block Kit templates serialized once per container.
+
+A Template is built at import from a view, or any JSON document, in which the
+parts that change per request are Slot markers. The document is serialized once
+and split around the slots, so render() only serializes the slot values and joins
+the fragments:
+
+    ALERT_MODAL = Template({"type": "modal", "private_metadata": Slot("metadata"),
+                            "blocks": [HEADER, Items("sections")]})
+    body = ALERT_MODAL.render(metadata=metadata, sections=[Raw(section_json), ...])
+
+Slot values are serialized with json.dumps, Raw values are JSON text spliced as is,
+e.g. fragments cached across requests or another rendered template. An Items slot
+stands for any number of elements of the list it is placed in. render() returns JSON
+text, post it as the body (data=) instead of passing a dict to requests' json=.
+"""
+import json
+import re
+
+# Slots are serialized as this string and cut out of the JSON text
+_SENTINEL = "\x00slot:{}\x00"
+_SLOT_PATTERN = re.compile(r'"\\u0000slot:([^\\"]+)\\u0000"')
+
+
+class Raw(str):
+    """
+    JSON text spliced into a template without being serialized again
+    """
+
+
+class Slot:
+    """
+    Marks a value of the document filled in per request
+
+    Args:
+    - name (str): Keyword argument of render() providing the value
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Items(Slot):
+    """
+    Marks zero or more elements of a list, render() takes an iterable of values for it
+    """
+
+
+def dumps(value):
+    """
+    Serializes a value the way templates are, without whitespace. Raw values are returned as is
+
+    Args:
+    - value (any): JSON serializable value or Raw
+    """
+    if isinstance(value, Raw):
+        return value
+    return Raw(json.dumps(value, separators=(",", ":")))
+
+
+class Template:
+    """
+    JSON document pre-serialized around its Slot markers
+
+    Args:
+    - document (dict): The view, payload or block with Slot and Items markers
+    """
+
+    def __init__(self, document):
+        items = set()
+        text = json.dumps(_mark(document, items), separators=(",", ":"))
+        parts = _SLOT_PATTERN.split(text)
+        # parts alternates static JSON text and slot names: text, name, text, name, ..., text
+        self._fragments = parts[0::2]
+        self._slots = []
+        for index, name in enumerate(parts[1::2]):
+            comma = None
+            if name in items:
+                # An empty Items slot renders nothing, the comma separating it from its neighbour moves into the slot
+                if self._fragments[index].endswith(","):
+                    self._fragments[index] = self._fragments[index][:-1]
+                    comma = "before"
+                elif self._fragments[index + 1].startswith(","):
+                    self._fragments[index + 1] = self._fragments[index + 1][1:]
+                    comma = "after"
+            self._slots.append((name, name in items, comma))
+
+    @property
+    def slots(self):
+        """
+        Names of the slots render() expects
+        """
+        return [name for name, _, _ in self._slots]
+
+    def render(self, **values):
+        """
+        Returns the JSON text of the document with the slots filled in
+
+        Args:
+        - values: One value per slot, an iterable of values for Items slots
+        """
+        parts = [self._fragments[0]]
+        for (name, is_items, comma), fragment in zip(self._slots, self._fragments[1:]):
+            if is_items:
+                joined = ",".join(map(dumps, values[name]))
+                if joined and comma == "before":
+                    joined = "," + joined
+                elif joined and comma == "after":
+                    joined += ","
+                parts.append(joined)
+            else:
+                parts.append(dumps(values[name]))
+            parts.append(fragment)
+        return Raw("".join(parts))
+
+
+def _mark(value, items):
+    """
+    Returns a copy of the document with the slots replaced by their sentinel strings
+    """
+    if isinstance(value, Slot):
+        if isinstance(value, Items):
+            items.add(value.name)
+        return _SENTINEL.format(value.name)
+    if isinstance(value, dict):
+        return {key: _mark(item, items) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_mark(item, items) for item in value]
+    return value
@@ -0,0 +1,244 @@
+"""
+Caches for data the lambdas fetch from third party APIs.
+
+StaleWhileRevalidateCache keeps one value in the memory of the warm container.
+A fresh value is returned as is. A stale one is returned immediately too while a
+background thread fetches the new value, so a slow API is never on the request
+path once the cache has been filled. An optional persistent store keeps the last
+value across module reloads. Stores implement `load()` returning
+(value, fetched_at) or None and `save(value, fetched_at)`.
+
+LRUCache keeps many small values (e.g. channel names by id, or the signatures,
+idempotency keys and rate limit buckets of the gatekeeper), each with its own TTL
+or the cache's default one, evicting the least recently used beyond its size.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from qbot.log import get_logger
+
+logger = get_logger("qbot.cache")
+
+
+class FileStore:
+    """
+    Persistent tier writing the value as JSON to a file, e.g. under /tmp.
+    /tmp lives as long as the execution environment, a store shared between
+    environments (S3, DynamoDB) implements the same two methods.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """
+        Returns (value, fetched_at) or None when nothing readable is stored
+        """
+        try:
+            with open(self.path) as f:
+                entry = json.load(f)
+            return entry["value"], entry["fetched_at"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, value, fetched_at):
+        """
+        Replaces the stored value atomically
+
+        Args:
+        - value (any): JSON serializable value
+        - fetched_at (float): Epoch seconds the value was fetched at
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".cache-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"value": value, "fetched_at": fetched_at}, f)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+
+class StaleWhileRevalidateCache:
+    """
+    Single value cache serving stale values while refreshing them in the background.
+    Values older than `ttl` seconds are refreshed, values older than `max_stale` are not
+    served and are fetched on the request path instead.
+    """
+
+    def __init__(self, name, fetch, ttl, max_stale, store=None):
+        self.name = name
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.store = store
+        self._value = None
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        self._refreshing = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"refresh-{name}")
+
+    def get(self):
+        """
+        Returns the cached value, fetching it on the request path only when there is none
+        or it is older than max_stale. Fetch errors are raised only when nothing can be served.
+        """
+        if self._fetched_at is None and self.store is not None:
+            self._load_store()
+        age = self.age()
+        if age is not None and age < self.ttl:
+            return self._value
+        if age is not None and age < self.max_stale:
+            self.refresh_async()
+            return self._value
+
+        try:
+            return self.refresh()
+        except Exception as e:
+            if self._fetched_at is None:
+                raise
+            logger.error("Refresh failed, serving expired value", cache=self.name, age=round(age), error=repr(e))
+            return self._value
+
+    def ready(self):
+        """
+        Whether get() answers without fetching on the calling thread
+        """
+        if self._fetched_at is None and self.store is not None:
+            self._load_store()
+        age = self.age()
+        return age is not None and age < self.max_stale
+
+    def age(self):
+        """
+        Seconds since the value was fetched, None when there is no value
+        """
+        return None if self._fetched_at is None else time.time() - self._fetched_at
+
+    def refresh(self):
+        """
+        Fetches and stores a new value on the calling thread and returns it
+        """
+        started = time.perf_counter()
+        value = self.fetch()
+        fetched_at = time.time()
+        with self._lock:
+            self._value, self._fetched_at = value, fetched_at
+        logger.info("Cache refreshed", cache=self.name, duration_ms=round((time.perf_counter() - started) * 1000, 1))
+        if self.store is not None:
+            try:
+                self.store.save(value, fetched_at)
+            except Exception as e:
+                logger.warning("Failed to persist cache", cache=self.name, error=repr(e))
+        return value
+
+    def refresh_async(self):
+        """
+        Starts a background refresh unless one is running, returns its future
+        """
+        with self._lock:
+            if self._refreshing is None or self._refreshing.done():
+                self._refreshing = self._executor.submit(self._refresh_logged)
+            return self._refreshing
+
+    def _refresh_logged(self):
+        try:
+            return self.refresh()
+        except Exception as e:
+            logger.error("Background refresh failed", cache=self.name, error=repr(e))
+
+    def _load_store(self):
+        entry = self.store.load()
+        if entry is not None:
+            with self._lock:
+                if self._fetched_at is None:
+                    self._value, self._fetched_at = entry
+
+
+class LRUCache:
+    """
+    Thread safe cache of at most `maxsize` entries, each expiring after the ttl it was set with,
+    `ttl` when none is given. Expired entries are kept until evicted so callers can fall back to them.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None, stale=False):
+        """
+        Returns the value stored for key, or default when it is missing or expired
+
+        Args:
+        - key (hashable): The cache key
+        - default (any): Returned when the key is not cached
+        - stale (bool): Return the value even if it expired
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (not stale and entry[0] <= time.monotonic()):
+                return default
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """
+        Stores value for key for ttl seconds, evicting the least recently used entries beyond maxsize
+
+        Args:
+        - key (hashable): The cache key
+        - value (any): The value to store
+        - ttl (float): Seconds the value is fresh, the cache's ttl when None
+        """
+        with self._lock:
+            self._store(key, value, ttl, time.monotonic())
+
+    def add(self, key, value=True, ttl=None):
+        """
+        Stores value only if key is not cached or expired. Returns False if it already was.
+
+        Args:
+        - key (hashable): The cache key
+        - value (any): The value to store
+        - ttl (float): Seconds the value is fresh, the cache's ttl when None
+        """
+        with self._lock:
+            now = time.monotonic()
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                return False
+            self._store(key, value, ttl, now)
+            return True
+
+    def delete(self, key):
+        """
+        Removes key from the cache, if present
+
+        Args:
+        - key (hashable): The cache key
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def _store(self, key, value, ttl, now):
+        self._data[key] = (now + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
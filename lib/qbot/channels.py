@@ -0,0 +1,131 @@
+"""
+Slack channel names by id for the backends.
+
+ChannelDirectory answers from an LRU cache with a TTL per entry. warm() fills it
+from the pages of conversations.list, keep-warm pings call warm_if_stale() so
+lookups of Slack requests do not hit the network in steady state. A channel
+missing from the cache is resolved once with conversations.info. Unknown ids and
+failed lookups are cached as negative results for SLACK_CHANNEL_NEGATIVE_TTL, a
+name that expired keeps being served while Slack cannot be reached.
+"""
+import os
+import threading
+import time
+
+from qbot.cache import LRUCache
+from qbot.log import get_logger
+
+logger = get_logger("qbot.channels")
+
+SLACK_CHANNEL_CACHE_SIZE = int(os.environ.get("SLACK_CHANNEL_CACHE_SIZE", "10000"))
+SLACK_CHANNEL_CACHE_TTL = int(os.environ.get("SLACK_CHANNEL_CACHE_TTL", "3600"))
+SLACK_CHANNEL_NEGATIVE_TTL = int(os.environ.get("SLACK_CHANNEL_NEGATIVE_TTL", "300"))
+# conversations.list pages of up to 1000 channels read by warm()
+SLACK_CHANNEL_LIST_MAX_PAGES = int(os.environ.get("SLACK_CHANNEL_LIST_MAX_PAGES", "20"))
+CHANNEL_LIST_PAGE_SIZE = 1000
+
+_MISSING = object()
+
+
+class ChannelDirectory:
+    """
+    Cached channel id to name resolution
+
+    Args:
+    - slack (qbot.slack.SlackClient): The client calling conversations.info and conversations.list
+    - maxsize (int): Channels kept in memory
+    - ttl (float): Seconds a resolved name is served
+    - negative_ttl (float): Seconds an unknown id or a failed lookup is answered with None
+    """
+
+    def __init__(
+        self,
+        slack,
+        maxsize=SLACK_CHANNEL_CACHE_SIZE,
+        ttl=SLACK_CHANNEL_CACHE_TTL,
+        negative_ttl=SLACK_CHANNEL_NEGATIVE_TTL,
+    ):
+        self.slack = slack
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.warmed_at = None
+        self._cache = LRUCache(maxsize)
+        self._warm_lock = threading.Lock()
+
+    def name(self, channel_id):
+        """
+        Returns the name of a channel, None when it is unknown or cannot be resolved
+
+        Args:
+        - channel_id (str): The channel id, e.g. C0123456789
+        """
+        name = self._cache.get(channel_id, _MISSING)
+        if name is not _MISSING:
+            return name
+
+        data = self.slack.call("conversations.info", params={"channel": channel_id})
+        if data.get("ok"):
+            name = data["channel"]["name"]
+            self._cache.set(channel_id, name, self.ttl)
+            return name
+        # Unknown channel or Slack failing: answer without calling again for a while,
+        # with the expired name if Slack could not tell whether the channel still exists
+        name = None if data.get("error") == "channel_not_found" else self._cache.get(channel_id, None, stale=True)
+        self._cache.set(channel_id, name, self.negative_ttl)
+        logger.warning("Channel not resolved", channel_id=channel_id, error=data.get("error"), stale=name is not None)
+        return name
+
+    def warm(self, max_pages=SLACK_CHANNEL_LIST_MAX_PAGES):
+        """
+        Caches the names of all channels the bot can see from conversations.list, returns how many
+
+        Args:
+        - max_pages (int): Most pages of CHANNEL_LIST_PAGE_SIZE channels read
+        """
+        with self._warm_lock:
+            started = time.perf_counter()
+            params = {
+                "limit": CHANNEL_LIST_PAGE_SIZE,
+                "exclude_archived": "true",
+                "types": "public_channel,private_channel",
+            }
+            count = 0
+            pages = 0
+            complete = False
+            while pages < max_pages:
+                data = self.slack.call("conversations.list", params=params)
+                if not data.get("ok"):
+                    break
+                pages += 1
+                for channel in data.get("channels", []):
+                    self._cache.set(channel["id"], channel["name"], self.ttl)
+                    count += 1
+                cursor = (data.get("response_metadata") or {}).get("next_cursor")
+                if not cursor:
+                    complete = True
+                    break
+                params["cursor"] = cursor
+            if complete:
+                self.warmed_at = time.monotonic()
+            logger.info(
+                "Channel directory warmed",
+                channels=count,
+                pages=pages,
+                complete=complete,
+                duration_ms=round((time.perf_counter() - started) * 1000, 1),
+            )
+            return count
+
+    def warm_if_stale(self):
+        """
+        Warms the directory when it was never completely warmed or half of the TTL of its names passed,
+        so names warmed on one keep-warm ping are refreshed by a later one before they expire
+        """
+        if self.warmed_at is None or time.monotonic() - self.warmed_at >= self.ttl / 2:
+            try:
+                self.warm()
+            except Exception as e:
+                logger.error("Failed to warm channel directory", error=repr(e))
+
+    def __len__(self):
+        return len(self._cache)
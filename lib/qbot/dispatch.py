@@ -0,0 +1,73 @@
+"""
+Dispatch table of the backends: which handler serves a command route and action.
+
+Handlers are keyed by (route, action), the action being the first word of the
+command text for slash commands and of the private_metadata "text" for
+interactivity events, which modals carry over from the command that opened
+them. A handler registered with action None serves every action of its route
+without one of its own. Lookups are a dict access or two, whatever the number
+of commands served.
+
+    table = DispatchTable()
+    table.register("/sre", ["alert"], opsgenie_handler)
+    handler = table.resolve(envelope.decode(event["detail"]))
+"""
+
+
+class DispatchTable:
+    """
+    Handlers by (route, action)
+    """
+
+    def __init__(self):
+        self._handlers = {}
+
+    def register(self, route, actions, handler):
+        """
+        Registers handler for the actions of a route
+
+        Args:
+        - route (str): The command, e.g. /sre
+        - actions (list): The actions served, None for every action of the route
+        - handler (callable): Called with (event, context) like a lambda handler
+        """
+        for action in actions if actions is not None else [None]:
+            key = (route, action)
+            if key in self._handlers:
+                raise ValueError(f"{route} {action or '*'} is already registered")
+            self._handlers[key] = handler
+
+    def resolve(self, detail):
+        """
+        Returns the handler of an envelope, None when its route and action are not registered
+
+        Args:
+        - detail (dict): The decoded envelope
+        """
+        route = detail.get("route")
+        handler = self._handlers.get((route, action_of(detail)))
+        if handler is None:
+            handler = self._handlers.get((route, None))
+        return handler
+
+    def routes(self):
+        """
+        Returns the registered (route, action) pairs, action None standing for every action
+        """
+        return list(self._handlers)
+
+
+def action_of(detail):
+    """
+    Returns the action of an envelope: the first word of the command text, or of the text the
+    modal's metadata carries for interactivity events. None when there is no text.
+
+    Args:
+    - detail (dict): The decoded envelope
+    """
+    if detail.get("type") == "command":
+        text = detail.get("text")
+    else:
+        text = (detail.get("metadata") or {}).get("text")
+    words = (text or "").split(None, 1)
+    return words[0] if words else None
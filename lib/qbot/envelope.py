@@ -0,0 +1,124 @@
+"""
+Event envelope the gatekeeper sends to the backend lambdas.
+
+The gatekeeper parses the Slack request once and forwards only the fields
+backends use, flat and with JSON native values instead of parse_qs lists:
+
+    {"v": 1, "route": "/sre", "type": "command", "text": "alert",
+     "channel_id": "C...", "user_id": "U...", "user_name": "...", "trigger_id": "..."}
+
+Interactivity payloads keep their Slack type ("view_submission", "block_actions"...),
+the user and trigger id, the parsed private_metadata as "metadata", the view id and
+every input as "values" {action_id: value} with select labels in "labels"
+{action_id: text}. Options loads ("block_suggestion") add the "action_id" of the
+select and the typed "query". The view's blocks are dropped, they are the bulk of a view
+submission and backends never read them.
+
+Backends call decode(event["detail"]). It also accepts the raw parse_qs detail sent
+before the envelope existed, so the gatekeeper and backends can be deployed in any order.
+"""
+import json
+
+VERSION = 1
+
+# Slash command fields forwarded to backends, everything else (token, team and enterprise ids...) is dropped
+COMMAND_FIELDS = ("command", "text", "channel_id", "user_id", "user_name", "trigger_id", "response_url")
+
+
+def from_command(route, fields):
+    """
+    Builds the envelope of a slash command
+
+    Args:
+    - route (str): The command the event is routed by
+    - fields (dict): The parse_qs decoded request body
+    """
+    detail = {"v": VERSION, "route": route, "type": "command"}
+    for name in COMMAND_FIELDS:
+        values = fields.get(name)
+        if values:
+            detail[name] = values[0]
+    return detail
+
+
+def from_interaction(route, payload):
+    """
+    Builds the envelope of an interactivity payload
+
+    Args:
+    - route (str): The command the event is routed by, from the view's private_metadata
+    - payload (dict): The parsed interactivity payload
+    """
+    user = payload.get("user") or {}
+    detail = {
+        "v": VERSION,
+        "route": route,
+        "type": payload.get("type"),
+        "user_id": user.get("id"),
+        "user_name": user.get("username") or user.get("name"),
+        "trigger_id": payload.get("trigger_id"),
+    }
+    view = payload.get("view")
+    if view:
+        detail["view_id"] = view.get("id")
+        detail["metadata"] = json.loads(view.get("private_metadata") or "{}")
+        values, labels = {}, {}
+        for block in ((view.get("state") or {}).get("values") or {}).values():
+            for action_id, element in block.items():
+                values[action_id], label = _element_value(element)
+                if label is not None:
+                    labels[action_id] = label
+        detail["values"] = values
+        detail["labels"] = labels
+    if detail["type"] == "block_suggestion":
+        # Options load of an external select: which select and what the user typed
+        detail["action_id"] = payload.get("action_id")
+        detail["query"] = payload.get("value", "")
+    if payload.get("actions"):
+        detail["actions"] = {action["action_id"]: _element_value(action)[0] for action in payload["actions"]}
+    channel = payload.get("channel") or {}
+    if channel.get("id"):
+        detail["channel_id"] = channel["id"]
+    return detail
+
+
+def _element_value(element):
+    """
+    Returns (value, label) of a Block Kit input or action element
+    """
+    if "selected_option" in element:
+        option = element["selected_option"] or {}
+        return option.get("value"), (option.get("text") or {}).get("text")
+    if "selected_options" in element:
+        return [option.get("value") for option in element["selected_options"] or []], None
+    for key, value in element.items():
+        if key.startswith("selected_"):
+            return value, None
+    return element.get("value"), None
+
+
+def decode(detail):
+    """
+    Returns the envelope of an event detail, converting the raw parse_qs detail of older gatekeepers
+
+    Args:
+    - detail (dict): The detail of the EventBridge shaped event
+    """
+    version = detail.get("v")
+    if version == VERSION:
+        return detail
+    if version is not None:
+        raise ValueError(f"Unsupported envelope version: {version}")
+    if "payload" in detail:
+        return from_interaction(detail.get("route"), json.loads(detail["payload"][0]))
+    return from_command(detail.get("route"), detail)
+
+
+def encode(detail):
+    """
+    Serializes an envelope for the PutEvents Detail or an invoke payload, without whitespace
+
+    Args:
+    - detail (dict): The envelope
+    """
+    return json.dumps(detail, separators=(",", ":"))
@@ -0,0 +1,130 @@
+"""
+In-process Lambda extension used to finish background work after the handler
+has returned its response.
+
+Lambda only freezes the execution environment once the runtime has posted the
+response AND every registered extension has asked for the next event. By
+registering from inside the function process and holding back the next
+/event/next call until pending work is done, the response reaches API Gateway
+immediately while the work still completes before the freeze. Used by the
+gatekeeper in ack-first mode and by the pushover digests.
+"""
+import json
+import os
+import threading
+import time
+import urllib.request
+
+from qbot.log import get_logger
+
+RUNTIME_API = os.environ.get("AWS_LAMBDA_RUNTIME_API")
+EXTENSION_API_VERSION = "2020-01-01"
+# Leave this much of the invocation deadline for Lambda itself
+DEADLINE_MARGIN_MS = 200
+# Seconds between attempts to get the next event after the runtime API failed, doubled up to the max
+RETRY_DELAY = 0.05
+MAX_RETRY_DELAY = 1.0
+
+logger = get_logger("qbot.flush_extension")
+
+
+class FlushExtension:
+    """
+    Tracks background futures and keeps the environment alive until they finish
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.registered = False
+        self._extension_id = None
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._handler_returned = threading.Semaphore(0)
+
+    def register(self):
+        """
+        Registers the extension for INVOKE events. Returns False outside of Lambda or on failure.
+        Must be called during the init phase, i.e. at module import.
+        """
+        if not RUNTIME_API:
+            return False
+        try:
+            request = urllib.request.Request(
+                f"http://{RUNTIME_API}/{EXTENSION_API_VERSION}/extension/register",
+                data=json.dumps({"events": ["INVOKE"]}).encode("utf-8"),
+                headers={"Lambda-Extension-Name": self.name},
+                method="POST",
+            )
+            with urllib.request.urlopen(request, timeout=2) as response:
+                self._extension_id = response.headers["Lambda-Extension-Identifier"]
+        except Exception as e:
+            logger.error("Failed to register extension", extension=self.name, error=repr(e))
+            return False
+
+        threading.Thread(target=self._run, name=self.name, daemon=True).start()
+        self.registered = True
+        return True
+
+    def track(self, future):
+        """
+        Keeps the environment alive until the given future is done
+
+        Args:
+        - future (concurrent.futures.Future): Background work started by the handler
+        """
+        with self._condition:
+            self._pending += 1
+        future.add_done_callback(self._done)
+
+    def invocation_finished(self):
+        """
+        Signals that the handler has returned for the current invocation
+        """
+        if self.registered:
+            self._handler_returned.release()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until all tracked futures are done. Returns False if the timeout expired first.
+
+        Args:
+        - timeout (float): Maximum number of seconds to wait, None waits forever
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending == 0, timeout)
+
+    def _done(self, future):
+        with self._condition:
+            self._pending -= 1
+            self._condition.notify_all()
+
+    def _next_event(self):
+        request = urllib.request.Request(
+            f"http://{RUNTIME_API}/{EXTENSION_API_VERSION}/extension/event/next",
+            headers={"Lambda-Extension-Identifier": self._extension_id},
+        )
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    def _run(self):
+        delay = RETRY_DELAY
+        while True:
+            # Lambda waits for this call before every invocation, the thread must never die while registered
+            try:
+                event = self._next_event()
+            except Exception as e:
+                logger.error("Failed to get the next extension event, retrying", extension=self.name, error=repr(e))
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+                continue
+            delay = RETRY_DELAY
+            self._handler_returned.acquire()
+            try:
+                timeout = None
+                if "deadlineMs" in event:
+                    timeout = max((event["deadlineMs"] - DEADLINE_MARGIN_MS) / 1000 - time.time(), 0)
+                if not self.wait(timeout=timeout):
+                    logger.warning("Background work did not finish before the invocation deadline")
+            except Exception as e:
+                # A malformed event must not stop the loop, the next /event/next call releases the freeze
+                logger.error("Failed to process extension event", extension=self.name, error=repr(e))
@@ -0,0 +1,131 @@
+"""
+Structured logging for the lambdas.
+
+Every record is one JSON line on stdout, which CloudWatch ingests as is:
+
+    {"level": "INFO", "logger": "gatekeeper", "message": "Event sent", "command": "/sre"}
+
+Nothing is formatted for records below the configured level. Each field is
+serialized once and cut to LOG_FIELD_MAX_CHARS, callables passed as field
+values are only called when the record is emitted, and debug_payload records
+are sampled with LOG_PAYLOAD_SAMPLE_RATE.
+"""
+import json
+import os
+import random
+import sys
+import traceback
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+LEVELS = {name: level for level, name in LEVEL_NAMES.items()}
+
+LOG_LEVEL = LEVELS.get(os.environ.get("LOG_LEVEL", "INFO").upper(), INFO)
+LOG_FIELD_MAX_CHARS = int(os.environ.get("LOG_FIELD_MAX_CHARS", "2048"))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", "1.0"))
+
+
+class Logger:
+    """
+    Emits JSON lines with a level, a message and arbitrary fields
+    """
+
+    def __init__(self, name, level=LOG_LEVEL, field_max_chars=LOG_FIELD_MAX_CHARS, payload_sample_rate=LOG_PAYLOAD_SAMPLE_RATE):
+        self.name = name
+        self.level = level
+        self.field_max_chars = field_max_chars
+        self.payload_sample_rate = payload_sample_rate
+
+    def is_enabled_for(self, level):
+        """
+        Returns True if records of the given level are emitted
+
+        Args:
+        - level (int): One of DEBUG, INFO, WARNING, ERROR
+        """
+        return level >= self.level
+
+    def debug(self, message, *args, **fields):
+        """
+        Logs a DEBUG record, message is %-formatted with args only when emitted
+        """
+        if DEBUG >= self.level:
+            self._emit(DEBUG, message, args, fields)
+
+    def info(self, message, *args, **fields):
+        """
+        Logs a INFO record, message is %-formatted with args only when emitted
+        """
+        if INFO >= self.level:
+            self._emit(INFO, message, args, fields)
+
+    def warning(self, message, *args, **fields):
+        """
+        Logs a WARNING record, message is %-formatted with args only when emitted
+        """
+        if WARNING >= self.level:
+            self._emit(WARNING, message, args, fields)
+
+    def error(self, message, *args, **fields):
+        """
+        Logs a ERROR record, message is %-formatted with args only when emitted
+        """
+        if ERROR >= self.level:
+            self._emit(ERROR, message, args, fields)
+
+    def exception(self, message, *args, **fields):
+        """
+        Logs an ERROR record with the traceback of the exception being handled
+        """
+        if ERROR >= self.level:
+            fields["traceback"] = traceback.format_exc
+            self._emit(ERROR, message, args, fields)
+
+    def debug_payload(self, message, *args, **fields):
+        """
+        Logs a DEBUG record for a large payload, sampled with payload_sample_rate
+        """
+        if DEBUG >= self.level and random.random() < self.payload_sample_rate:
+            self._emit(DEBUG, message, args, fields)
+
+    def _emit(self, level, message, args, fields):
+        if args:
+            message = message % args
+        parts = [
+            '{"level": "', LEVEL_NAMES[level], '", "logger": ', json.dumps(self.name),
+            ', "message": ', self._serialize(message),
+        ]
+        for key, value in fields.items():
+            parts += [", ", json.dumps(key), ": ", self._serialize(value)]
+        parts.append("}\n")
+        sys.stdout.write("".join(parts))
+
+    def _serialize(self, value):
+        if callable(value):
+            value = value()
+        if isinstance(value, str):
+            text = value
+        else:
+            try:
+                serialized = json.dumps(value, default=str, separators=(",", ":"))
+            except (TypeError, ValueError):
+                serialized = json.dumps(repr(value))
+            if len(serialized) <= self.field_max_chars:
+                return serialized
+            text = serialized
+        if len(text) > self.field_max_chars:
+            text = f"{text[:self.field_max_chars]}...({len(text) - self.field_max_chars} chars truncated)"
+        return json.dumps(text)
+
+
+def get_logger(name):
+    """
+    Returns a Logger configured from the LOG_* environment variables
+
+    Args:
+    - name (str): Name of the lambda or module logging
+    """
+    return Logger(name)
@@ -0,0 +1,274 @@
+"""
+Slack Web API client shared by the lambdas.
+
+One SlackClient per lambda, created at module scope with shared_client(), keeps a
+requests Session with a pool of keep-alive connections to Slack, so warm
+invocations skip the TCP and TLS handshakes. Backends loaded in the same process
+(lambda/backend) get the same client and share its pool. Every call has a connect and a read timeout. Rate limited
+calls (HTTP 429) and connect timeouts, which Slack never executed, are retried, rate
+limited calls after their Retry-After. Connection errors and 5xx may come after Slack
+executed the call, they are only retried for idempotent calls: reads, chat.update and
+views.update with a hash. Retries use jittered exponential backoff, within
+SLACK_MAX_RETRY_WAIT seconds of sleeping. Read timeouts are not retried.
+
+Calls return the response data. Failures are logged and returned as
+{"ok": False, "error": ...} rather than raised: raising in a backend makes
+EventBridge deliver the event again.
+
+AsyncSlackClient runs the calls of a SlackClient on a thread pool for asyncio
+code issuing several calls concurrently:
+
+    async def notify(channels):
+        client = AsyncSlackClient(slack)
+        return await asyncio.gather(*(client.post_message(channel, "Hi") for channel in channels))
+"""
+import asyncio
+import functools
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from qbot.blocks import Raw, Slot, Template, dumps
+from qbot.channels import ChannelDirectory
+from qbot.log import get_logger
+
+logger = get_logger("qbot.slack")
+
+# Overridden to point the lambdas at a fake Slack in benchmarks and the local runner
+SLACK_API_URL = os.environ.get("SLACK_API_URL", "https://slack.com/api")
+SLACK_CONNECT_TIMEOUT = float(os.environ.get("SLACK_CONNECT_TIMEOUT", "1"))
+SLACK_READ_TIMEOUT = float(os.environ.get("SLACK_READ_TIMEOUT", "3"))
+SLACK_MAX_RETRIES = int(os.environ.get("SLACK_MAX_RETRIES", "3"))
+# Total seconds spent sleeping between the retries of one call, a longer Retry-After fails the call
+SLACK_MAX_RETRY_WAIT = float(os.environ.get("SLACK_MAX_RETRY_WAIT", "5"))
+# Keep-alive connections kept to Slack, also the concurrency of AsyncSlackClient
+SLACK_POOL_SIZE = int(os.environ.get("SLACK_POOL_SIZE", "10"))
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Methods that can run twice without a visible effect, also retried on connection errors and 5xx.
+# Posting methods are not, a 5xx or a dropped connection may come after Slack posted the message.
+IDEMPOTENT_METHODS = frozenset({"conversations.info", "conversations.list", "users.info", "chat.update"})
+BACKOFF_BASE = 0.25
+BACKOFF_CAP = 2.0
+
+# Bodies of the views methods, the view is spliced as is when it is a rendered template
+VIEWS_OPEN = Template({"trigger_id": Slot("trigger_id"), "view": Slot("view")})
+VIEWS_UPDATE = Template({"view_id": Slot("view_id"), "view": Slot("view")})
+VIEWS_UPDATE_HASH = Template({"view_id": Slot("view_id"), "hash": Slot("hash"), "view": Slot("view")})
+
+
+class SlackClient:
+    """
+    Slack Web API client with a connection pool, timeouts and retries
+
+    Args:
+    - token (str): The bot token
+    - base_url (str): The Web API URL, without trailing slash
+    - pool_size (int): Keep-alive connections kept open
+    """
+
+    def __init__(self, token, base_url=SLACK_API_URL, pool_size=SLACK_POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = (SLACK_CONNECT_TIMEOUT, SLACK_READ_TIMEOUT)
+        self.max_retries = SLACK_MAX_RETRIES
+        self.max_retry_wait = SLACK_MAX_RETRY_WAIT
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {token}"
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # Channel names resolved by channel_name(), warm it from keep-warm handlers with channels.warm_if_stale()
+        self.channels = ChannelDirectory(self)
+
+    def call(self, method, payload=None, params=None, idempotent=None):
+        """
+        Calls a Web API method and returns the response data, {"ok": False, "error": ...} on failure
+
+        Args:
+        - method (str): The API method, e.g. chat.postMessage
+        - payload (dict | str): The JSON body, a str is sent as is (e.g. a rendered qbot.blocks template).
+          Without payload the method is called with GET and params.
+        - params (dict): Query string parameters
+        - idempotent (bool): Whether connection errors and 5xx are retried, by default for GET calls
+          and IDEMPOTENT_METHODS
+        """
+        url = f"{self.base_url}/{method}"
+        kwargs = {"params": params, "timeout": self.timeout}
+        if isinstance(payload, str):
+            kwargs["data"] = payload.encode("utf-8")
+            kwargs["headers"] = {"Content-Type": "application/json; charset=utf-8"}
+        elif payload is not None:
+            kwargs["json"] = payload
+        http_method = "GET" if payload is None else "POST"
+        if idempotent is None:
+            idempotent = payload is None or method in IDEMPOTENT_METHODS
+
+        waited = 0.0
+        attempt = 0
+        detail = None
+        while True:
+            started = time.perf_counter()
+            try:
+                response = self.session.request(http_method, url, **kwargs)
+            except requests.ReadTimeout as e:
+                return self._failed(method, "timeout", repr(e))
+            except requests.ConnectTimeout as e:
+                # The request was never sent
+                response, error, detail = None, "connect_timeout", repr(e)
+            except requests.ConnectionError as e:
+                # Includes keep-alive connections closed by Slack, possibly after it executed the call
+                if not idempotent:
+                    return self._failed(method, "connection_error", repr(e))
+                response, error, detail = None, "connection_error", repr(e)
+            except requests.RequestException as e:
+                return self._failed(method, "request_failed", repr(e))
+
+            if response is not None and (
+                response.status_code not in RETRY_STATUS_CODES or (response.status_code != 429 and not idempotent)
+            ):
+                return self._data(method, response, started)
+
+            delay = self._retry_delay(response, attempt)
+            if response is not None:
+                error = "ratelimited" if response.status_code == 429 else f"http_{response.status_code}"
+            if attempt >= self.max_retries or waited + delay > self.max_retry_wait:
+                return self._failed(method, error, detail, attempts=attempt + 1)
+            logger.warning(
+                "Retrying Slack API call", method=method, error=error, detail=detail, attempt=attempt + 1, delay=round(delay, 3)
+            )
+            time.sleep(delay)
+            waited += delay
+            attempt += 1
+
+    def post_message(self, channel_id, text, **fields):
+        """
+        Posts a message to a Slack channel
+
+        Args:
+        - channel_id (str): ID of the Slack channel to send the message to
+        - text (str): Text of the message
+        - fields: Other chat.postMessage arguments, e.g. blocks
+        """
+        logger.debug("Posting message to Slack", channel_id=channel_id, text=text)
+        return self.call("chat.postMessage", {"channel": channel_id, "text": text, **fields})
+
+    def channel_name(self, channel_id):
+        """
+        Returns the name of a Slack channel from the client's channel directory, None if it cannot be retrieved
+
+        Args:
+        - channel_id (str): ID of the Slack channel
+        """
+        return self.channels.name(channel_id)
+
+    def views_open(self, trigger_id, view):
+        """
+        Opens a modal
+
+        Args:
+        - trigger_id (str): The trigger_id of the command or interaction, valid for 3 seconds
+        - view (dict | str): The view, a str is spliced as pre-serialized JSON
+        """
+        return self.call("views.open", VIEWS_OPEN.render(trigger_id=trigger_id, view=_serialized(view)))
+
+    def views_update(self, view_id, view, hash=None):
+        """
+        Replaces an open modal
+
+        Args:
+        - view_id (str): The id of the open view
+        - view (dict | str): The new view, a str is spliced as pre-serialized JSON
+        - hash (str): The hash of the open view, the update fails if the view changed since
+        """
+        if hash is None:
+            return self.call("views.update", VIEWS_UPDATE.render(view_id=view_id, view=_serialized(view)))
+        # With the hash a repeated update fails instead of applying twice
+        return self.call(
+            "views.update", VIEWS_UPDATE_HASH.render(view_id=view_id, hash=hash, view=_serialized(view)), idempotent=True
+        )
+
+    def _retry_delay(self, response, attempt):
+        """
+        Seconds to wait before the next attempt: Retry-After when Slack sent one, jittered backoff otherwise
+        """
+        if response is not None and response.status_code == 429:
+            try:
+                return float(response.headers.get("Retry-After", "1")) + random.uniform(0, BACKOFF_BASE)
+            except ValueError:
+                pass
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+    def _data(self, method, response, started):
+        try:
+            data = response.json()
+        except ValueError:
+            data = {"ok": False, "error": f"http_{response.status_code}"}
+        if not data.get("ok"):
+            logger.error("Slack API call failed", method=method, status_code=response.status_code, error=data.get("error"))
+        logger.debug_payload(
+            "Response from Slack",
+            method=method,
+            duration_ms=round((time.perf_counter() - started) * 1000, 1),
+            response=response.text,
+        )
+        return data
+
+    def _failed(self, method, error, detail=None, attempts=1):
+        logger.error("Slack API call failed", method=method, error=error, detail=detail, attempts=attempts)
+        return {"ok": False, "error": error}
+
+
+@functools.lru_cache(maxsize=None)
+def shared_client(token):
+    """
+    Returns the SlackClient of a bot token, created once per process
+
+    Args:
+    - token (str): The bot token
+    """
+    return SlackClient(token)
+
+
+class AsyncSlackClient:
+    """
+    asyncio interface of a SlackClient, the calls share its connection pool and run on a
+    thread pool of its size
+
+    Args:
+    - client (SlackClient): The client making the calls
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._executor = ThreadPoolExecutor(max_workers=client.pool_size, thread_name_prefix="slack")
+
+    async def call(self, method, payload=None, params=None, idempotent=None):
+        return await self._run(self.client.call, method, payload, params, idempotent)
+
+    async def post_message(self, channel_id, text, **fields):
+        return await self._run(self.client.post_message, channel_id, text, **fields)
+
+    async def channel_name(self, channel_id):
+        return await self._run(self.client.channel_name, channel_id)
+
+    async def views_open(self, trigger_id, view):
+        return await self._run(self.client.views_open, trigger_id, view)
+
+    async def views_update(self, view_id, view, hash=None):
+        return await self._run(self.client.views_update, view_id, view, hash)
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+
+def _serialized(view):
+    """
+    Returns a view as JSON text, a str is taken as already serialized
+    """
+    return Raw(view) if isinstance(view, str) else dumps(view)
@@ -0,0 +1,8 @@
+"""
+Tools to run the whole bot in one process without AWS. See local/runner.py.
+"""
+import os
+import sys
+
+# The shared qbot package is zipped next to every lambda, make it importable the same way
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib"))
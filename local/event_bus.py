@@ -0,0 +1,187 @@
+"""
+In-memory stand-ins for EventBridge and the Lambda Invoke API.
+
+The gatekeeper's `eventbridge` and `lambda_client` are replaced by these objects,
+they accept the same call signatures as the boto3 clients and deliver events to
+handlers loaded in the same process, asynchronously like the real services.
+"""
+import datetime
+import io
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from qbot.log import get_logger
+
+logger = get_logger("local.event_bus")
+
+
+def matches(pattern, event):
+    """
+    Returns True if the event matches an EventBridge event pattern.
+    Supports exact value lists and nested objects, which is what lambda.tf uses.
+
+    Args:
+    - pattern (dict): The event pattern
+    - event (dict): The event as delivered to targets
+    """
+    for key, expected in pattern.items():
+        if key not in event:
+            return False
+        value = event[key]
+        if isinstance(expected, dict):
+            if not isinstance(value, dict) or not matches(expected, value):
+                return False
+            continue
+        values = value if isinstance(value, list) else [value]
+        if not any(v in expected for v in values):
+            return False
+    return True
+
+
+class DeliveryStats:
+    """
+    Collects per target the delay before a handler started and its duration, in milliseconds
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, target, delay, duration, failed):
+        """
+        Adds one delivery
+
+        Args:
+        - target (str): The function name
+        - delay (float): Milliseconds between scheduling and handler start
+        - duration (float): Milliseconds the handler ran
+        - failed (bool): Whether the handler raised
+        """
+        with self._lock:
+            self.samples.setdefault(target, []).append((delay, duration, failed))
+
+    def summary(self):
+        """
+        Returns {target: {"count", "failed", "delay_ms_p50", "duration_ms_p50", "duration_ms_p95"}}
+        """
+        summary = {}
+        with self._lock:
+            for target, samples in self.samples.items():
+                delays = sorted(s[0] for s in samples)
+                durations = sorted(s[1] for s in samples)
+                summary[target] = {
+                    "count": len(samples),
+                    "failed": sum(1 for s in samples if s[2]),
+                    "delay_ms_p50": round(delays[len(delays) // 2], 3),
+                    "duration_ms_p50": round(durations[len(durations) // 2], 3),
+                    "duration_ms_p95": round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 3),
+                }
+        return summary
+
+
+class LocalTargets:
+    """
+    Runs lambda handlers on a thread pool, the way Lambda runs asynchronous invocations
+    """
+
+    def __init__(self, handlers, workers=16):
+        self.handlers = handlers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="local-target")
+        self.stats = DeliveryStats()
+
+    def deliver(self, function_name, event):
+        """
+        Schedules the handler of function_name with event and returns the future
+
+        Args:
+        - function_name (str): The deployed function name, e.g. opsgenie_lambda
+        - event (dict): The event passed to the handler
+        """
+        return self.executor.submit(self._run, function_name, event, time.perf_counter())
+
+    def _run(self, function_name, event, queued):
+        started = time.perf_counter()
+        failed = False
+        try:
+            return self.handlers[function_name](event, None)
+        except Exception:
+            failed = True
+            logger.exception("Handler failed", function=function_name)
+        finally:
+            self.stats.record(
+                function_name, (started - queued) * 1000, (time.perf_counter() - started) * 1000, failed
+            )
+
+
+class InMemoryEventBus:
+    """
+    Accepts put_events calls and delivers each entry to the targets of every matching rule
+    """
+
+    def __init__(self, rules, targets, region="eu-west-1"):
+        self.rules = rules
+        self.targets = targets
+        self.region = region
+
+    def put_events(self, Entries):
+        """
+        Same signature and response shape as the boto3 EventBridge client
+
+        Args:
+        - Entries (list): The PutEvents request entries
+        """
+        results = []
+        for entry in Entries:
+            event_id = str(uuid.uuid4())
+            event = {
+                "version": "0",
+                "id": event_id,
+                "detail-type": entry["DetailType"],
+                "source": entry["Source"],
+                "account": "000000000000",
+                "time": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "region": self.region,
+                "resources": entry.get("Resources", []),
+                "detail": json.loads(entry["Detail"]),
+            }
+            delivered = False
+            for name, pattern, functions in self.rules:
+                if matches(pattern, event):
+                    for function_name in functions:
+                        if function_name not in self.targets.handlers:
+                            logger.warning("Rule target not loaded", rule=name, function=function_name)
+                            continue
+                        self.targets.deliver(function_name, event)
+                        delivered = True
+            if not delivered:
+                logger.warning("No rule matched event", source=event["source"], route=event["detail"].get("route"))
+            results.append({"EventId": event_id})
+        return {"FailedEntryCount": 0, "Entries": results}
+
+
+class LocalLambdaClient:
+    """
+    Accepts invoke calls for functions loaded in the process
+    """
+
+    def __init__(self, targets):
+        self.targets = targets
+
+    def invoke(self, FunctionName, InvocationType="RequestResponse", Payload=b"{}"):
+        """
+        Same signature and response shape as the boto3 Lambda client
+
+        Args:
+        - FunctionName (str): The deployed function name
+        - InvocationType (str): Event for asynchronous, RequestResponse for synchronous invocations
+        - Payload (bytes): The JSON encoded event
+        """
+        if FunctionName not in self.targets.handlers:
+            raise ValueError(f"Function not loaded: {FunctionName}")
+        future = self.targets.deliver(FunctionName, json.loads(Payload))
+        if InvocationType == "Event":
+            return {"StatusCode": 202}
+        return {"StatusCode": 200, "Payload": io.BytesIO(json.dumps(future.result()).encode("utf-8"))}
@@ -0,0 +1,66 @@
+"""
+Loads lambda handlers by path.
+
+Every lambda lives in its own folder as lambda_function.py, so the handlers are
+imported under unique module names.
+"""
+import importlib.util
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dummy credentials so boto3 never walks the credential provider chain
+FAKE_AWS_ENV = {
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_SESSION_TOKEN": "testing",
+    "AWS_DEFAULT_REGION": "eu-west-1",
+}
+
+# Placeholders of variables the lambdas parse at import, empty for the AWS resources they would use
+PLACEHOLDER_ENV = {
+    "PUSHOVER_TEAM_ROUTES": "{}",
+    "PUSHOVER_DIGEST_WINDOW": "0",
+    "PUSHOVER_DIGEST_TABLE": "",
+    "OPSGENIE_INCIDENT_QUEUE_URL": "",
+}
+
+
+def placeholder_env(names, prefix, defaults=None):
+    """
+    Placeholder values for the environment variables a function expects, "<prefix>-<name>" unless
+    PLACEHOLDER_ENV or defaults has one
+
+    Args:
+    - names (list): The variable names, see local.terraform.load_functions
+    - prefix (str): Prefix of the generated placeholders
+    - defaults (dict): Values to use instead of the placeholders
+    """
+    values = {**PLACEHOLDER_ENV, **(defaults or {})}
+    return {name: values.get(name, f"{prefix}-{name.lower()}") for name in names}
+
+
+def load_lambda(relative_path, env=None):
+    """
+    Imports a lambda_function.py by path under a unique module name
+
+    Args:
+    - relative_path (str): Folder of the lambda relative to the repository root, e.g. lambda/gatekeeper
+    - env (dict): Environment variables the lambda expects at import time
+    """
+    os.environ.update(FAKE_AWS_ENV)
+    os.environ.update(env or {})
+    lambda_dir = os.path.join(REPO_ROOT, relative_path)
+    module_name = relative_path.replace("/", "_") + "_lambda_function"
+    spec = importlib.util.spec_from_file_location(
+        module_name, os.path.join(lambda_dir, "lambda_function.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.path.insert(0, lambda_dir)
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(lambda_dir)
+    sys.modules[module_name] = module
+    return module
@@ -0,0 +1,190 @@
+"""
+Runs the gatekeeper and every backend lambda in one process without AWS.
+
+Every function defined in terraform/lambda.tf is loaded. The gatekeeper's
+EventBridge and Lambda clients are replaced by an in-memory bus that applies
+the same event patterns as the deployed rules, and the API Gateway fronted
+functions are served over HTTP as API Gateway proxy events:
+
+    python -m local.runner --api gatekeeper_lambda=3000 --api pushover_lambda=3001
+
+Environment variables a function expects but that are not set are filled with
+placeholders (local.loader.placeholder_env), SLACK_SIGNING_SECRET defaults to
+"local-signing-secret" and PUSHOVER_TEAM_ROUTES to an empty routing map, Pushover
+digests are off and the AWS resources lambda.tf creates for digests and incident
+requests are left unset. Outbound calls to Slack, Opsgenie or Pushover are not
+intercepted, set SLACK_API_URL to send the Slack calls of the backends to a fake
+Slack. Functions that fail to load (e.g. a dependency missing from the
+environment) are skipped with an error.
+
+GET /_local/stats on any port returns delivery counts and latencies per function.
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+from local import terraform
+from local.event_bus import InMemoryEventBus, LocalLambdaClient, LocalTargets
+from local.loader import REPO_ROOT, load_lambda, placeholder_env
+from qbot.log import get_logger
+
+logger = get_logger("local.runner")
+
+DEFAULT_ENV = {"SLACK_SIGNING_SECRET": "local-signing-secret"}
+GATEKEEPER = "gatekeeper_lambda"
+
+
+def load_functions(workers):
+    """
+    Loads every function of lambda.tf and wires the gatekeeper to the in-memory bus.
+    Returns the LocalTargets holding the handlers.
+
+    Args:
+    - workers (int): Number of threads running asynchronous deliveries
+    """
+    functions, rules = terraform.load()
+    # Folders under lambda/ that are not deployed yet follow the <folder>_lambda naming
+    known = {spec["directory"] for spec in functions.values()}
+    for folder in sorted(os.listdir(os.path.join(REPO_ROOT, "lambda"))):
+        if f"lambda/{folder}" not in known:
+            functions[f"{folder}_lambda"] = {"function_name": f"{folder}_lambda", "directory": f"lambda/{folder}", "env": []}
+
+    targets = LocalTargets({}, workers=workers)
+    modules = {}
+    for spec in functions.values():
+        env = {name: os.environ.get(name, value) for name, value in placeholder_env(spec["env"], "local", DEFAULT_ENV).items()}
+        try:
+            module = load_lambda(spec["directory"], env)
+        except Exception as e:
+            logger.error("Skipping function that failed to load", function=spec["function_name"], error=repr(e))
+            continue
+        modules[spec["function_name"]] = module
+        targets.handlers[spec["function_name"]] = module.lambda_handler
+        logger.info("Loaded function", function=spec["function_name"], directory=spec["directory"])
+
+    gatekeeper = modules.get(GATEKEEPER)
+    if gatekeeper is not None:
+        gatekeeper.eventbridge = InMemoryEventBus(rules, targets)
+        gatekeeper.lambda_client = LocalLambdaClient(targets)
+    return targets
+
+
+def api_gateway_event(method, path, headers, query, body):
+    """
+    Builds the API Gateway REST proxy integration event for an HTTP request
+
+    Args:
+    - method (str): HTTP method
+    - path (str): Request path
+    - headers (dict): Request headers
+    - query (str): Raw query string
+    - body (str): Request body
+    """
+    query_parameters = dict(p.split("=", 1) if "=" in p else (p, "") for p in query.split("&") if p) or None
+    return {
+        "resource": "/{proxy+}",
+        "path": path,
+        "httpMethod": method,
+        "headers": headers,
+        "multiValueHeaders": {k: [v] for k, v in headers.items()},
+        "queryStringParameters": query_parameters,
+        "pathParameters": {"proxy": path.lstrip("/")},
+        "stageVariables": None,
+        "requestContext": {
+            "resourcePath": "/{proxy+}",
+            "httpMethod": method,
+            "path": f"/prod{path}",
+            "stage": "prod",
+            "requestId": str(uuid.uuid4()),
+            "requestTimeEpoch": int(time.time() * 1000),
+        },
+        "body": body,
+        "isBase64Encoded": False,
+    }
+
+
+def serve(targets, function_name, port):
+    """
+    Serves a function as an API Gateway proxy integration on the given port
+
+    Args:
+    - targets (LocalTargets): The loaded handlers
+    - function_name (str): The function behind the API
+    - port (int): Port to listen on
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def _respond(self, status, body, headers=None):
+            payload = body.encode("utf-8")
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _invoke(self):
+            path, _, query = self.path.partition("?")
+            if path == "/_local/stats":
+                return self._respond(200, json.dumps(targets.stats.summary()), {"Content-Type": "application/json"})
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length).decode("utf-8") if length else None
+            event = api_gateway_event(self.command, path, dict(self.headers.items()), query, body)
+            try:
+                response = targets.handlers[function_name](event, None)
+            except Exception:
+                logger.exception("Handler failed", function=function_name)
+                return self._respond(502, json.dumps({"message": "Internal server error"}))
+            response_body = response.get("body") or ""
+            if not isinstance(response_body, str):
+                response_body = json.dumps(response_body)
+            self._respond(response.get("statusCode", 200), response_body, response.get("headers"))
+
+        do_GET = do_POST = do_PUT = do_DELETE = _invoke
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("Serving function", function=function_name, url=f"http://127.0.0.1:{port}")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--api",
+        action="append",
+        metavar="FUNCTION=PORT",
+        help="Serve a function over HTTP, default gatekeeper_lambda=3000 and pushover_lambda=3001",
+    )
+    parser.add_argument("--workers", type=int, default=16, help="Threads running asynchronous deliveries")
+    args = parser.parse_args()
+
+    targets = load_functions(args.workers)
+    servers = []
+    for api in args.api or ["gatekeeper_lambda=3000", "pushover_lambda=3001"]:
+        function_name, port = api.split("=")
+        if function_name in targets.handlers:
+            servers.append(serve(targets, function_name, int(port)))
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+        print(json.dumps(targets.stats.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
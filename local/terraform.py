@@ -0,0 +1,86 @@
+"""
+Reads the lambda functions, EventBridge rules and targets from terraform/lambda.tf
+so the local runner routes events exactly like the deployed rules.
+
+Only the constructs used in this repository are understood: resource blocks,
+`jsonencode({...})` event patterns and `aws_lambda_function.<name>.arn` references,
+`[0]` indexes of resources created with `count` included. Every function is loaded,
+whatever its count.
+"""
+import json
+import os
+import re
+
+from local.loader import REPO_ROOT
+
+LAMBDA_TF = os.path.join(REPO_ROOT, "terraform", "lambda.tf")
+
+
+def resource_blocks(text, resource_type):
+    """
+    Yields (name, body) for every resource of the given type
+
+    Args:
+    - text (str): Terraform source
+    - resource_type (str): e.g. aws_lambda_function
+    """
+    for match in re.finditer(rf'resource\s+"{resource_type}"\s+"([^"]+)"\s*{{', text):
+        depth, start = 1, match.end()
+        position = start
+        while depth:
+            depth += {"{": 1, "}": -1}.get(text[position], 0)
+            position += 1
+        yield match.group(1), text[start:position - 1]
+
+
+def load_functions(text):
+    """
+    Returns {resource name: {"function_name", "directory", "env"}} of every aws_lambda_function.
+    `directory` is the lambda folder relative to the repository root, `env` the names of its environment variables.
+
+    Args:
+    - text (str): Terraform source
+    """
+    functions = {}
+    for name, body in resource_blocks(text, "aws_lambda_function"):
+        function_name = re.search(r'function_name\s*=\s*"([^"]+)"', body).group(1)
+        directory = re.search(r'filename\s*=\s*"\$\{path\.module\}/\.\./(.+?)/package/', body).group(1)
+        variables = re.search(r"variables\s*=\s*{([^}]*)}", body)
+        env = re.findall(r"^\s*(\w+)\s*=", variables.group(1), re.MULTILINE) if variables else []
+        functions[name] = {"function_name": function_name, "directory": directory, "env": env}
+    return functions
+
+
+def load_rules(text):
+    """
+    Returns [(rule name, event pattern, [target function resource names])] of every event pattern rule.
+    Schedule rules (keep-warm) are skipped.
+
+    Args:
+    - text (str): Terraform source
+    """
+    targets = {}
+    for _, body in resource_blocks(text, "aws_cloudwatch_event_target"):
+        rule = re.search(r"rule\s*=\s*aws_cloudwatch_event_rule\.(\w+)(?:\[\d+\])?\.name", body).group(1)
+        function = re.search(r"arn\s*=\s*aws_lambda_function\.(\w+)(?:\[\d+\])?\.arn", body)
+        if function:
+            targets.setdefault(rule, []).append(function.group(1))
+
+    rules = []
+    for name, body in resource_blocks(text, "aws_cloudwatch_event_rule"):
+        pattern = re.search(r"event_pattern\s*=\s*jsonencode\((\{.*\})\)", body, re.DOTALL)
+        if pattern:
+            rules.append((name, json.loads(pattern.group(1)), targets.get(name, [])))
+    return rules
+
+
+def load(path=LAMBDA_TF):
+    """
+    Returns (functions, rules) defined in the terraform file
+
+    Args:
+    - path (str): Path of lambda.tf
+    """
+    with open(path) as f:
+        text = f.read()
+    return load_functions(text), load_rules(text)
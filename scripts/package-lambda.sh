@@ -4,6 +4,8 @@ set -Eeo pipefail
 
 # Relative path to the lambda directory
 LAMBDA_ROOT_DIR="../lambda"
+# Relative path to the shared code added to every lambda
+SHARED_LIB_DIR="../lib"
 
 # Loop over each service in the lambda directory
 for service in $(ls $LAMBDA_ROOT_DIR); do
@@ -35,6 +37,20 @@ for service in $(ls $LAMBDA_ROOT_DIR); do
     zip -q -r9 ../../../../package/${service}.zip .
     popd
 
+    # Add the shared qbot package next to the lambda code
+    pushd ../$SHARED_LIB_DIR
+    zip -q -r9 ../lambda/${service}/package/${service}.zip qbot -x "*/__pycache__/*"
+    popd
+
+    # The consolidated backend ships the folders of the backends listed in its backends.json
+    if [ -f backends.json ]; then
+        for backend in $(python3 -c 'import json; print(" ".join(json.load(open("backends.json"))["backends"]))'); do
+            pushd ..
+            zip -q -r9 ${service}/package/${service}.zip ${backend} -x "${backend}/venv/*" "${backend}/package/*" "${backend}/requirements.txt" "*/__pycache__/*"
+            popd
+        done
+    fi
+
     # Clean up: remove the virtual environment
     rm -rf venv
 
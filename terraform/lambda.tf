@@ -55,13 +55,44 @@ resource "aws_iam_role_policy_attachment" "lambda_eventbridge_access" {
   policy_arn = "arn:aws:iam::aws:policy/AmazonEventBridgeFullAccess"
 }
 
+/*
+Gatekeeper IAM role, only the gatekeeper may invoke the backends directly
+*/
+resource "aws_iam_role" "gatekeeper_lambda_role" {
+  name = "gatekeeper_lambda_role"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Action = "sts:AssumeRole",
+        Principal = {
+          Service = "lambda.amazonaws.com"
+        },
+        Effect = "Allow",
+        Sid    = ""
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "gatekeeper_lambda_log_access" {
+  role       = aws_iam_role.gatekeeper_lambda_role.name
+  policy_arn = aws_iam_policy.iam_policy_for_logs.arn
+}
+
+resource "aws_iam_role_policy_attachment" "gatekeeper_lambda_eventbridge_access" {
+  role       = aws_iam_role.gatekeeper_lambda_role.name
+  policy_arn = "arn:aws:iam::aws:policy/AmazonEventBridgeFullAccess"
+}
+
 /*
 Gatekeeper lambda
 */
 resource "aws_lambda_function" "gatekeeper_lambda" {
   filename         = "${path.module}/../lambda/gatekeeper/package/gatekeeper.zip"
   function_name    = "gatekeeper_lambda"
-  role             = aws_iam_role.lambda_execution_role.arn
+  role             = aws_iam_role.gatekeeper_lambda_role.arn
   handler          = "lambda_function.lambda_handler"
   runtime          = "python3.11"
   source_code_hash = filebase64sha256("${path.module}/../lambda/gatekeeper/package/gatekeeper.zip")
@@ -73,6 +104,33 @@ resource "aws_lambda_function" "gatekeeper_lambda" {
   }
 }
 
+resource "aws_iam_policy" "iam_policy_for_backend_invoke" {
+  name        = "aws_iam_policy_for_gatekeeper_backend_invoke"
+  path        = "/"
+  description = "AWS IAM Policy for invoking backends directly from the gatekeeper (routes.json mode invoke and options loads)"
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Action = [
+          "lambda:InvokeFunction"
+        ],
+        Resource = concat([
+          aws_lambda_function.opsgenie_lambda.arn,
+          aws_lambda_function.qchain_lambda.arn
+        ], aws_lambda_function.backend_lambda[*].arn),
+        Effect = "Allow"
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "gatekeeper_lambda_backend_invoke" {
+  role       = aws_iam_role.gatekeeper_lambda_role.name
+  policy_arn = aws_iam_policy.iam_policy_for_backend_invoke.arn
+}
+
 resource "aws_lambda_permission" "allow_eventbridge_gatekeeper" {
   statement_id  = "AllowEventBridgeInvoke"
   action        = "lambda:InvokeFunction"
@@ -97,17 +155,64 @@ resource "aws_lambda_function" "opsgenie_lambda" {
   role             = aws_iam_role.lambda_execution_role.arn
   handler          = "lambda_function.lambda_handler"
   runtime          = "python3.11"
+  # /ops-bot bulk actions stop starting Opsgenie calls OPSGENIE_BULK_DEADLINE_MARGIN seconds before it
+  timeout          = 60
   source_code_hash = filebase64sha256("${path.module}/../lambda/opsgenie/package/opsgenie.zip")
 
   environment {
     variables = {
-      SLACK_BOT_TOKEN = var.SLACK_BOT_TOKEN
-      OPSGENIE_URL    = var.OPSGENIE_URL
-      OPSGENIE_TOKEN  = var.OPSGENIE_TOKEN
+      SLACK_BOT_TOKEN             = var.SLACK_BOT_TOKEN
+      OPSGENIE_URL                = var.OPSGENIE_URL
+      OPSGENIE_TOKEN              = var.OPSGENIE_TOKEN
+      OPSGENIE_INCIDENT_QUEUE_URL = aws_sqs_queue.opsgenie_incident_requests.url
     }
   }
 }
 
+# Incident create requests waiting for Opsgenie, delivered to the opsgenie lambda in batches once their delay passed
+resource "aws_sqs_queue" "opsgenie_incident_requests" {
+  name = "opsgenie_incident_requests"
+  # At least the timeout of the lambda polling a batch
+  visibility_timeout_seconds = 90
+  message_retention_seconds  = 900
+}
+
+resource "aws_lambda_event_source_mapping" "opsgenie_incident_requests" {
+  event_source_arn                   = aws_sqs_queue.opsgenie_incident_requests.arn
+  function_name                      = aws_lambda_function.opsgenie_lambda.arn
+  batch_size                         = 10
+  maximum_batching_window_in_seconds = 1
+  # The handler returns the messages to deliver again as batchItemFailures
+  function_response_types = ["ReportBatchItemFailures"]
+}
+
+resource "aws_iam_policy" "iam_policy_for_incident_requests" {
+  name        = "aws_iam_policy_for_opsgenie_incident_requests"
+  path        = "/"
+  description = "AWS IAM Policy for queueing and polling Opsgenie incident create requests"
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Action = [
+          "sqs:SendMessage",
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:GetQueueAttributes"
+        ],
+        Resource = aws_sqs_queue.opsgenie_incident_requests.arn,
+        Effect   = "Allow"
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "lambda_incident_requests" {
+  role       = aws_iam_role.lambda_execution_role.name
+  policy_arn = aws_iam_policy.iam_policy_for_incident_requests.arn
+}
+
 resource "aws_lambda_permission" "allow_eventbridge_opsgenie" {
   statement_id  = "AllowEventBridgeInvoke"
   action        = "lambda:InvokeFunction"
@@ -250,43 +355,163 @@ resource "aws_lambda_permission" "allow_cloudwatch_qchain" {
   source_arn    = aws_cloudwatch_event_rule.keep_qchain_lambda_warm.arn
 }
 
+/*
+Consolidated backend lambda, deployed with CONSOLIDATED_BACKEND. Commands are moved to it by pointing their
+routes.json entries at backend_lambda with "mode": "invoke". It runs qchain, so it has the role and VPC of qchain.
+*/
+resource "aws_lambda_function" "backend_lambda" {
+  count            = var.CONSOLIDATED_BACKEND ? 1 : 0
+  filename         = "${path.module}/../lambda/backend/package/backend.zip"
+  function_name    = "backend_lambda"
+  role             = aws_iam_role.qchain_lambda_role.arn
+  handler          = "lambda_function.lambda_handler"
+  runtime          = "python3.11"
+  timeout          = 60
+  source_code_hash = filebase64sha256("${path.module}/../lambda/backend/package/backend.zip")
+
+  vpc_config {
+    subnet_ids         = ["subnet-XXX", "subnet-XXX"]
+    security_group_ids = ["sg-XXX"]
+  }
+
+  environment {
+    variables = {
+      SLACK_BOT_TOKEN             = var.SLACK_BOT_TOKEN
+      OPSGENIE_URL                = var.OPSGENIE_URL
+      OPSGENIE_TOKEN              = var.OPSGENIE_TOKEN
+      OPSGENIE_INCIDENT_QUEUE_URL = aws_sqs_queue.opsgenie_incident_requests.url
+      QCHAIN_AWS_REGION           = var.QCHAIN_AWS_REGION
+      QCHAIN_EKS_CLUSTER_NAME     = var.QCHAIN_EKS_CLUSTER_NAME
+      QCHAIN_EKS_NAMESPACE        = var.QCHAIN_EKS_NAMESPACE
+    }
+  }
+}
+
+# The opsgenie backend queues its incident create requests, the opsgenie lambda polls them
+resource "aws_iam_role_policy_attachment" "backend_incident_requests" {
+  count      = var.CONSOLIDATED_BACKEND ? 1 : 0
+  role       = aws_iam_role.qchain_lambda_role.name
+  policy_arn = aws_iam_policy.iam_policy_for_incident_requests.arn
+}
+
+resource "aws_lambda_permission" "allow_cloudwatch_backend" {
+  count         = var.CONSOLIDATED_BACKEND ? 1 : 0
+  statement_id  = "AllowCloudWatchInvoke"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.backend_lambda[0].function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.keep_backend_lambda_warm[0].arn
+}
+
 /*
 Pushover lambda
 */
+locals {
+  # Opsgenie team id to the Pushover group its alerts are sent to. Route a team to several groups with a list.
+  pushover_team_routes = jsonencode({
+    (var.OPSGENIE_WEB3_TEAM)       = var.PUSHOVER_WEB3_GROUP
+    (var.OPSGENIE_HUB_TEAM)        = var.PUSHOVER_HUB_GROUP
+    (var.OPSGENIE_TRADING_TEAM)    = var.PUSHOVER_TRADING_GROUP
+    (var.OPSGENIE_BLOCKCHAIN_TEAM) = var.PUSHOVER_BLOCKCHAIN_GROUP
+    (var.OPSGENIE_MPC_TEAM)        = var.PUSHOVER_MPC_GROUP
+    (var.OPSGENIE_DEVOPS_TEAM)     = var.PUSHOVER_DEVOPS_GROUP
+    (var.OPSGENIE_STAFF_TEAM)      = var.PUSHOVER_STAFF_GROUP
+    (var.OPSGENIE_SECURITY_TEAM)   = var.PUSHOVER_SECURITY_GROUP
+  })
+}
+
+/*
+Pushover IAM role and digest table
+*/
+resource "aws_iam_role" "pushover_lambda_role" {
+  name = "pushover_lambda_role"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Action = "sts:AssumeRole",
+        Principal = {
+          Service = "lambda.amazonaws.com"
+        },
+        Effect = "Allow",
+        Sid    = ""
+      }
+    ]
+  })
+}
+
+resource "aws_dynamodb_table" "pushover_digest" {
+  name         = "pushover_digest"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "id"
+
+  attribute {
+    name = "id"
+    type = "S"
+  }
+
+  # Windows nobody drained are removed an hour after they closed
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
+
+resource "aws_iam_policy" "iam_policy_for_pushover_digest" {
+  name        = "aws_iam_policy_for_pushover_digest"
+  path        = "/"
+  description = "AWS IAM Policy for the Pushover digest windows shared by the pushover lambda environments"
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Action = [
+          "dynamodb:PutItem",
+          "dynamodb:UpdateItem",
+          "dynamodb:DeleteItem"
+        ],
+        Resource = aws_dynamodb_table.pushover_digest.arn,
+        Effect   = "Allow"
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "pushover_lambda_log_access" {
+  role       = aws_iam_role.pushover_lambda_role.name
+  policy_arn = aws_iam_policy.iam_policy_for_logs.arn
+}
+
+resource "aws_iam_role_policy_attachment" "pushover_lambda_digest_access" {
+  role       = aws_iam_role.pushover_lambda_role.name
+  policy_arn = aws_iam_policy.iam_policy_for_pushover_digest.arn
+}
+
 resource "aws_lambda_function" "pushover_lambda" {
   filename         = "${path.module}/../lambda/pushover/package/pushover.zip"
   function_name    = "pushover_lambda"
-  role             = aws_iam_role.lambda_execution_role.arn
+  role             = aws_iam_role.pushover_lambda_role.arn
   handler          = "lambda_function.lambda_handler"
   runtime          = "python3.11"
+  # Digests are sent up to PUSHOVER_DIGEST_WINDOW seconds after the response
+  timeout          = 60
   source_code_hash = filebase64sha256("${path.module}/../lambda/pushover/package/pushover.zip")
 
   environment {
     variables = {
-      AUTH_HEADER               = var.AUTH_HEADER
-      PUSHOVER_URL              = var.PUSHOVER_URL
-      PUSHOVER_TOKEN            = var.PUSHOVER_TOKEN
-      PUSHOVER_WEB3_GROUP       = var.PUSHOVER_WEB3_GROUP
-      PUSHOVER_HUB_GROUP        = var.PUSHOVER_HUB_GROUP
-      PUSHOVER_TRADING_GROUP    = var.PUSHOVER_TRADING_GROUP
-      PUSHOVER_BLOCKCHAIN_GROUP = var.PUSHOVER_BLOCKCHAIN_GROUP
-      PUSHOVER_MPC_GROUP        = var.PUSHOVER_MPC_GROUP
-      PUSHOVER_DEVOPS_GROUP     = var.PUSHOVER_DEVOPS_GROUP
-      PUSHOVER_STAFF_GROUP      = var.PUSHOVER_STAFF_GROUP
-      PUSHOVER_SECURITY_GROUP   = var.PUSHOVER_SECURITY_GROUP
-      OPSGENIE_URL              = var.OPSGENIE_URL
-      OPSGENIE_TOKEN            = var.OPSGENIE_TOKEN
-      OPSGENIE_WEB3_TEAM        = var.OPSGENIE_WEB3_TEAM
-      OPSGENIE_HUB_TEAM         = var.OPSGENIE_HUB_TEAM
-      OPSGENIE_TRADING_TEAM     = var.OPSGENIE_TRADING_TEAM
-      OPSGENIE_BLOCKCHAIN_TEAM  = var.OPSGENIE_BLOCKCHAIN_TEAM
-      OPSGENIE_MPC_TEAM         = var.OPSGENIE_MPC_TEAM
-      OPSGENIE_DEVOPS_TEAM      = var.OPSGENIE_DEVOPS_TEAM
-      OPSGENIE_STAFF_TEAM       = var.OPSGENIE_STAFF_TEAM
-      OPSGENIE_SECURITY_TEAM    = var.OPSGENIE_SECURITY_TEAM
-      QCHAIN_AWS_REGION         = var.QCHAIN_AWS_REGION
-      QCHAIN_EKS_CLUSTER_NAME   = var.QCHAIN_EKS_CLUSTER_NAME
-      QCHAIN_EKS_NAMESPACE      = var.QCHAIN_EKS_NAMESPACE
+      AUTH_HEADER             = var.AUTH_HEADER
+      PUSHOVER_URL            = var.PUSHOVER_URL
+      PUSHOVER_TOKEN          = var.PUSHOVER_TOKEN
+      PUSHOVER_TEAM_ROUTES    = local.pushover_team_routes
+      PUSHOVER_DIGEST_WINDOW  = var.PUSHOVER_DIGEST_WINDOW
+      PUSHOVER_DIGEST_TABLE   = aws_dynamodb_table.pushover_digest.name
+      OPSGENIE_URL            = var.OPSGENIE_URL
+      OPSGENIE_TOKEN          = var.OPSGENIE_TOKEN
+      QCHAIN_AWS_REGION       = var.QCHAIN_AWS_REGION
+      QCHAIN_EKS_CLUSTER_NAME = var.QCHAIN_EKS_CLUSTER_NAME
+      QCHAIN_EKS_NAMESPACE    = var.QCHAIN_EKS_NAMESPACE
     }
   }
 }
@@ -296,13 +521,13 @@ Eventbridge rules
 */
 resource "aws_cloudwatch_event_rule" "opsgenie_event_rule" {
   name        = "OpsgenieEventRule"
-  description = "Capture specific events and route to Lambda for /sre command"
+  description = "Capture specific events and route to Lambda for /sre and /ops-bot commands"
 
   event_pattern = jsonencode({
     "source" : ["gatekeeper"],
     "detail-type" : ["Slack Command Invoked"],
     "detail" : {
-      "route" : ["/sre"]
+      "route" : ["/sre", "/ops-bot"]
     }
   })
 }
@@ -371,3 +596,17 @@ resource "aws_cloudwatch_event_target" "qchain_lambda_target" {
   target_id = "QchainLambdaWarm"
   arn       = aws_lambda_function.qchain_lambda.arn
 }
+
+resource "aws_cloudwatch_event_rule" "keep_backend_lambda_warm" {
+  count               = var.CONSOLIDATED_BACKEND ? 1 : 0
+  name                = "KeepBackendLambdaWarm"
+  description         = "Trigger the consolidated backend Lambda every 5 minutes to keep it warm"
+  schedule_expression = "rate(5 minutes)"
+}
+
+resource "aws_cloudwatch_event_target" "backend_lambda_target" {
+  count     = var.CONSOLIDATED_BACKEND ? 1 : 0
+  rule      = aws_cloudwatch_event_rule.keep_backend_lambda_warm[0].name
+  target_id = "BackendLambdaWarm"
+  arn       = aws_lambda_function.backend_lambda[0].arn
+}
@@ -24,3 +24,13 @@ variable "OPSGENIE_SECURITY_TEAM" {}
 variable "QCHAIN_AWS_REGION" {}
 variable "QCHAIN_EKS_CLUSTER_NAME" {}
 variable "QCHAIN_EKS_NAMESPACE" {}
+variable "CONSOLIDATED_BACKEND" {
+  description = "Deploy backend_lambda, serving the backends of lambda/backend/backends.json from one function"
+  type        = bool
+  default     = false
+}
+variable "PUSHOVER_DIGEST_WINDOW" {
+  description = "Seconds the alerts for a Pushover group following the one paged are coalesced into a digest, 0 pages every alert"
+  type        = number
+  default     = 30
+}